@@ -0,0 +1,164 @@
+"""
+努力カレンダーの共通モジュール
+
+アクティビティログの日別の件数（aggregates の activity_log 集計値。書き込みのたびに
+差分で更新される）を、年ごとの NumPy 配列（1 月 1 日からの日数 → 件数）に展開して持つ。
+カレンダーの各マスは配列を添字で引くだけなので、表示する日数が増えても速い。
+
+    - 配列はデータのバージョン（活動ログの signature）が変わったときだけ作り直す
+    - 月のカレンダーと年のヒートマップの HTML は (年, 月, バージョン, 今日) をキーにキャッシュする
+      （今日のマスに印を付けるので、日付が変わったときも作り直す）
+
+    html = activity_calendar.month_html(2024, 5)
+    stats = activity_calendar.month_stats(2024, 5)
+"""
+import calendar
+import functools
+import json
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import aggregates
+import storage
+
+DATASET = "activity_log"
+
+WEEKDAY_LABELS = ["月", "火", "水", "木", "金", "土", "日"]
+
+# ヒートマップの色の段階（この件数以上ならそのクラス）
+HEAT_LEVELS = [(8, "heat-4"), (4, "heat-3"), (2, "heat-2"), (1, "heat-1")]
+
+
+# 年ごとの日別の配列
+_arrays = {"version": None, "counts": {}, "points": {}}
+_arrays_lock = threading.Lock()
+
+def version():
+    """活動ログのデータのバージョン（書き込むと変わる）"""
+    return json.dumps(storage.table(DATASET).signature())
+
+def _to_arrays(by_day, dtype):
+    """{YYYY-MM-DD: 値} を {年: 366 日分の配列} に展開する"""
+    arrays = {}
+    if not by_day:
+        return arrays
+    # 日付として読めないキーは除く
+    parsed = pd.to_datetime(pd.Index(list(by_day)), errors="coerce", format="%Y-%m-%d")
+    valid = parsed.notna()
+    days = parsed[valid].to_numpy().astype("datetime64[D]")
+    values = np.array(list(by_day.values()), dtype=dtype)[valid]
+    years = days.astype("datetime64[Y]")
+    offsets = (days - years).astype(np.int64)
+    year_numbers = years.astype(np.int64) + 1970
+    for year in np.unique(year_numbers):
+        mask = year_numbers == year
+        array = np.zeros(366, dtype=dtype)
+        np.add.at(array, offsets[mask], values[mask])
+        arrays[int(year)] = array
+    return arrays
+
+def _year_arrays():
+    """年ごとの活動数と獲得ポイントの配列（データが変わったときだけ作り直す）"""
+    current = version()
+    with _arrays_lock:
+        if _arrays["version"] == current:
+            return _arrays
+    summary = aggregates.summary(DATASET)
+    counts = _to_arrays(summary["by_day"], np.int32)
+    points = _to_arrays(summary["points_by_day"], np.float64)
+    with _arrays_lock:
+        _arrays.update(version=current, counts=counts, points=points)
+        return _arrays
+
+def year_counts(year):
+    """year の日別の活動数（要素 i が 1 月 1 日から i 日後の件数。閏年でなければ最後は 0）"""
+    array = _year_arrays()["counts"].get(year)
+    return array if array is not None else np.zeros(366, dtype=np.int32)
+
+def year_points(year):
+    """year の日別の獲得ポイント（year_counts と同じ並び）"""
+    array = _year_arrays()["points"].get(year)
+    return array if array is not None else np.zeros(366, dtype=np.float64)
+
+def active_years():
+    """活動のある年（昇順）"""
+    return sorted(_year_arrays()["counts"])
+
+def _month_slice(year, month):
+    start = date(year, month, 1).timetuple().tm_yday - 1
+    _, days_in_month = calendar.monthrange(year, month)
+    return slice(start, start + days_in_month)
+
+
+# 月の統計
+def month_stats(year, month):
+    """月の活動日数・日数・獲得ポイントと、日別の活動数の配列"""
+    counts = year_counts(year)[_month_slice(year, month)]
+    points = year_points(year)[_month_slice(year, month)]
+    total_points = points.sum()
+    return {
+        "active_days": int(np.count_nonzero(counts)),
+        "days_in_month": len(counts),
+        "points": int(total_points) if float(total_points).is_integer() else float(total_points),
+        "counts": counts,
+    }
+
+
+# HTML の生成
+def month_html(year, month, today=None):
+    """月のカレンダーの HTML（活動した日と今日に印を付ける）"""
+    return _month_html(year, month, version(), today or date.today())
+
+@functools.lru_cache(maxsize=64)
+def _month_html(year, month, data_version, today):
+    counts = year_counts(year)[_month_slice(year, month)]
+    parts = [
+        '<div class="calendar-wrapper">',
+        f'<div class="calendar-title">{year}年{month}月</div>',
+        '<div class="calendar-grid">',
+    ]
+    parts.extend(f'<div class="weekday-label">{label}</div>' for label in WEEKDAY_LABELS)
+    for week in calendar.monthcalendar(year, month):
+        for day in week:
+            if day == 0:
+                # 月に含まれない日
+                parts.append('<div class="calendar-cell"></div>')
+                continue
+            cell_class = "calendar-cell"
+            cell_class += " calendar-cell-active" if counts[day - 1] else " calendar-cell-empty"
+            if date(year, month, day) == today:
+                cell_class += " calendar-cell-today"
+            parts.append(f'<div class="{cell_class}">{day}</div>')
+    parts.append("</div></div>")
+    return "".join(parts)
+
+def _heat_class(count):
+    for threshold, name in HEAT_LEVELS:
+        if count >= threshold:
+            return name
+    return "heat-0"
+
+def year_heatmap_html(year, today=None):
+    """1 年分の活動のヒートマップの HTML（列が週、行が曜日）"""
+    return _year_heatmap_html(year, version(), today or date.today())
+
+@functools.lru_cache(maxsize=32)
+def _year_heatmap_html(year, data_version, today):
+    counts = year_counts(year)
+    first = date(year, 1, 1)
+    days_in_year = 366 if calendar.isleap(year) else 365
+    parts = ['<div class="heatmap-wrapper">', f'<div class="calendar-title">{year}年</div>', '<div class="heatmap-grid">']
+    # 1 月 1 日の曜日まで空のマスで埋める（月曜始まり）
+    parts.extend('<div class="heatmap-cell"></div>' for _ in range(first.weekday()))
+    for offset in range(days_in_year):
+        day = date.fromordinal(first.toordinal() + offset)
+        if day > today:
+            parts.append('<div class="heatmap-cell heat-future"></div>')
+            continue
+        count = int(counts[offset])
+        parts.append(f'<div class="heatmap-cell {_heat_class(count)}" title="{day.isoformat()}: {count}件"></div>')
+    parts.append("</div></div>")
+    return "".join(parts)
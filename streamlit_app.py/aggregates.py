@@ -0,0 +1,316 @@
+"""
+集計値の共通モジュール
+
+ダッシュボードで使う件数・達成率・日別の活動数などを、全履歴から毎回数え直さずに
+テーブルへの書き込みのたびに差分で更新して保持する。
+
+    - 書き込み時: storage の変更通知を受け、追加したレコードを +1、削除したレコードを -1 で足し込む
+    - 読み込み時: summary(name) は集計値のスナップショット（書き込みで変わらないコピー）を返す。
+      コピーは書き込みの後に最初に読むときに 1 回だけ作る
+    - 検証: バックグラウンドのスレッドが VERIFY_INTERVAL ごとに全件から集計し直して照合する
+
+集計値は <集計名>.aggregates.json にも保存するので、再起動後やほかのプロセスが
+書き込んだ後も全件を読み直さずに済む。保存した集計値がデータと対応しない
+（signature が一致しない）ときは全件から作り直す。
+書き込みのたびに集計値全体を保存すると履歴の長さに比例する時間がかかるので、
+変更した集計値には印を付けておき、バックグラウンドのスレッドが FLUSH_INTERVAL ごと
+（とプロセスの終了時）にまとめて保存する。
+
+1 つのデータセットに複数の集計を持たせる場合は register() で名前を付けて追加する
+（keyword_index.py の単語頻度など）。
+"""
+import atexit
+import copy
+import json
+import logging
+import threading
+import time
+
+import storage
+
+# バックグラウンドで全件から集計し直して照合する間隔（秒）
+VERIFY_INTERVAL = 300
+
+# 変更した集計値をファイルに保存する間隔（秒）
+FLUSH_INTERVAL = 10
+
+# 集計値の形式のバージョン（集計の内容を変えたら上げる。保存済みの集計値は作り直しになる）
+AGGREGATES_VERSION = 3
+
+logger = logging.getLogger(__name__)
+
+
+# ユーティリティ関数
+def _day(value):
+    """日付・日時の値から YYYY-MM-DD 部分を取り出す"""
+    if value is None or value == "":
+        return None
+    return str(value)[:10]
+
+def _bump(counter, key, delta):
+    """カウンターを増減する（0 になったキーは消す）"""
+    if key is None:
+        return
+    key = str(key)
+    value = counter.get(key, 0) + delta
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+def _number(value):
+    """集計に使う数値（数値でなければ 0）"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+# データセットごとの集計
+def _init_growth():
+    return {"total": 0, "by_category": {}, "by_day": {}, "by_emotion": {}}
+
+def _fold_growth(summary, record, sign):
+    summary["total"] += sign
+    _bump(summary["by_category"], record.get("category"), sign)
+    _bump(summary["by_day"], _day(record.get("date")), sign)
+    _bump(summary["by_emotion"], record.get("emotion"), sign)
+
+def _init_habit_records():
+    return {"total": 0, "habits": {}}
+
+def _fold_habit_records(summary, record, sign):
+    summary["total"] += sign
+    habit_id = str(record.get("habit_id"))
+    habit = summary["habits"].setdefault(habit_id, {"total": 0, "by_status": {}, "days": {}})
+    habit["total"] += sign
+    status = record.get("status")
+    _bump(habit["by_status"], status, sign)
+    day = _day(record.get("date"))
+    if day is not None:
+        if sign > 0:
+            habit["days"][day] = status
+        elif habit["days"].get(day) == status:
+            del habit["days"][day]
+    if habit["total"] == 0:
+        del summary["habits"][habit_id]
+
+def _init_activity_log():
+    return {"total": 0, "points": 0, "by_day": {}, "points_by_day": {}, "types_by_day": {}}
+
+def _fold_activity_log(summary, record, sign):
+    day = _day(record.get("date"))
+    points = _number(record.get("points")) * sign
+    summary["total"] += sign
+    summary["points"] += points
+    if day is None:
+        return
+    _bump(summary["by_day"], day, sign)
+    _bump(summary["points_by_day"], day, points)
+    types = summary["types_by_day"].setdefault(day, {})
+    _bump(types, record.get("activity_type"), sign)
+    if not types:
+        del summary["types_by_day"][day]
+
+def _init_goals():
+    return {"total": 0, "by_status": {}, "by_category": {}}
+
+def _fold_goals(summary, record, sign):
+    summary["total"] += sign
+    _bump(summary["by_status"], record.get("status"), sign)
+    _bump(summary["by_category"], record.get("category"), sign)
+
+def _init_tasks():
+    return {"total": 0, "by_goal": {}, "completed_by_day": {}}
+
+def _fold_tasks(summary, record, sign):
+    summary["total"] += sign
+    if record.get("status") == "completed":
+        _bump(summary["completed_by_day"], _day(record.get("completed_at")), sign)
+    goal_id = str(record.get("goal_id"))
+    goal = summary["by_goal"].setdefault(goal_id, {"total": 0, "by_status": {}})
+    goal["total"] += sign
+    _bump(goal["by_status"], record.get("status"), sign)
+    if goal["total"] == 0:
+        del summary["by_goal"][goal_id]
+
+# 集計値の定義（dataset: 集計するデータセット / init: 空の集計値 / fold: レコード 1 件を符号付きで足し込む）
+# 名前は集計値の保存先（<名前>.aggregates.json）にも使う
+AGGREGATES = {
+    "growth_data": {"dataset": "growth_data", "init": _init_growth, "fold": _fold_growth},
+    "habit_records": {"dataset": "habit_records", "init": _init_habit_records, "fold": _fold_habit_records},
+    "activity_log": {"dataset": "activity_log", "init": _init_activity_log, "fold": _fold_activity_log},
+    "goals": {"dataset": "goals", "init": _init_goals, "fold": _fold_goals},
+    "tasks": {"dataset": "tasks", "init": _init_tasks, "fold": _fold_tasks},
+}
+
+def register(name, dataset, init, fold):
+    """集計値を追加する（ほかのモジュールから独自の集計を登録するときに使う）"""
+    if dataset not in storage.DATASETS:
+        raise KeyError(f"未定義のデータセットです: {dataset}")
+    AGGREGATES[name] = {"dataset": dataset, "init": init, "fold": fold}
+
+
+# 集計値の保持
+_states = {}
+_snapshots = {}  # 集計名 → 読み込み側に渡したコピー（書き込みで破棄する）
+_dirty = set()
+_lock = threading.RLock()
+_flush_lock = threading.Lock()
+_verifier = None
+
+def _signature_key(signature):
+    """Table.signature() を保存・比較できる形にする（集計値の形式のバージョンを含める）"""
+    return json.dumps([AGGREGATES_VERSION, signature])
+
+def _state_path(name):
+    return f"{name}.aggregates.json"
+
+def _load_saved(name, key):
+    """保存した集計値を読み込む（データと対応しなければ None）"""
+    saved = storage.read_json(_state_path(name), default=None, recover=False)
+    if not isinstance(saved, dict) or saved.get("signature") != key:
+        return None
+    return saved
+
+def _save(name, state):
+    storage.write_json(_state_path(name), state, backup=False)
+
+def _snapshot(name):
+    """保持している集計値のコピー（_lock を取って呼ぶ。書き込みがあるまで同じものを返す）"""
+    snapshot = _snapshots.get(name)
+    if snapshot is None:
+        snapshot = copy.deepcopy(_states[name]["summary"])
+        _snapshots[name] = snapshot
+    return snapshot
+
+def _set_state(name, state):
+    """保持している集計値を置き換える（_lock を取って呼ぶ）"""
+    _states[name] = state
+    _snapshots.pop(name, None)
+
+def flush():
+    """変更した集計値をファイルに保存する"""
+    with _flush_lock:
+        with _lock:
+            # 保存中も書き込みで集計値が変わるので、コピーを取ってから _lock の外で書き出す
+            pending = {
+                name: {"signature": _states[name]["signature"], "summary": _snapshot(name)}
+                for name in _dirty if name in _states
+            }
+            _dirty.clear()
+        for name, state in pending.items():
+            try:
+                _save(name, state)
+            except Exception:
+                logger.exception("%s の集計値の保存に失敗しました", name)
+                with _lock:
+                    _dirty.add(name)
+
+atexit.register(flush)
+
+def rebuild(name):
+    """全件から集計し直す（保持している集計値は置き換えない）"""
+    spec = AGGREGATES[name]
+    tbl = storage.table(spec["dataset"])
+    with tbl.lock():
+        records = tbl.records()
+        key = _signature_key(tbl.signature())
+    summary = spec["init"]()
+    for record in records:
+        spec["fold"](summary, record, 1)
+    return {"signature": key, "summary": summary}
+
+def summary(name):
+    """集計値を取得する（name は AGGREGATES の名前。データセット名と同じものが多い）
+
+    戻り値はほかのセッションの書き込みで変わらないスナップショットなので、ロックを
+    取らずにたどってよい。ほかの呼び出し側と共有するので変更しないこと。
+    """
+    _start_verifier()
+    key = _signature_key(storage.table(AGGREGATES[name]["dataset"]).signature())
+    with _lock:
+        state = _states.get(name)
+        if state is not None and state["signature"] == key:
+            return _snapshot(name)
+    # 書き込み側はデータセットのロック → _lock の順に取るので、作り直しは _lock の外で行う
+    state = _load_saved(name, key)
+    if state is None:
+        state = rebuild(name)
+        _save(name, state)
+    with _lock:
+        _set_state(name, state)
+        return _snapshot(name)
+
+def _on_change(dataset, before, after, added, removed):
+    """テーブルへの書き込みを集計値に反映する（storage から呼ばれる）"""
+    before, after = _signature_key(before), _signature_key(after)
+    for name, spec in list(AGGREGATES.items()):
+        if spec["dataset"] != dataset:
+            continue
+        with _lock:
+            state = _states.get(name)
+            if state is None or state["signature"] != before:
+                state = _load_saved(name, before)
+            if state is None or added is None:
+                # 差分を足し込む元がないので、次に読むときに全件から作り直す
+                _states.pop(name, None)
+                _snapshots.pop(name, None)
+                continue
+            for record in removed:
+                spec["fold"](state["summary"], record, -1)
+            for record in added:
+                spec["fold"](state["summary"], record, 1)
+            state["signature"] = after
+            _set_state(name, state)
+            # 保存はバックグラウンドでまとめて行う
+            _dirty.add(name)
+    _start_verifier()
+
+storage.add_listener(_on_change)
+
+
+# 整合性の検証
+def verify(name):
+    """全件から集計し直して保持している集計値と照合する
+
+    ずれていれば集計し直した値に置き換えて False を返す。
+    """
+    fresh = rebuild(name)
+    with _lock:
+        state = _states.get(name)
+        if state is None or state["signature"] != fresh["signature"]:
+            # 照合中に書き込みがあった場合は次回に回す
+            return True
+        if state["summary"] == fresh["summary"]:
+            return True
+        logger.warning("%s の集計値が全件の集計と一致しないため作り直しました", name)
+        _set_state(name, fresh)
+        _dirty.add(name)
+    return False
+
+def _verify_loop():
+    last_verified = time.monotonic()
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        if time.monotonic() - last_verified >= VERIFY_INTERVAL:
+            last_verified = time.monotonic()
+            for name in list(_states):
+                try:
+                    verify(name)
+                except Exception:
+                    logger.exception("%s の集計値の検証に失敗しました", name)
+        flush()
+
+def _start_verifier():
+    """検証用のスレッドを起動する（プロセスごとに 1 つ）"""
+    global _verifier
+    if _verifier is None:
+        with _lock:
+            if _verifier is None:
+                _verifier = threading.Thread(target=_verify_loop, name="aggregates-verifier", daemon=True)
+                _verifier.start()
@@ -22,6 +22,7 @@ st.markdown("""
 5. ** モチベーション管理**
 6. **自己分析**
 7. **AIサポート**                                                     
+8. **検索** - これまでの記録をキーワードで横断検索できます
 
 左側のサイドバーから各機能にアクセスしてください。
 """)
\ No newline at end of file
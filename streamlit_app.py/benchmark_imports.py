@@ -0,0 +1,113 @@
+"""
+ページのコールドスタート（インポート時間）の計測
+
+各ページの先頭にある import 文と lazy_imports.lazy_import の代入だけを
+新しい Python プロセスで実行し、ページを最初に開いたときのインポート時間を計測する。
+結果は表示するとともに import_benchmark.json に追記する（過去の結果と比較できる）。
+
+使い方:
+    python benchmark_imports.py               # 全ページを 5 回ずつ計測
+    python benchmark_imports.py --repeat 10   # 計測回数を変える
+    python benchmark_imports.py pages/03_*.py # ページを指定する
+
+インストールされていないモジュールは計測から除き、missing に記録する。
+"""
+import argparse
+import ast
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+import storage
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_FILE = "import_benchmark.json"
+
+# 子プロセスで実行するコード（STATEMENTS を順に実行して時間を測る）
+RUNNER = """
+import json, sys, time
+statements = json.loads(sys.argv[1])
+namespace = {"__name__": "__benchmark__"}
+missing = []
+start = time.perf_counter()
+for statement in statements:
+    try:
+        exec(statement, namespace)
+    except ImportError as e:
+        missing.append(e.name or str(e))
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "missing": missing}))
+"""
+
+
+def _is_lazy_import(node):
+    """lazy_imports.lazy_import(...) の代入かどうか"""
+    if not isinstance(node, ast.Assign) or not isinstance(node.value, ast.Call):
+        return False
+    func = node.value.func
+    return isinstance(func, ast.Attribute) and func.attr == "lazy_import"
+
+def import_statements(path):
+    """ページの先頭レベルにある import 文（と遅延インポートの代入）を取り出す"""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return [
+        ast.unparse(node)
+        for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom)) or _is_lazy_import(node)
+    ]
+
+def measure(path, repeat):
+    """ページのインポートを新しいプロセスで repeat 回実行して時間を測る"""
+    statements = json.dumps(import_statements(path))
+    samples = []
+    missing = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", RUNNER, statements],
+            cwd=APP_DIR, capture_output=True, text=True, check=True,
+        )
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        samples.append(data["seconds"])
+        missing = data["missing"]
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+        "missing": missing,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="ページのコールドスタート時間を計測する")
+    parser.add_argument("pages", nargs="*", help="計測するページ（省略時は app.py と pages/*.py）")
+    parser.add_argument("--repeat", type=int, default=5, help="ページごとの計測回数")
+    parser.add_argument("--output", default=os.path.join(APP_DIR, BENCHMARK_FILE), help="結果を追記するファイル")
+    args = parser.parse_args()
+
+    pages = args.pages or [os.path.join(APP_DIR, "app.py")] + sorted(glob.glob(os.path.join(APP_DIR, "pages", "*.py")))
+
+    results = {}
+    for path in pages:
+        name = os.path.relpath(os.path.abspath(path), APP_DIR)
+        results[name] = measure(path, args.repeat)
+        result = results[name]
+        note = f"  (未インストール: {', '.join(result['missing'])})" if result["missing"] else ""
+        print(f"{name:<40} {result['median_ms']:>8.1f} ms  (min {result['min_ms']:.1f} / max {result['max_ms']:.1f}){note}")
+
+    entry = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "pages": results,
+    }
+    storage.update_document(args.output, lambda history: (history or []) + [entry], default=[])
+    print(f"結果を {args.output} に記録しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+日ごとの特徴量テーブル
+
+自己分析（06）と AI サポート（07）の分析は、感情ログ・成長記録・習慣の記録・小さな成功・
+アクティビティログなどをそれぞれ全件読み込み、日付で突き合わせて集計していた。
+これを「1 日 1 行」の特徴量のテーブルにまとめ、グラフや傾向の判定はこのテーブルを読む。
+
+    - 各列は rollups の日のバケット（書き込みのたびに差分で更新される）から取る
+    - テーブルはデータセットごとに {日付: 列の値} で保持し、storage の変更通知で
+      追加・削除したレコードの日だけを作り直す（ほかのプロセスの書き込みなどで差分が
+      わからないときは、そのデータセットの列を作り直す）
+    - 感情のポジティブ・ネガティブの列は emotions.json の設定で変わるので、
+      emotion_taxonomy のバージョンが変わったら感情ログの列を作り直す
+    - DataFrame（列ごとの配列）はいずれかのデータが変わったときだけ作る
+
+    features = daily_features.frame(start="2024-05-01")
+    features[["positive_ratio", "habits_achieved"]].corr()
+"""
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+import emotion_taxonomy
+import rollups
+import storage
+
+
+# データセットごとの列（日のバケットから列の値を取り出す）
+def _emotion_columns(bucket):
+    types = rollups.emotion_types(bucket)
+    return {
+        "emotions": bucket["count"],
+        "positive": types.get("positive", 0),
+        "neutral": types.get("neutral", 0),
+        "negative": types.get("negative", 0),
+    }
+
+FEATURES = {
+    "ai_daily_logs": lambda b: {"mood": rollups.mean(b, "mood"), "progress": rollups.mean(b, "progress")},
+    "emotion_logs": _emotion_columns,
+    "habit_records": lambda b: {"habit_records": b["count"], "habits_achieved": rollups.distribution(b, "status").get("達成", 0)},
+    "small_wins": lambda b: {"wins": b["count"]},
+    "points_ledger": lambda b: {"points": rollups.total(b, "amount")},
+    "activity_log": lambda b: {"activities": b["count"]},
+    "growth_data": lambda b: {"growth_records": b["count"]},
+    "tasks": lambda b: {"tasks_completed": b["count"]},
+    "self_esteem_log": lambda b: {"self_esteem": rollups.mean(b, "score")},
+}
+
+# 列の値がデータ以外の設定にも依存するデータセット（設定のバージョンを返す関数）
+DEPENDENCIES = {
+    "emotion_logs": emotion_taxonomy.version,
+}
+
+# 平均の列（記録のない日は NaN）。ほかの列は件数・合計なので記録のない日は 0
+MEAN_COLUMNS = ["mood", "progress", "self_esteem"]
+COUNT_COLUMNS = [
+    "emotions", "positive", "neutral", "negative", "habit_records", "habits_achieved",
+    "wins", "points", "activities", "growth_records", "tasks_completed",
+]
+# positive_ratio はその日の感情の記録に占めるポジティブな感情の割合（%）
+COLUMNS = MEAN_COLUMNS + COUNT_COLUMNS + ["positive_ratio"]
+
+
+# 日ごとの行の保持
+_sources = {dataset: {"signature": None, "dependency": None, "rows": {}, "dirty": set()} for dataset in FEATURES}
+_frame = {"version": None, "frame": None}
+_lock = threading.Lock()
+
+def _date_field(dataset):
+    return rollups.ROLLUPS[dataset].get("date_field") or storage.DATASETS[dataset]["date_field"]
+
+def _on_change(dataset, before, after, added, removed):
+    """書き込みのあった日を作り直す対象にする（storage から呼ばれる）"""
+    source = _sources.get(dataset)
+    if source is None:
+        return
+    with _lock:
+        if source["signature"] != before or added is None:
+            # 差分を反映する元がないので、次に読むときにこのデータセットの列を作り直す
+            source["signature"] = None
+            return
+        date_field = _date_field(dataset)
+        for record in [*added, *removed]:
+            value = record.get(date_field)
+            if value is not None and value != "":
+                source["dirty"].add(str(value)[:10])
+        source["signature"] = after
+
+storage.add_listener(_on_change)
+
+def _refresh(dataset):
+    """データセットの行をデータに合わせる（変わった日だけ作り直す）"""
+    signature = storage.table(dataset).signature()
+    dependency = _dependency(dataset)
+    # 集計値の作り直しはデータセットのロックを取るので、_lock の外で読んでおく
+    buckets = rollups.buckets(dataset, "day")
+    extract = FEATURES[dataset]
+    with _lock:
+        source = _sources[dataset]
+        if source["signature"] != signature or source["dependency"] != dependency:
+            source["rows"] = {day: extract(bucket) for day, bucket in buckets.items()}
+            source["signature"] = signature
+            source["dependency"] = dependency
+        else:
+            for day in source["dirty"]:
+                bucket = buckets.get(day)
+                if bucket is None:
+                    source["rows"].pop(day, None)
+                else:
+                    source["rows"][day] = extract(bucket)
+        source["dirty"] = set()
+        return dict(source["rows"])
+
+def _dependency(dataset):
+    """列の値が依存する設定のバージョン（なければ None）"""
+    dependency = DEPENDENCIES.get(dataset)
+    return dependency() if dependency is not None else None
+
+def version():
+    """特徴量のもとになるデータと設定のバージョン（いずれかが変わると変わる）"""
+    return json.dumps([(storage.table(dataset).signature(), _dependency(dataset)) for dataset in FEATURES])
+
+def _build():
+    frame = pd.concat([pd.DataFrame.from_dict(_refresh(dataset), orient="index") for dataset in FEATURES], axis=1)
+    frame = frame.reindex(columns=MEAN_COLUMNS + COUNT_COLUMNS)
+    frame.index = pd.to_datetime(frame.index, errors="coerce", format="%Y-%m-%d")
+    frame = frame[frame.index.notna()].sort_index()
+    frame.index.name = "date"
+    frame[MEAN_COLUMNS] = frame[MEAN_COLUMNS].astype(float)
+    frame[COUNT_COLUMNS] = frame[COUNT_COLUMNS].fillna(0)
+    integers = [column for column in COUNT_COLUMNS if column != "points"]
+    frame[integers] = frame[integers].astype(np.int64)
+    emotions = frame["emotions"].where(frame["emotions"] > 0)
+    frame["positive_ratio"] = frame["positive"] / emotions * 100
+    return frame
+
+
+# 参照
+def frame(start=None, end=None, columns=None):
+    """日ごとの特徴量の DataFrame（index は日付。start / end は両端を含む）
+
+    どれかのデータセットに記録のある日だけを含む。
+    """
+    current = version()
+    with _lock:
+        cached = _frame["frame"] if _frame["version"] == current else None
+    if cached is None:
+        cached = _build()
+        with _lock:
+            _frame.update(version=current, frame=cached)
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    result = cached.loc[start:end]
+    if columns is not None:
+        result = result[columns]
+    # キャッシュを呼び出し側が変更しても影響しないようにコピーを返す
+    return result.copy()
@@ -0,0 +1,94 @@
+"""
+感情の分類（ポジティブ・ニュートラル・ネガティブ）の共通モジュール
+
+成長記録（01）と感情ログ（03・06・07）で使う感情の語を 1 つの対応表にまとめ、
+どのページでも同じ感情を同じタイプに分類する。
+
+対応表は既定の語に emotions.json（01 で作成する感情の一覧）の内容を重ねたもので、
+emotions.json が変わったときだけ作り直し、変更できない形で共有する。
+一覧にない感情は neutral とみなす。
+
+    df['emotion_type'] = emotion_taxonomy.categorize(df['emotion'])
+"""
+import functools
+import types
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+EMOTIONS_FILE = "emotions.json"
+
+# 感情のタイプ（categorize の結果のカテゴリーの順序）
+EMOTION_TYPES = ("positive", "neutral", "negative")
+EMOTION_TYPE_DTYPE = pd.CategoricalDtype(list(EMOTION_TYPES))
+DEFAULT_TYPE = "neutral"
+
+# 既定の感情の語（成長記録・感情ログ・AI サポートで使っている語をまとめたもの）
+DEFAULT_EMOTIONS = {
+    "positive": [
+        "喜び", "楽しさ", "満足", "安心", "希望", "感謝", "興味", "誇り",
+        "嬉しい", "誇らしい", "わくわく", "達成感", "自信",
+    ],
+    "neutral": ["普通", "平静", "集中", "思慮深い", "穏やか", "安定"],
+    "negative": [
+        "悲しみ", "不安", "怒り", "恐れ", "疲労", "退屈", "混乱", "罪悪感",
+        "心配", "疲れ", "緊張", "不満", "困惑", "悲しい", "フラストレーション", "落ち込み",
+    ],
+}
+
+
+def version():
+    """対応表のバージョン（emotions.json を書き換えると変わる）"""
+    return storage.document_signature(EMOTIONS_FILE)
+
+def taxonomy():
+    """感情 → タイプの対応表（読み取り専用。emotions.json が変わったときだけ作り直す）"""
+    return _taxonomy(version())
+
+@functools.lru_cache(maxsize=1)
+def _taxonomy(version):
+    mapping = {}
+    saved = storage.load_document(EMOTIONS_FILE, default={}) or {}
+    for source in (DEFAULT_EMOTIONS, saved):
+        for emotion_type in EMOTION_TYPES:
+            for emotion in source.get(emotion_type, []):
+                mapping[emotion] = emotion_type
+    return types.MappingProxyType(mapping)
+
+@functools.lru_cache(maxsize=1)
+def _lookup(version):
+    """categorize 用の索引とタイプのコード（最後の要素は一覧にない感情のコード）"""
+    mapping = _taxonomy(version)
+    index = pd.Index(list(mapping), dtype=object)
+    codes = np.array(
+        [EMOTION_TYPES.index(t) for t in mapping.values()] + [EMOTION_TYPES.index(DEFAULT_TYPE)],
+        dtype=np.int8,
+    )
+    return index, codes
+
+def polarity(emotion):
+    """感情 1 つのタイプ（positive / neutral / negative）"""
+    return taxonomy().get(emotion, DEFAULT_TYPE)
+
+def categorize(emotions):
+    """感情の列をまとめてタイプに変換し、カテゴリー型の Series で返す
+
+    1 行ずつ判定せず、索引で一括して引くので行数が多くても速い。
+    """
+    if not isinstance(emotions, pd.Series):
+        emotions = pd.Series(list(emotions), dtype=object)
+    index, codes = _lookup(version())
+    if isinstance(emotions.dtype, pd.CategoricalDtype):
+        # カテゴリー型ならカテゴリーの数だけ引けばよい（欠損のコード -1 も codes の最後を指す）
+        by_category = np.append(codes[index.get_indexer(emotions.cat.categories.astype(object))], codes[-1])
+        type_codes = by_category[emotions.cat.codes.to_numpy()]
+    else:
+        # get_indexer は一覧にない感情を -1 にするので、codes の最後（neutral）を指す
+        type_codes = codes[index.get_indexer(emotions.astype(object))]
+    return pd.Series(
+        pd.Categorical.from_codes(type_codes, dtype=EMOTION_TYPE_DTYPE),
+        index=emotions.index,
+        name="emotion_type",
+    )
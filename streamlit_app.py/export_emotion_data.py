@@ -1,19 +1,19 @@
 import json
+import os
 import pandas as pd
+import storage
 from datetime import datetime
 
 # データファイルのパス
 EMOTION_LOGS_FILE = "emotion_logs.json"
 
 def load_emotion_logs():
-    """感情ログデータを読み込む"""
-    try:
-        with open(EMOTION_LOGS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
-    except FileNotFoundError:
+    """感情ログデータを読み込む（ジャーナルに追記された分も含む）"""
+    if not os.path.exists(EMOTION_LOGS_FILE):
         print(f"ファイルが見つかりません: {EMOTION_LOGS_FILE}")
         return []
+    try:
+        return storage.table("emotion_logs").records()
     except json.JSONDecodeError:
         print("JSONファイルの読み込みに失敗しました")
         return []
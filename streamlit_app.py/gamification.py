@@ -0,0 +1,231 @@
+"""
+ポイント・バッジ・称号・チャレンジのルールエンジン
+
+ページは「タスクを完了した」「ログインした」などの出来事（イベント）を渡すだけにし、
+どのバッジや称号を獲得するかはこのモジュールのルールで判定する。
+
+    - ルールは反応するイベントを持ち、そのイベントが起きたときだけ判定する
+    - 獲得済みのバッジ・称号は判定しない（設定系ファイルのキャッシュから確認する）
+    - 判定に使う値（目標数・活動日数など）は aggregates の集計値から必要な分だけ求める
+    - 1 回の操作で起きたイベントをまとめて判定し、ポイント・バッジ・称号・チャレンジ・
+      実績はそれぞれ最大 1 回の書き込みで保存する
+    - ポイントは points_ledger の台帳に記録する。key を渡したイベントは同じ key で
+      2 回目以降に送られてもポイントを付けない
+
+    result = gamification.dispatch("goal_created", points=10, reason="目標の設定", key=f"goal_created:{goal_id}")
+
+    with gamification.interaction() as session:
+        session.emit("task_completed", points=task["points"], reason="タスク完了")
+        session.emit("goal_completed", points=50, reason="目標達成")
+    session.result  # {"points": 現在のポイント, "awarded": 今回の合計, "badges": [...], ...}
+"""
+import uuid
+from contextlib import contextmanager
+from datetime import date
+
+import aggregates
+import points_ledger
+import storage
+import streaks
+
+BADGES_FILE = "badges.json"
+TITLES_FILE = "titles.json"
+CHALLENGES_FILE = "challenges.json"
+REWARDS_FILE = "goal_rewards.json"
+PROBLEMS_FILE = "goal_problems.json"
+
+# すべてのバッジを判定し直すイベント（ページを開いたときの確認など）
+SYNC = "sync"
+
+# バッジを獲得したときのポイント
+BADGE_POINTS = 30
+
+# バッジのルール（events: 判定するイベント / fact: 判定に使う値 / at_least: 獲得に必要な値）
+BADGE_RULES = [
+    {"id": "first_goal", "events": {"goal_created"}, "fact": "goals_total", "at_least": 1},
+    {"id": "three_goals", "events": {"goal_created"}, "fact": "goals_total", "at_least": 3},
+    {"id": "first_complete", "events": {"goal_completed"}, "fact": "goals_completed", "at_least": 1},
+    {"id": "consistent", "events": {"task_completed"}, "fact": "task_streak", "at_least": 7},
+    {"id": "reward_planner", "events": {"reward_added"}, "fact": "rewards", "at_least": 3},
+    {"id": "problem_solver", "events": {"problem_added"}, "fact": "problems", "at_least": 3},
+]
+
+# 称号・チャレンジを判定するイベント
+TITLE_EVENTS = {"login"}
+CHALLENGE_EVENTS = {"login"}
+
+
+# 判定に使う値
+def _problem_count():
+    problems = storage.load_document(PROBLEMS_FILE, default=[]) or []
+    return sum(len(item.get("problems", [])) for item in problems)
+
+FACTS = {
+    "goals_total": lambda: aggregates.summary("goals")["total"],
+    "goals_completed": lambda: aggregates.summary("goals")["by_status"].get("completed", 0),
+    "task_streak": lambda: streaks.max_streak(list(aggregates.summary("tasks")["completed_by_day"])),
+    "rewards": lambda: len(storage.load_document(REWARDS_FILE, default=[]) or []),
+    "problems": _problem_count,
+    "activity_days": lambda: list(aggregates.summary("activity_log")["by_day"]),
+}
+
+class Facts:
+    """判定に使う値（最初に参照したときに 1 回だけ求める）"""
+
+    def __init__(self):
+        self._values = {}
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            self._values[name] = FACTS[name]()
+        return self._values[name]
+
+
+# 1 回の操作
+class Interaction:
+    """1 回の操作で起きたイベントを集め、commit でまとめて判定・保存する"""
+
+    def __init__(self, log_activity=False):
+        self.log_activity = log_activity
+        self.events = []
+        self.result = None
+
+    def emit(self, event, points=0, reason=None, key=None):
+        """イベントを追加する
+
+        points はそのイベント自体で得るポイント（マイナスなら減算）。
+        key はポイントの冪等キー（同じ key のポイントは 1 回だけ付く）。
+        """
+        self.events.append({"event": event, "points": points, "reason": reason or event, "key": key})
+
+    def commit(self):
+        """ルールを判定し、ポイント・バッジ・称号・チャレンジ・実績を保存する"""
+        triggered = {e["event"] for e in self.events}
+        facts = Facts()
+        awards = [(e["key"], e["points"], e["reason"]) for e in self.events if e["points"]]
+        achievements = []
+        result = {"points": None, "awarded": 0, "badges": [], "titles": [], "challenges": []}
+
+        for badge_id, name, points, reason in _award_badges(triggered, facts):
+            awards.append((f"badge:{badge_id}", points, reason))
+            result["badges"].append(name)
+        if triggered & TITLE_EVENTS:
+            for title, points in _award_titles(facts):
+                awards.append((f"title:{title['id']}", points, f"称号獲得: {title['name']}"))
+                achievements.append(_achievement(f"称号「{title['name']}」を獲得", title["description"], points))
+                result["titles"].append(title["name"])
+        if triggered & CHALLENGE_EVENTS:
+            for challenge in _update_challenges(facts):
+                points = challenge["reward_points"]
+                awards.append((f"challenge:{challenge.get('id') or challenge['name']}", points, f"チャレンジ達成: {challenge['name']}"))
+                achievements.append(_achievement(challenge["name"], challenge["description"], points))
+                result["challenges"].append(challenge["name"])
+
+        # 台帳に記録できたもの（記録済みの key を除き、減算は残高までに切り詰めたもの）だけを数える
+        posted = points_ledger.post(awards) if awards else []
+        result["awarded"] = sum(row["amount"] for row in posted)
+        result["points"] = points_balance()
+        if posted and self.log_activity:
+            today = date.today().strftime("%Y-%m-%d")
+            storage.table("activity_log").extend([
+                {"date": today, "activity_type": "ポイント獲得", "notes": row["reason"], "points": row["amount"]}
+                for row in posted
+            ])
+        if achievements:
+            storage.table("motivation_achievements").extend(achievements)
+
+        self.events = []
+        self.result = result
+        return result
+
+@contextmanager
+def interaction(log_activity=False):
+    """with の中で emit したイベントを、抜けるときにまとめて commit する
+
+    log_activity=True なら獲得したポイントをアクティビティログにも記録する。
+    """
+    session = Interaction(log_activity=log_activity)
+    yield session
+    session.commit()
+
+def dispatch(event, points=0, reason=None, key=None, log_activity=False):
+    """イベント 1 つだけの操作を判定・保存し、結果を返す"""
+    session = Interaction(log_activity=log_activity)
+    session.emit(event, points=points, reason=reason, key=key)
+    return session.commit()
+
+
+# ルールの判定と保存
+def _award_badges(triggered, facts):
+    """条件を満たした未獲得のバッジを獲得済みにし、(ID, 名前, ポイント, 理由) を返す"""
+    badges = (storage.load_document(BADGES_FILE, default={"badges": []}) or {}).get("badges", [])
+    earned = {badge["id"] for badge in badges if badge.get("earned")}
+    candidates = {
+        rule["id"] for rule in BADGE_RULES
+        if rule["id"] not in earned
+        and (SYNC in triggered or rule["events"] & triggered)
+        and facts[rule["fact"]] >= rule["at_least"]
+    }
+    if not candidates:
+        return []
+
+    # ほかのセッションが先に獲得していればポイントは付与しない
+    newly_earned = []
+    def mark_earned(data):
+        for badge in data["badges"]:
+            if badge["id"] in candidates and not badge["earned"]:
+                badge["earned"] = True
+                newly_earned.append(badge)
+    storage.update_document(BADGES_FILE, mark_earned)
+    return [(badge["id"], badge["name"], BADGE_POINTS, f"バッジ獲得: {badge['name']}") for badge in newly_earned]
+
+def _award_titles(facts):
+    """活動日数が条件を満たした未獲得の称号を獲得済みにし、(称号, ポイント) を返す"""
+    titles = (storage.load_document(TITLES_FILE, default={"titles": []}) or {}).get("titles", [])
+    active_days = len(facts["activity_days"])
+    if not any(not t["earned"] and active_days >= t["requirement"] for t in titles):
+        return []
+
+    newly_earned = []
+    def mark_earned(data):
+        for title in data["titles"]:
+            if not title["earned"] and active_days >= title["requirement"]:
+                title["earned"] = True
+                newly_earned.append(title)
+    storage.update_document(TITLES_FILE, mark_earned)
+    return [(title, title["requirement"] * 2) for title in newly_earned]
+
+def _update_challenges(facts):
+    """継続チャレンジの連続日数を更新し、新しく達成したチャレンジを返す"""
+    today = date.today().strftime("%Y-%m-%d")
+    completed = []
+    def update(challenges):
+        for challenge in challenges:
+            if challenge["completed"]:
+                continue
+            if challenge["start_date"] is None:
+                # まだ開始していなければ今日から開始
+                challenge["start_date"] = today
+                challenge["current_streak"] = 1
+                continue
+            # 開始日から途切れずに続いている日数
+            streak = streaks.streak_from(facts["activity_days"], challenge["start_date"])
+            challenge["current_streak"] = streak
+            if streak >= challenge["target_days"]:
+                challenge["completed"] = True
+                completed.append(challenge)
+    storage.update_document(CHALLENGES_FILE, update, default=[])
+    return completed
+
+def _achievement(name, description, points):
+    return {
+        "id": str(uuid.uuid4()),
+        "name": name,
+        "description": description,
+        "date": date.today().strftime("%Y-%m-%d"),
+        "points": points,
+    }
+
+def points_balance():
+    """現在のポイント"""
+    return points_ledger.balance()
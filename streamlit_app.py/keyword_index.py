@@ -0,0 +1,91 @@
+"""
+自由記述の単語頻度インデックス
+
+感情ログの thoughts、小さな成功の description、AI 日次ログの insights / challenges、
+成長記録の comment を tokenizer で単語に分割し、データセット・項目・日付ごとの
+出現回数として保持する。
+
+集計は aggregates に登録するので、レコードを保存するたびに追加・削除した
+レコードの単語だけを足し引きする。ページを表示するたびに全文を分割し直す必要はない。
+
+    keyword_index.top_keywords("small_wins", "description", start=..., end=..., top_n=10)
+"""
+from collections import Counter
+
+import aggregates
+import storage
+import tokenizer
+
+# 索引を作る自由記述の項目（データセット: 項目の一覧）
+TEXT_FIELDS = {
+    "emotion_logs": ["thoughts"],
+    "small_wins": ["description"],
+    "ai_daily_logs": ["insights", "challenges"],
+    "growth_data": ["comment"],
+}
+
+
+# ユーティリティ関数
+def _name(dataset):
+    """aggregates に登録する集計名"""
+    return f"{dataset}_keywords"
+
+def _day(value):
+    """日付の値から YYYY-MM-DD 部分を取り出す（date / datetime / 文字列に対応）"""
+    if value is None or value == "":
+        return None
+    return str(value)[:10]
+
+
+# 集計の定義
+def _make_init(fields):
+    def init():
+        return {field: {} for field in fields}
+    return init
+
+def _make_fold(dataset, fields):
+    date_field = storage.DATASETS[dataset]["date_field"]
+
+    def fold(summary, record, sign):
+        day = _day(record.get(date_field))
+        if day is None:
+            return
+        for field in fields:
+            terms = tokenizer.tokenize(record.get(field))
+            if not terms:
+                continue
+            counts = summary[field].setdefault(day, {})
+            for term, count in Counter(terms).items():
+                value = counts.get(term, 0) + count * sign
+                if value:
+                    counts[term] = value
+                else:
+                    counts.pop(term, None)
+            if not counts:
+                del summary[field][day]
+    return fold
+
+for _dataset, _fields in TEXT_FIELDS.items():
+    aggregates.register(_name(_dataset), _dataset, _make_init(_fields), _make_fold(_dataset, _fields))
+
+
+# 検索
+def top_keywords(dataset, field=None, start=None, end=None, top_n=10):
+    """出現回数の多い単語を (単語, 回数) のリストで返す
+
+    field を省略するとデータセットのすべての項目を合算する。
+    start / end を指定するとその期間（両端を含む）の記録だけを数える。
+    回数が同じ場合は単語の順に並べる。
+    """
+    if dataset not in TEXT_FIELDS:
+        raise KeyError(f"単語の索引がないデータセットです: {dataset}")
+    fields = TEXT_FIELDS[dataset] if field is None else [field]
+    start, end = _day(start), _day(end)
+
+    index = aggregates.summary(_name(dataset))
+    counts = Counter()
+    for name in fields:
+        for day, terms in index.get(name, {}).items():
+            if (start is None or day >= start) and (end is None or day <= end):
+                counts.update(terms)
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:top_n]
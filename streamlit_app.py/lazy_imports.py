@@ -0,0 +1,68 @@
+"""
+重いライブラリの遅延インポート
+
+Streamlit はページを開くたびにページのスクリプトを実行し直すので、先頭で
+plotly や matplotlib、wordcloud などを読み込むと、そのライブラリを使わない
+操作でも最初の表示が遅くなる。
+
+lazy_import("plotly.express") はモジュールの代わりになるオブジェクトを返し、
+最初に属性を参照したとき（px.bar(...) などを実行したとき）に本当にインポートする。
+すでにインポート済みのモジュールはそのまま返す。
+
+    px = lazy_imports.lazy_import("plotly.express")
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """最初に属性を参照したときにインポートするモジュール"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_lock"] = threading.Lock()
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        """モジュールをインポートする（2 回目以降はインポート済みのものを返す）"""
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    @property
+    def is_loaded(self):
+        """インポート済みかどうか"""
+        return self.__dict__["_lazy_module"] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name):
+    """インポートを最初の使用時まで遅らせたモジュールを返す"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+def is_available(name):
+    """モジュールがインストールされているか（インポートせずに確認する）"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
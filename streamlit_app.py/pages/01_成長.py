@@ -1,13 +1,19 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import json
 import os
 import random
+import storage
+import emotion_taxonomy
+import aggregates
+import reports
+import streaks
+import lazy_imports
+
+# 重いライブラリは使うときに読み込む
+px = lazy_imports.lazy_import("plotly.express")
 
 # ページの設定
 st.set_page_config(
@@ -90,12 +96,10 @@ EMOTIONS_FILE = "emotions.json"
 # データファイルの初期化
 def initialize_data_files():
     if not os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(DATA_FILE, [])
     
     if not os.path.exists(ACHIEVEMENTS_FILE):
-        with open(ACHIEVEMENTS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(ACHIEVEMENTS_FILE, [])
     
     if not os.path.exists(MILESTONES_FILE):
         default_milestones = [
@@ -105,8 +109,7 @@ def initialize_data_files():
             {"name": "習慣化マスター", "description": "30日連続で記録", "required_streak": 30, "achieved": False},
             {"name": "バランスの達人", "description": "3つ以上のカテゴリーで記録", "required_categories": 3, "achieved": False},
         ]
-        with open(MILESTONES_FILE, "w") as f:
-            json.dump(default_milestones, f)
+        storage.save_document(MILESTONES_FILE, default_milestones)
     
     if not os.path.exists(EMOTIONS_FILE):
         default_emotions = {
@@ -114,42 +117,36 @@ def initialize_data_files():
             "neutral": ["普通", "平静", "集中", "思慮深い", "穏やか", "安定"],
             "negative": ["不安", "心配", "疲れ", "緊張", "不満", "困惑"]
         }
-        with open(EMOTIONS_FILE, "w") as f:
-            json.dump(default_emotions, f)
+        storage.save_document(EMOTIONS_FILE, default_emotions)
 
 # 初期化を実行
 initialize_data_files()
 
+# 月間レポートのバックグラウンド生成を開始
+reports.start()
+
 # データを読み込む関数
-def load_data():
-    with open(DATA_FILE, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data) if data else pd.DataFrame(columns=["date", "category", "achievement", "value", "comment", "emotion"])
+def load_data(typed=False):
+    return storage.table("growth_data").load(typed=typed)
 
 def load_achievements():
-    with open(ACHIEVEMENTS_FILE, "r") as f:
-        return json.load(f)
+    return storage.table("achievements").records()
 
 def load_milestones():
-    with open(MILESTONES_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(MILESTONES_FILE)
 
 def load_emotions():
-    with open(EMOTIONS_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(EMOTIONS_FILE)
 
 # データを保存する関数
 def save_data(df):
-    with open(DATA_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("growth_data").save(df)
 
 def save_achievements(achievements):
-    with open(ACHIEVEMENTS_FILE, "w") as f:
-        json.dump(achievements, f)
+    storage.table("achievements").save(achievements)
 
 def save_milestones(milestones):
-    with open(MILESTONES_FILE, "w") as f:
-        json.dump(milestones, f)
+    storage.save_document(MILESTONES_FILE, milestones)
 
 # ページ内ナビゲーション
 st.markdown('<h1 class="main-header">🌱 成長の可視化</h1>', unsafe_allow_html=True)
@@ -164,8 +161,8 @@ page = st.sidebar.radio(
 def show_dashboard():
     st.markdown('<h2 class="sub-header">📊 成長ダッシュボード</h2>', unsafe_allow_html=True)
     
-    # データを読み込む
-    df = load_data()
+    # データを読み込む（日付は datetime 型で受け取る）
+    df = load_data(typed=True)
     
     if df.empty:
         st.info("まだ記録がありません。「成長記録の追加」から最初の記録を追加しましょう！")
@@ -182,28 +179,28 @@ def show_dashboard():
             <h4>{latest['achievement']}</h4>
             <p>カテゴリー: {latest['category']}</p>
             <p>達成値: {latest['value']}</p>
-            <p>達成日: {latest['date']}</p>
+            <p>達成日: {latest['date']:%Y-%m-%d}</p>
             <p>コメント: {latest['comment']}</p>
-            <p>感情: <span class="emotion-{get_emotion_type(latest['emotion'])}">{latest['emotion']}</span></p>
+            <p>感情: <span class="emotion-{emotion_taxonomy.polarity(latest['emotion'])}">{latest['emotion']}</span></p>
         </div>
         """, unsafe_allow_html=True)
     
     with col2:
         st.markdown("### 成長の統計")
-        total_achievements = len(df)
-        categories = df['category'].nunique()
+        # 件数は書き込み時に更新している集計値から読む
+        summary = aggregates.summary("growth_data")
+        total_achievements = summary["total"]
+        categories = len(summary["by_category"])
         
         # カテゴリー別の達成数を計算
-        category_counts = df['category'].value_counts()
+        category_counts = pd.Series(summary["by_category"], dtype="int64")
         most_frequent_category = category_counts.idxmax()
         most_frequent_count = category_counts.max()
         
-        # 連続記録の計算
-        df_sorted = df.sort_values('date')
-        dates = pd.to_datetime(df_sorted['date'])
-        streaks = calc_streaks(dates)
-        current_streak = streaks[-1] if streaks else 0
-        max_streak = max(streaks) if streaks else 0
+        # 連続記録の計算（記録のある日の一覧から求める）
+        record_days = list(summary["by_day"])
+        current_streak = streaks.current_streak(record_days)
+        max_streak = streaks.max_streak(record_days)
         
         st.markdown(f"""
         <div class="progress-container">
@@ -223,9 +220,7 @@ def show_dashboard():
     selected_category = st.selectbox("カテゴリーを選択", categories)
     
     # 選択したカテゴリーのデータをフィルタリング
-    filtered_df = df[df['category'] == selected_category].copy()
-    filtered_df['date'] = pd.to_datetime(filtered_df['date'])
-    filtered_df = filtered_df.sort_values('date')
+    filtered_df = df[df['category'] == selected_category].sort_values('date')
     
     if not filtered_df.empty:
         # 値の推移グラフ
@@ -245,11 +240,7 @@ def show_dashboard():
         
         # 感情分析
         emotion_df = filtered_df.copy()
-        emotions = load_emotions()
-        emotion_df['emotion_type'] = emotion_df['emotion'].apply(lambda x: 
-            'positive' if x in emotions['positive'] else 
-            'negative' if x in emotions['negative'] else 'neutral'
-        )
+        emotion_df['emotion_type'] = emotion_taxonomy.categorize(emotion_df['emotion'])
         
         emotion_counts = emotion_df['emotion_type'].value_counts().reset_index()
         emotion_counts.columns = ['感情タイプ', '回数']
@@ -277,10 +268,7 @@ def show_dashboard():
         today = datetime.now().date()
         week_ago = today - timedelta(days=7)
         
-        recent_df = df.copy()
-        recent_df['date'] = pd.to_datetime(recent_df['date']).dt.date
-        
-        recent_records = recent_df[recent_df['date'] >= week_ago]
+        recent_records = df[df['date'] >= pd.Timestamp(week_ago)]
         
         if not recent_records.empty:
             week_achievements = len(recent_records)
@@ -388,25 +376,18 @@ def show_add_achievement():
                     "emotion": emotion
                 }
                 
-                if df.empty:
-                    df = pd.DataFrame([new_record])
-                else:
-                    df = pd.concat([df, pd.DataFrame([new_record])], ignore_index=True)
-                
-                save_data(df)
+                storage.table("growth_data").append(new_record)
                 
                 # 達成記録の追加
-                achievements = load_achievements()
                 achievement_record = {
                     "date": date.strftime("%Y-%m-%d"),
                     "achievement": achievement,
                     "category": category
                 }
-                achievements.append(achievement_record)
-                save_achievements(achievements)
+                storage.table("achievements").append(achievement_record)
                 
                 # マイルストーンの確認と更新
-                check_and_update_milestones(df)
+                check_and_update_milestones(load_data(typed=True))
                 
                 st.success("記録を追加しました！")
                 st.balloons()
@@ -416,7 +397,7 @@ def show_reflection():
     st.markdown('<h2 class="sub-header">🔄 成長の振り返り</h2>', unsafe_allow_html=True)
     
     # データを読み込む
-    df = load_data()
+    df = load_data(typed=True)
     
     if df.empty:
         st.info("まだ記録がありません。「成長記録の追加」から最初の記録を追加しましょう！")
@@ -573,9 +554,12 @@ def show_milestones():
     st.markdown("### 挑戦中のマイルストーン")
     
     if not_achieved:
+        # 特徴量は一度だけ計算し、すべてのマイルストーンで共有する
+        features = calculate_milestone_features(load_data(typed=True))
+        
         for milestone in not_achieved:
             # 進捗状況の計算
-            progress = calculate_milestone_progress(milestone)
+            progress = calculate_milestone_progress(milestone, features)
             
             st.markdown(f"""
             <div class="milestone" style="opacity: 0.7;">
@@ -592,8 +576,7 @@ def show_milestones():
 
 # ユーティリティ関数
 def filter_by_period(df, period):
-    df_copy = df.copy()
-    df_copy['date'] = pd.to_datetime(df_copy['date'])
+    """期間で絞り込む（df は load_data(typed=True) の DataFrame）"""
     today = pd.Timestamp(datetime.now().date())
     
     if period == "1週間":
@@ -607,267 +590,88 @@ def filter_by_period(df, period):
     elif period == "1年":
         start_date = today - pd.Timedelta(days=365)
     else:  # 全期間
-        return df_copy
+        return df
     
-    return df_copy[df_copy['date'] >= start_date]
+    return df[df['date'] >= start_date]
 
-def calc_streaks(dates):
-    """連続記録の日数を計算する"""
-    if len(dates) < 1:
-        return []
-    
-    # 日付をソート
-    sorted_dates = sorted(dates)
-    
-    # 1日ごとのカウント用のインデックスを作成
-    date_range = pd.date_range(start=sorted_dates[0], end=sorted_dates[-1])
-    date_index = pd.DataFrame(index=date_range)
-    
-    # 記録がある日付に1を設定
-    date_index['recorded'] = 0
-    for date in sorted_dates:
-        date_index.loc[date, 'recorded'] = 1
-    
-    # 連続日数の計算
-    streaks = []
-    current_streak = 0
-    
-    for recorded in date_index['recorded']:
-        if recorded == 1:
-            current_streak += 1
-        else:
-            streaks.append(current_streak)
-            current_streak = 0
-    
-    # 最後の連続記録を追加
-    if current_streak > 0:
-        streaks.append(current_streak)
-    
-    return streaks
+# マイルストーンの条件（条件のキー → 判定に使う特徴量）。先に書いたものから順に判定する
+MILESTONE_RULES = [
+    ("required_count", "max_category_count"),   # 同じカテゴリーでの繰り返し回数
+    ("required_growth", "max_growth"),          # カテゴリーごとの成長率の最大値
+    ("required_total", "total"),                # 総記録数
+    ("required_streak", "max_streak"),          # 最長の連続記録日数
+    ("required_categories", "categories"),      # カテゴリー数
+]
 
-def get_emotion_type(emotion):
-    """感情のタイプ（positive, neutral, negative）を取得"""
-    emotions = load_emotions()
-    if emotion in emotions['positive']:
-        return 'positive'
-    elif emotion in emotions['negative']:
-        return 'negative'
-    else:
-        return 'neutral'
+def calculate_milestone_features(df):
+    """マイルストーンの判定に使う特徴量をまとめて計算する（df は load_data(typed=True) の DataFrame）"""
+    if df.empty:
+        return {"total": 0, "max_category_count": 0, "categories": 0, "max_growth": 0, "max_streak": 0}
+    
+    category_counts = df['category'].value_counts()
+    
+    # カテゴリーごとの最初と最後の値（日付順に 1 回だけ並べ替える）
+    values = df[['date', 'category']].assign(value=pd.to_numeric(df['value'], errors='coerce'))
+    values = values.sort_values('date', kind='stable')
+    first = values.drop_duplicates('category', keep='first').set_index('category')['value']
+    last = values.drop_duplicates('category', keep='last').set_index('category')['value']
+    counts = category_counts.reindex(first.index)
+    growth = ((last - first) / first * 100)[(counts >= 2) & (first > 0)]
+    
+    return {
+        "total": len(df),
+        "max_category_count": int(category_counts.max()),
+        "categories": len(category_counts),
+        "max_growth": max(0, float(growth.max())) if growth.notna().any() else 0,
+        "max_streak": streaks.max_streak(df['date']),
+    }
+
+def calculate_milestone_progress(milestone, features):
+    """マイルストーンの進捗状況を特徴量から求める"""
+    for requirement, feature in MILESTONE_RULES:
+        if requirement in milestone:
+            current = features[feature]
+            required = milestone[requirement]
+            return {
+                'current': round(current, 1) if isinstance(current, float) else current,
+                'required': required,
+                'percentage': min(100, int(current / required * 100)),
+                'achieved': current >= required
+            }
+    
+    return {'current': 0, 'required': 1, 'percentage': 0, 'achieved': False}
 
 def check_and_update_milestones(df):
-    """マイルストーンの達成状況を確認・更新する"""
+    """マイルストーンの達成状況を確認・更新する（達成したものがあるときだけ保存する）"""
     milestones = load_milestones()
+    features = calculate_milestone_features(df)
     updated = False
     
-    for i, milestone in enumerate(milestones):
-        if not milestone.get('achieved', False):  # まだ達成していないマイルストーンのみチェック
-            achieved = False
-            
-            # マイルストーンのタイプによってチェック方法を変える
-            if 'required_count' in milestone:
-                # 同じカテゴリーでの繰り返し回数チェック
-                category_counts = df['category'].value_counts()
-                if (category_counts >= milestone['required_count']).any():
-                    achieved = True
-            
-            elif 'required_growth' in milestone:
-                # 成長率のチェック
-                for category in df['category'].unique():
-                    cat_data = df[df['category'] == category].sort_values('date')
-                    if len(cat_data) >= 2:
-                        first_value = cat_data.iloc[0]['value']
-                        last_value = cat_data.iloc[-1]['value']
-                        if first_value > 0:  # ゼロ除算を避ける
-                            growth_rate = (last_value - first_value) / first_value * 100
-                            if growth_rate >= milestone['required_growth']:
-                                achieved = True
-                                break
-            
-            elif 'required_total' in milestone:
-                # 総記録数のチェック
-                if len(df) >= milestone['required_total']:
-                    achieved = True
-
-            elif 'required_streak' in milestone:
-                # 連続記録のチェック
-                dates = pd.to_datetime(df.sort_values('date')['date'])
-                streaks = calc_streaks(dates)
-                if streaks and max(streaks) >= milestone['required_streak']:
-                    achieved = True
-            
-            elif 'required_categories' in milestone:
-                # カテゴリー数のチェック
-                if df['category'].nunique() >= milestone['required_categories']:
-                    achieved = True
-            
-            # 達成した場合、マイルストーンを更新
-            if achieved:
-                milestones[i]['achieved'] = True
-                milestones[i]['achieved_date'] = datetime.now().strftime("%Y-%m-%d")
-                updated = True
+    for milestone in milestones:
+        # まだ達成していないマイルストーンのみチェック
+        if not milestone.get('achieved', False) and calculate_milestone_progress(milestone, features)['achieved']:
+            milestone['achieved'] = True
+            milestone['achieved_date'] = datetime.now().strftime("%Y-%m-%d")
+            updated = True
     
     if updated:
         save_milestones(milestones)
 
-def calculate_milestone_progress(milestone):
-    """マイルストーンの進捗状況を計算する"""
-    df = load_data()
-    
-    if 'required_count' in milestone:
-        # 同じカテゴリーでの繰り返し回数チェック
-        category_counts = df['category'].value_counts()
-        max_count = category_counts.max() if not category_counts.empty else 0
-        return {
-            'current': max_count,
-            'required': milestone['required_count'],
-            'percentage': min(100, int(max_count / milestone['required_count'] * 100))
-        }
-    
-    elif 'required_growth' in milestone:
-        # 成長率のチェック
-        max_growth = 0
-        for category in df['category'].unique():
-            cat_data = df[df['category'] == category].sort_values('date')
-            if len(cat_data) >= 2:
-                first_value = cat_data.iloc[0]['value']
-                last_value = cat_data.iloc[-1]['value']
-                if first_value > 0:  # ゼロ除算を避ける
-                    growth_rate = (last_value - first_value) / first_value * 100
-                    max_growth = max(max_growth, growth_rate)
-        
-        return {
-            'current': round(max_growth, 1),
-            'required': milestone['required_growth'],
-            'percentage': min(100, int(max_growth / milestone['required_growth'] * 100))
-        }
-    
-    elif 'required_total' in milestone:
-        # 総記録数のチェック
-        total = len(df)
-        return {
-            'current': total,
-            'required': milestone['required_total'],
-            'percentage': min(100, int(total / milestone['required_total'] * 100))
-        }
-    
-    elif 'required_streak' in milestone:
-        # 連続記録のチェック
-        dates = pd.to_datetime(df.sort_values('date')['date'])
-        streaks = calc_streaks(dates)
-        max_streak = max(streaks) if streaks else 0
-        
-        return {
-            'current': max_streak,
-            'required': milestone['required_streak'],
-            'percentage': min(100, int(max_streak / milestone['required_streak'] * 100))
-        }
-    
-    elif 'required_categories' in milestone:
-        # カテゴリー数のチェック
-        categories = df['category'].nunique()
-        return {
-            'current': categories,
-            'required': milestone['required_categories'],
-            'percentage': min(100, int(categories / milestone['required_categories'] * 100))
-        }
-    
-    return {'current': 0, 'required': 1, 'percentage': 0}
-
 def generate_monthly_report():
-    """月間レポートを自動生成する"""
-    df = load_data()
-    if df.empty:
+    """先月の月間レポート（バックグラウンドで生成して保存したものを読む）"""
+    if not aggregates.summary("growth_data")["total"]:
         return "まだデータがありません。"
     
-    # 今月のデータ
-    df['date'] = pd.to_datetime(df['date'])
-    today = datetime.now()
-    first_day = today.replace(day=1)
-    last_month = first_day - timedelta(days=1)
-    first_day_last_month = last_month.replace(day=1)
-    
-    # 先月のデータを抽出
-    last_month_data = df[(df['date'] >= first_day_last_month) & (df['date'] < first_day)]
+    last_month = datetime.now().replace(day=1) - timedelta(days=1)
+    report = reports.monthly_report(last_month.year, last_month.month)
+    if report is None:
+        # まだ生成していなければ生成を依頼して待つ
+        report = reports.request_monthly(last_month.year, last_month.month).result()
     
-    if last_month_data.empty:
+    if report is None:
         return "先月のデータがありません。"
     
-    # 基本統計
-    total_achievements = len(last_month_data)
-    categories = last_month_data['category'].nunique()
-    category_counts = last_month_data['category'].value_counts()
-    most_frequent_category = category_counts.idxmax() if not category_counts.empty else "なし"
-    
-    # 成長率の計算
-    growth_data = []
-    for category in last_month_data['category'].unique():
-        cat_data = last_month_data[last_month_data['category'] == category].sort_values('date')
-        if len(cat_data) >= 2:
-            first_value = cat_data.iloc[0]['value']
-            last_value = cat_data.iloc[-1]['value']
-            if first_value > 0:  # ゼロ除算を避ける
-                growth_rate = (last_value - first_value) / first_value * 100
-                growth_data.append((category, growth_rate))
-    
-    # レポート生成
-    report = f"## {last_month.year}年{last_month.month}月の振り返りレポート\n\n"
-    report += f"### 基本統計\n"
-    report += f"- 総記録数: {total_achievements}件\n"
-    report += f"- 活動カテゴリー数: {categories}個\n"
-    report += f"- 最も活動したカテゴリー: {most_frequent_category}\n\n"
-    
-    if growth_data:
-        report += f"### 成長率\n"
-        for category, rate in sorted(growth_data, key=lambda x: x[1], reverse=True):
-            report += f"- {category}: {rate:.1f}%\n"
-        
-        max_growth = max(growth_data, key=lambda x: x[1]) if growth_data else None
-        if max_growth:
-            report += f"\n**今月最も成長したのは {max_growth[0]} でした！ (成長率: {max_growth[1]:.1f}%)**\n\n"
-    
-    # 感情分析
-    emotions = load_emotions()
-    last_month_data['emotion_type'] = last_month_data['emotion'].apply(lambda x: 
-        'positive' if x in emotions['positive'] else 
-        'negative' if x in emotions['negative'] else 'neutral'
-    )
-    
-    emotion_counts = last_month_data['emotion_type'].value_counts()
-    total_emotions = emotion_counts.sum()
-    
-    if total_emotions > 0:
-        report += f"### 感情分析\n"
-        positive_ratio = emotion_counts.get('positive', 0) / total_emotions * 100
-        report += f"- ポジティブな感情の割合: {positive_ratio:.1f}%\n"
-        report += f"- ニュートラルな感情の割合: {emotion_counts.get('neutral', 0) / total_emotions * 100:.1f}%\n"
-        report += f"- ネガティブな感情の割合: {emotion_counts.get('negative', 0) / total_emotions * 100:.1f}%\n\n"
-        
-        if positive_ratio >= 70:
-            report += "**素晴らしい！ポジティブな感情が多かった月でした！**\n\n"
-        elif positive_ratio >= 50:
-            report += "**良い傾向です。ポジティブな感情がやや多めでした。**\n\n"
-        else:
-            report += "**次の月はもう少しポジティブな体験を増やしていきましょう。**\n\n"
-    
-    # 今月の目標提案
-    report += f"### 来月の目標提案\n"
-    
-    # カテゴリーごとの提案
-    for category in last_month_data['category'].unique():
-        report += f"- **{category}**: "
-        cat_data = last_month_data[last_month_data['category'] == category].sort_values('date')
-        if len(cat_data) >= 2:
-            last_value = cat_data.iloc[-1]['value']
-            # 簡単な目標提案（前月の最終値から5-10%アップ）
-            target = last_value * (1 + random.uniform(0.05, 0.1))
-            report += f"目標値 {target:.1f} を目指しましょう！\n"
-        else:
-            report += f"継続して記録していきましょう！\n"
-    
-    report += "\n**新しい月も頑張りましょう！**"
-    
-    return report
+    return report["report"]
 
 # 選択したページを表示
 if page == "ダッシュボード":
@@ -1,14 +1,18 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
 import json
 import os
 import random
 import uuid
+import storage
+import streaks
+import rollups
+import lazy_imports
+
+# 重いライブラリは使うときに読み込む
+px = lazy_imports.lazy_import("plotly.express")
 
 # ページの設定
 st.set_page_config(
@@ -160,16 +164,13 @@ MEDALS_FILE = "medals.json"
 # データファイルの初期化
 def initialize_habit_files():
     if not os.path.exists(HABITS_FILE):
-        with open(HABITS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(HABITS_FILE, [])
     
     if not os.path.exists(HABIT_RECORDS_FILE):
-        with open(HABIT_RECORDS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(HABIT_RECORDS_FILE, [])
     
     if not os.path.exists(SMALL_WINS_FILE):
-        with open(SMALL_WINS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(SMALL_WINS_FILE, [])
     
     if not os.path.exists(REWARDS_FILE):
         default_rewards = {
@@ -179,12 +180,10 @@ def initialize_habit_files():
                 {"id": str(uuid.uuid4()), "name": "小さな買い物", "description": "自分へのプレゼント", "used": False}
             ]
         }
-        with open(REWARDS_FILE, "w") as f:
-            json.dump(default_rewards, f)
+        storage.save_document(REWARDS_FILE, default_rewards)
     
     if not os.path.exists(FUTURE_MESSAGES_FILE):
-        with open(FUTURE_MESSAGES_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(FUTURE_MESSAGES_FILE, [])
     
     if not os.path.exists(MEDALS_FILE):
         default_medals = {
@@ -196,61 +195,45 @@ def initialize_habit_files():
                 {"days": 60, "name": "ダイヤモンドメダル", "class": "medal-diamond", "description": "60日連続達成"}
             ]
         }
-        with open(MEDALS_FILE, "w") as f:
-            json.dump(default_medals, f)
+        storage.save_document(MEDALS_FILE, default_medals)
 
 # 初期化を実行
 initialize_habit_files()
 
 # データを読み込む関数
 def load_habits():
-    with open(HABITS_FILE, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data) if data else pd.DataFrame(columns=["id", "name", "description", "frequency", "time_of_day", "start_date", "future_vision", "skip_allowed", "reward_milestone", "last_reviewed", "is_active"])
+    return storage.table("habits").load()
 
-def load_habit_records():
-    with open(HABIT_RECORDS_FILE, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data) if data else pd.DataFrame(columns=["habit_id", "date", "status", "notes"])
+def load_habit_records(typed=False):
+    return storage.table("habit_records").load(typed=typed)
 
 def load_small_wins():
-    with open(SMALL_WINS_FILE, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data) if data else pd.DataFrame(columns=["id", "habit_id", "date", "description", "feeling"])
+    return storage.table("small_wins").load()
 
 def load_rewards():
-    with open(REWARDS_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(REWARDS_FILE)
 
 def load_future_messages():
-    with open(FUTURE_MESSAGES_FILE, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data) if data else pd.DataFrame(columns=["id", "habit_id", "creation_date", "target_date", "message"])
+    return storage.table("future_messages").load()
 
 def load_medals():
-    with open(MEDALS_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(MEDALS_FILE)
 
 # データを保存する関数
 def save_habits(df):
-    with open(HABITS_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("habits").save(df)
 
 def save_habit_records(df):
-    with open(HABIT_RECORDS_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("habit_records").save(df)
 
 def save_small_wins(df):
-    with open(SMALL_WINS_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("small_wins").save(df)
 
 def save_rewards(rewards_data):
-    with open(REWARDS_FILE, "w") as f:
-        json.dump(rewards_data, f)
+    storage.save_document(REWARDS_FILE, rewards_data)
 
 def save_future_messages(df):
-    with open(FUTURE_MESSAGES_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("future_messages").save(df)
 
 # ページタイトル
 st.markdown('<h1 class="main-header">✨ ポジティブな習慣の定着</h1>', unsafe_allow_html=True)
@@ -266,9 +249,9 @@ page = st.sidebar.radio(
 def show_habit_dashboard():
     st.markdown('<h2 class="sub-header">📊 習慣ダッシュボード</h2>', unsafe_allow_html=True)
     
-    # データを読み込む
+    # データを読み込む（日付は datetime 型で受け取る）
     habits_df = load_habits()
-    records_df = load_habit_records()
+    records_df = load_habit_records(typed=True)
     small_wins_df = load_small_wins()
     
     if habits_df.empty:
@@ -284,74 +267,51 @@ def show_habit_dashboard():
     if active_habits.empty:
         st.warning("アクティブな習慣がありません。「習慣の追加・編集」からアクティブな習慣を設定しましょう。")
     else:
+        # 全習慣の統計をまとめて計算（カードとグラフで共用する）
+        habit_stats = calculate_habit_stats(records_df, active_habits['id'], today)
+        
         # 今日の習慣ステータス
         st.markdown("### 今日の習慣")
         
-        # 今日の記録を抽出
-        today_records = records_df[records_df['date'] == today]
+        status_classes = {
+            "達成": "habit-card habit-active",
+            "スキップ": "habit-card habit-skipped",
+            "未達成": "habit-card habit-missed",
+        }
+        status_marks = {"達成": "✅", "スキップ": "⏭️", "未達成": "❌"}
         
-        for _, habit in active_habits.iterrows():
-            habit_id = habit['id']
-            habit_name = habit['name']
+        for habit_id, habit_name in zip(active_habits['id'], active_habits['name']):
+            stat = habit_stats.loc[habit_id]
+            today_status = stat['today_status']
+            card_class = status_classes.get(today_status, "habit-card")
             
-            # この習慣の今日の記録があるか確認
-            today_status = "未チェック"
-            today_notes = ""
-            card_class = "habit-card"
-            
-            if not today_records.empty:
-                habit_today = today_records[today_records['habit_id'] == habit_id]
-                if not habit_today.empty:
-                    today_status = habit_today.iloc[0]['status']
-                    today_notes = habit_today.iloc[0]['notes'] if 'notes' in habit_today.iloc[0] else ""
-                    
-                    if today_status == "達成":
-                        card_class = "habit-card habit-active"
-                    elif today_status == "スキップ":
-                        card_class = "habit-card habit-skipped"
-                    elif today_status == "未達成":
-                        card_class = "habit-card habit-missed"
-            
-            # 連続達成日数の計算
-            streak = calculate_streak(habit_id, records_df, today)
-            
-            # 達成率の計算
-            completion_rate = calculate_completion_rate(habit_id, records_df)
-            
-            # メダル情報の取得
-            medal_info = get_medal_info(streak)
+            # メダル情報
             medal_display = ""
-            if medal_info:
-                medal_display = f"""<span class="{medal_info['class']}">{medal_info['name']}</span>"""
+            if stat['medal_name']:
+                medal_display = f"""<span class="{stat['medal_class']}">{stat['medal_name']}</span>"""
+            
+            # 直近の記録（記録がない日は・）
+            history = "".join(status_marks.get(status, "・") for status in stat['history'])
             
             st.markdown(f"""
             <div class="{card_class}">
                 <h3>{habit_name}</h3>
                 <p><strong>ステータス:</strong> {today_status}</p>
-                <p><strong>連続達成日数:</strong> {streak}日 {medal_display}</p>
-                <p><strong>総合達成率:</strong> {completion_rate:.1f}%</p>
-                <p><strong>メモ:</strong> {today_notes}</p>
+                <p><strong>連続達成日数:</strong> {stat['streak']}日 {medal_display}</p>
+                <p><strong>総合達成率:</strong> {stat['completion_rate']:.1f}%</p>
+                <p><strong>直近7日:</strong> {history}</p>
+                <p><strong>メモ:</strong> {stat['today_notes']}</p>
             </div>
             """, unsafe_allow_html=True)
         
         # 習慣の達成状況グラフ
         st.markdown("### 習慣の達成状況")
         
-        # 各習慣の達成率を計算
-        habit_stats = []
-        for _, habit in active_habits.iterrows():
-            habit_id = habit['id']
-            habit_name = habit['name']
-            completion_rate = calculate_completion_rate(habit_id, records_df)
-            streak = calculate_streak(habit_id, records_df, today)
-            
-            habit_stats.append({
-                "habit_name": habit_name,
-                "completion_rate": completion_rate,
-                "streak": streak
-            })
-        
-        habit_stats_df = pd.DataFrame(habit_stats)
+        habit_stats_df = pd.DataFrame({
+            "habit_name": active_habits['name'].values,
+            "completion_rate": habit_stats['completion_rate'].values,
+            "streak": habit_stats['streak'].values
+        })
         
         if not habit_stats_df.empty:
             # 達成率のグラフ
@@ -499,7 +459,7 @@ def show_habit_management():
                     else:
                         habits_df = pd.concat([habits_df, pd.DataFrame([new_habit])], ignore_index=True)
                     
-                    save_habits(habits_df)
+                    storage.table("habits").append(new_habit)
                     
                     # 未来からのメッセージを作成
                     future_date = start_date + timedelta(days=30)  # 30日後
@@ -512,13 +472,7 @@ def show_habit_management():
                         "message": f"30日前にあなたは「{habit_name}」という習慣を始めて、「{future_vision}」という未来を描いていました。継続は力なりです。今の自分を誇りに思ってください！"
                     }
                     
-                    future_messages_df = load_future_messages()
-                    if future_messages_df.empty:
-                        future_messages_df = pd.DataFrame([future_message])
-                    else:
-                        future_messages_df = pd.concat([future_messages_df, pd.DataFrame([future_message])], ignore_index=True)
-                    
-                    save_future_messages(future_messages_df)
+                    storage.table("future_messages").append(future_message)
                     
                     st.success("新しい習慣を追加しました！")
                     st.balloons()
@@ -600,7 +554,7 @@ def show_habit_management():
                 if confirmation == selected_habit_name:
                     # 習慣の削除
                     habits_df = habits_df[habits_df['id'] != selected_habit['id']]
-                    save_habits(habits_df)
+                    storage.table("habits").delete(selected_habit['id'])
                     
                     # 関連する記録も削除（オプション）
                     try:
@@ -724,7 +678,7 @@ def show_habit_daily_check():
                         else:
                             records_df = pd.concat([records_df, pd.DataFrame([new_record])], ignore_index=True)
                     
-                    save_habit_records(records_df)
+                    storage.table("habit_records").upsert(new_record)
                     
                     # 達成した場合、達成メッセージを表示
                     if selected_status == "達成":
@@ -882,7 +836,7 @@ def show_small_wins():
                 else:
                     small_wins_df = pd.concat([small_wins_df, pd.DataFrame([new_win])], ignore_index=True)
                 
-                save_small_wins(small_wins_df)
+                storage.table("small_wins").append(new_win)
                 
                 st.success("小さな成功を記録しました！")
                 st.balloons()
@@ -917,7 +871,7 @@ def show_medals():
     
     # データを読み込む
     habits_df = load_habits()
-    records_df = load_habit_records()
+    records_df = load_habit_records(typed=True)
     medals = load_medals()['medals']
     
     if habits_df.empty:
@@ -943,12 +897,15 @@ def show_medals():
     # 各習慣のメダル獲得状況
     st.markdown("### 習慣ごとのメダル獲得状況")
     
+    # 全習慣の連続達成日数をまとめて計算
+    habit_streaks = calculate_streaks_by_habit(records_df, today)
+    
     for _, habit in habits_df.iterrows():
         habit_id = habit['id']
         habit_name = habit['name']
         
         # 連続達成日数の計算
-        streak = calculate_streak(habit_id, records_df, today)
+        streak = int(habit_streaks.get(habit_id, 0))
         
         # 獲得メダルの確認
         acquired_medals = []
@@ -1101,7 +1058,6 @@ def show_habit_review():
     
     # データを読み込む
     habits_df = load_habits()
-    records_df = load_habit_records()
     
     if habits_df.empty:
         st.info("まだ習慣が登録されていません。「習慣の追加・編集」から最初の習慣を登録しましょう！")
@@ -1129,32 +1085,32 @@ def show_habit_review():
     start_date_str = start_date.strftime("%Y-%m-%d")
     end_date_str = end_date.strftime("%Y-%m-%d")
     
-    # 期間内のレコードをフィルタリング
-    records_df['date'] = pd.to_datetime(records_df['date']).dt.date
-    filtered_records = records_df[(records_df['date'] >= start_date) & (records_df['date'] <= end_date)]
+    # 期間内の記録の集計（日・週・月のバケットを足し合わせる）
+    period_summary = rollups.window("habit_records", start_date, end_date)
     
     st.markdown(f"### {start_date_str} から {end_date_str} までの振り返り")
     
-    if filtered_records.empty:
+    if not period_summary["count"]:
         st.warning("選択した期間のデータがありません。")
     else:
         # 習慣ごとの達成統計
         st.markdown("#### 習慣ごとの達成状況")
         
         habit_stats = []
+        status_by_habit = rollups.distribution(period_summary, ("habit_id", "status"))
         
         for _, habit in habits_df.iterrows():
             habit_id = habit['id']
             habit_name = habit['name']
             
-            # この習慣の記録を抽出
-            habit_records = filtered_records[filtered_records['habit_id'] == habit_id]
+            # この習慣のステータス別の日数
+            status_counts = status_by_habit.get(str(habit_id), {})
             
-            if not habit_records.empty:
-                total_days = len(habit_records)
-                achieved_days = len(habit_records[habit_records['status'] == "達成"])
-                skipped_days = len(habit_records[habit_records['status'] == "スキップ"])
-                missed_days = len(habit_records[habit_records['status'] == "未達成"])
+            if status_counts:
+                total_days = sum(status_counts.values())
+                achieved_days = status_counts.get("達成", 0)
+                skipped_days = status_counts.get("スキップ", 0)
+                missed_days = status_counts.get("未達成", 0)
                 
                 achievement_rate = achieved_days / total_days * 100 if total_days > 0 else 0
                 
@@ -1199,8 +1155,12 @@ def show_habit_review():
         # 全体の達成トレンド
         st.markdown("#### 全体の達成トレンド")
         
-        # 日付ごとに達成状況を集計
-        date_status = filtered_records.groupby(['date', 'status']).size().unstack(fill_value=0)
+        # 日付ごとの達成状況（日のバケット）
+        daily = rollups.series("habit_records", "day", start_date, end_date)
+        date_status = pd.DataFrame(
+            [rollups.distribution(day_summary, "status") for _, day_summary in daily],
+            index=pd.to_datetime([day for day, _ in daily]).rename('date'),
+        ).fillna(0).astype(int)
         
         if not date_status.empty:
             # 必要な列が存在することを確認
@@ -1304,40 +1264,29 @@ def show_habit_review():
                     else:
                         future_messages_df = pd.concat([future_messages_df, pd.DataFrame([new_message])], ignore_index=True)
                     
-                    save_future_messages(future_messages_df)
+                    storage.table("future_messages").append(new_message)
                     
                     st.success(f"メッセージが保存されました！{target_date.strftime('%Y-%m-%d')}に表示されます。")
 
 # ユーティリティ関数
 def calculate_streak(habit_id, records_df, end_date):
-    """習慣の連続達成日数を計算する"""
+    """習慣の連続達成日数を計算する（end_date で終わる連続日数。スキップも連続とみなす）"""
     if records_df.empty:
         return 0
     
-    # この習慣のレコードを抽出してソート
-    habit_records = records_df[records_df['habit_id'] == habit_id].copy()
-    if habit_records.empty:
-        return 0
-    
-    habit_records['date'] = pd.to_datetime(habit_records['date'])
-    habit_records = habit_records.sort_values('date', ascending=False)
+    # この習慣の達成・スキップの記録を抽出
+    habit_records = records_df[(records_df['habit_id'] == habit_id) & records_df['status'].isin(streaks.CONTINUE_STATUSES)]
     
-    # 連続達成日数の計算
-    streak = 0
-    current_date = pd.to_datetime(end_date)
+    return streaks.current_streak(habit_records['date'], end=end_date)
+
+def calculate_streaks_by_habit(records_df, end_date):
+    """全習慣の連続達成日数を計算し、習慣 ID を index にした Series で返す"""
+    if records_df.empty:
+        return pd.Series(dtype="int64")
     
-    for _, record in habit_records.iterrows():
-        # 日付の差が1日より大きい場合、連続記録が途切れている
-        if record['date'].date() != current_date.date() - timedelta(days=streak):
-            break
-        
-        # 達成またはスキップの場合は連続とみなす
-        if record['status'] in ["達成", "スキップ"]:
-            streak += 1
-        else:
-            break
+    continued = records_df[records_df['status'].isin(streaks.CONTINUE_STATUSES)]
     
-    return streak
+    return streaks.grouped_streaks(continued, 'habit_id', end=end_date)['current']
 
 def calculate_completion_rate(habit_id, records_df):
     """習慣の達成率を計算する"""
@@ -1354,6 +1303,56 @@ def calculate_completion_rate(habit_id, records_df):
     
     return achieved_records / total_records * 100 if total_records > 0 else 0
 
+def calculate_habit_stats(records_df, habit_ids, end_date, history_days=7):
+    """習慣ごとの統計をまとめて計算する
+
+    records_df は load_habit_records(typed=True) の DataFrame。全習慣を 1 回の
+    groupby で集計し、習慣 ID を index にした DataFrame を返す。
+    列: total, achieved, completion_rate, streak, today_status, today_notes,
+    history（end_date までの history_days 日分のステータス。記録がない日は ""）,
+    medal_name, medal_class（獲得していなければ ""）
+    """
+    habit_ids = pd.Index(habit_ids, name='habit_id')
+    end = pd.Timestamp(end_date)
+    stats = pd.DataFrame(index=habit_ids)
+    days = records_df['date'].dt.normalize()
+    
+    # 記録数と達成数
+    counts = records_df['status'].eq("達成").groupby(records_df['habit_id']).agg(['size', 'sum'])
+    stats['total'] = counts['size'].reindex(habit_ids, fill_value=0).astype(int)
+    stats['achieved'] = counts['sum'].reindex(habit_ids, fill_value=0).astype(int)
+    stats['completion_rate'] = (stats['achieved'] / stats['total'].where(stats['total'] > 0) * 100).fillna(0.0)
+    
+    # 連続達成日数
+    stats['streak'] = calculate_streaks_by_habit(records_df, end_date).reindex(habit_ids, fill_value=0).astype(int)
+    
+    # 今日のステータスとメモ
+    today_records = records_df[days == end].drop_duplicates('habit_id').set_index('habit_id')
+    stats['today_status'] = today_records['status'].astype(object).reindex(habit_ids).fillna("未チェック")
+    if 'notes' in today_records.columns:
+        stats['today_notes'] = today_records['notes'].astype(object).reindex(habit_ids).fillna("")
+    else:
+        stats['today_notes'] = ""
+    
+    # 直近 history_days 日分のステータス
+    history_range = pd.date_range(end=end, periods=history_days)
+    recent = records_df.assign(day=days)[days.between(history_range[0], end)]
+    history = (
+        recent.drop_duplicates(['habit_id', 'day'], keep='last')
+        .pivot(index='habit_id', columns='day', values='status')
+        .astype(object)
+        .reindex(index=habit_ids, columns=history_range)
+    )
+    stats['history'] = pd.Series(history.fillna("").values.tolist(), index=habit_ids)
+    
+    # メダル（連続日数が条件を満たす最も上のメダル）
+    medals = sorted(load_medals()['medals'], key=lambda m: m['days'])
+    tiers = np.searchsorted([m['days'] for m in medals], stats['streak'].to_numpy(), side='right') - 1
+    stats['medal_name'] = [medals[i]['name'] if i >= 0 else "" for i in tiers]
+    stats['medal_class'] = [medals[i]['class'] if i >= 0 else "" for i in tiers]
+    
+    return stats
+
 def get_medal_info(streak):
     """連続日数に基づいたメダル情報を取得する"""
     medals = load_medals()['medals']
@@ -1,15 +1,21 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
 import json
 import os
 import random
 import uuid
-from wordcloud import WordCloud
+import storage
+import emotion_taxonomy
+import tokenizer
+import lazy_imports
+import wordcloud_service
+import pagination
+import rollups
+
+# 重いライブラリは使うときに読み込む
+px = lazy_imports.lazy_import("plotly.express")
 
 # ページの設定
 st.set_page_config(
@@ -116,14 +122,11 @@ VALUES_HISTORY_FILE = "values_history.json"
 
 def load_values_history():
     """価値観履歴データを読み込む"""
-    with open(VALUES_HISTORY_FILE, "r") as f:
-        data = json.load(f)
-    return data
+    return storage.load_document(VALUES_HISTORY_FILE)
 
 def save_values_history(history_data):
     """価値観履歴データを保存する"""
-    with open(VALUES_HISTORY_FILE, "w") as f:
-        json.dump(history_data, f)
+    storage.save_document(VALUES_HISTORY_FILE, history_data)
 
 def save_values_snapshot(values_data):
     """現在の価値観のスナップショットを履歴に追加"""
@@ -160,15 +163,13 @@ def save_values_snapshot(values_data):
 # データファイルの初期化
 def initialize_awareness_files():
     if not os.path.exists(EMOTION_LOGS_FILE):
-        with open(EMOTION_LOGS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(EMOTION_LOGS_FILE, [])
     
     if not os.path.exists(STRENGTHS_FILE):
-        with open(STRENGTHS_FILE, "w") as f:
-            json.dump({
-                "strengths": [],
-                "skills": []
-            }, f)
+        storage.save_document(STRENGTHS_FILE, {
+            "strengths": [],
+            "skills": []
+        })
     
     if not os.path.exists(VALUES_FILE):
         default_values = {
@@ -182,93 +183,89 @@ def initialize_awareness_files():
                 {"name": "安定", "importance": 50, "description": "安定した生活や将来性"}
             ]
         }
-        with open(VALUES_FILE, "w") as f:
-            json.dump(default_values, f)
+        storage.save_document(VALUES_FILE, default_values)
     
     if not os.path.exists(FUTURE_VISION_FILE):
-        with open(FUTURE_VISION_FILE, "w") as f:
-            json.dump({
-                "vision": "",
-                "creation_date": datetime.now().strftime("%Y-%m-%d"),
-                "goals": [],
-                "self_understanding_score": 50
-            }, f)
+        storage.save_document(FUTURE_VISION_FILE, {
+            "vision": "",
+            "creation_date": datetime.now().strftime("%Y-%m-%d"),
+            "goals": [],
+            "self_understanding_score": 50
+        })
     
     if not os.path.exists(THOUGHT_PATTERNS_FILE):
-        with open(THOUGHT_PATTERNS_FILE, "w") as f:
-            json.dump({
-                "patterns": [
-                    {"name": "過度の一般化", "count": 0, "examples": []},
-                    {"name": "白黒思考", "count": 0, "examples": []},
-                    {"name": "心のフィルター", "count": 0, "examples": []},
-                    {"name": "マイナス思考", "count": 0, "examples": []},
-                    {"name": "結論の飛躍", "count": 0, "examples": []},
-                    {"name": "感情的決めつけ", "count": 0, "examples": []}
-                ]
-            }, f)
+        storage.save_document(THOUGHT_PATTERNS_FILE, {
+            "patterns": [
+                {"name": "過度の一般化", "count": 0, "examples": []},
+                {"name": "白黒思考", "count": 0, "examples": []},
+                {"name": "心のフィルター", "count": 0, "examples": []},
+                {"name": "マイナス思考", "count": 0, "examples": []},
+                {"name": "結論の飛躍", "count": 0, "examples": []},
+                {"name": "感情的決めつけ", "count": 0, "examples": []}
+            ]
+        })
 
     if not os.path.exists(VALUES_HISTORY_FILE):
-        with open(VALUES_HISTORY_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(VALUES_HISTORY_FILE, [])
         
         # 初期データも保存しておく
         values_data = load_values()
         save_values_snapshot(values_data)        
 
 # データ読み込み関数
-@st.cache_data(ttl=60)  # この行を追加
 def load_emotion_logs():
-    try:
-        with open(EMOTION_LOGS_FILE, "r", encoding='utf-8') as f:
-            data = json.load(f)
-        df = pd.DataFrame(data) if data else pd.DataFrame(columns=["id", "date", "emotion", "intensity", "activity", "thoughts", "category"])
-        return df
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame(columns=["id", "date", "emotion", "intensity", "activity", "thoughts", "category"])
+    return storage.table("emotion_logs").load()
 
 def load_strengths():
-    with open(STRENGTHS_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(STRENGTHS_FILE)
 
 def load_values():
-    with open(VALUES_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(VALUES_FILE)
 
 def load_future_vision():
-    with open(FUTURE_VISION_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(FUTURE_VISION_FILE)
 
 def load_thought_patterns():
-    with open(THOUGHT_PATTERNS_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(THOUGHT_PATTERNS_FILE)
 
 # データ保存関数
 def save_emotion_logs(df):
     try:
-        data = df.to_dict("records")
-        with open(EMOTION_LOGS_FILE, "w", encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False)
-        load_emotion_logs.clear()  # キャッシュクリア
+        storage.table("emotion_logs").save(df)
         return True
     except Exception as e:
         st.error(f"保存エラー: {e}")
         return False
 
+def add_emotion_log(log):
+    """感情ログを 1 件追加する"""
+    try:
+        storage.table("emotion_logs").append(log)
+        return True
+    except Exception as e:
+        st.error(f"保存エラー: {e}")
+        return False
+
+def delete_emotion_log(log_id):
+    """感情ログを ID 指定で削除する"""
+    try:
+        storage.table("emotion_logs").delete(log_id)
+        return True
+    except Exception as e:
+        st.error(f"削除エラー: {e}")
+        return False
+
 def save_strengths(strengths_data):
-    with open(STRENGTHS_FILE, "w") as f:
-        json.dump(strengths_data, f)
+    storage.save_document(STRENGTHS_FILE, strengths_data)
 
 def save_values(values_data):
-    with open(VALUES_FILE, "w") as f:
-        json.dump(values_data, f)
+    storage.save_document(VALUES_FILE, values_data)
 
 def save_future_vision(vision_data):
-    with open(FUTURE_VISION_FILE, "w") as f:
-        json.dump(vision_data, f)
+    storage.save_document(FUTURE_VISION_FILE, vision_data)
 
 def save_thought_patterns(patterns_data):
-    with open(THOUGHT_PATTERNS_FILE, "w") as f:
-        json.dump(patterns_data, f)
+    storage.save_document(THOUGHT_PATTERNS_FILE, patterns_data)
 
 # 初期化実行
 initialize_awareness_files()
@@ -285,15 +282,7 @@ page = st.sidebar.radio(
 # ユーティリティ関数
 def get_emotion_type(emotion):
     """感情のタイプ（positive, neutral, negative）を取得"""
-    positive_emotions = ["喜び", "楽しさ", "満足", "安心", "希望", "感謝", "興味", "誇り"]
-    negative_emotions = ["悲しみ", "不安", "怒り", "恐れ", "疲労", "退屈", "混乱", "罪悪感"]
-    
-    if emotion in positive_emotions:
-        return "positive"
-    elif emotion in negative_emotions:
-        return "negative"
-    else:
-        return "neutral"
+    return emotion_taxonomy.polarity(emotion)
     
 # 感情ログページ
 def show_emotion_log():
@@ -355,7 +344,7 @@ def show_emotion_log():
                 else:
                     emotion_logs_df = pd.concat([emotion_logs_df, pd.DataFrame([new_log])], ignore_index=True)
                 
-                save_emotion_logs(emotion_logs_df)
+                add_emotion_log(new_log)
                 
                 st.success("感情ログを記録しました！")
                 
@@ -373,7 +362,7 @@ def show_emotion_log():
         st.markdown("### 感情ログの分析")
         
         # 感情タイプの列を追加
-        emotion_logs_df['emotion_type'] = emotion_logs_df['emotion'].apply(get_emotion_type)
+        emotion_logs_df['emotion_type'] = emotion_taxonomy.categorize(emotion_logs_df['emotion'])
         
         # 感情タイプの分布
         emotion_type_counts = emotion_logs_df['emotion_type'].value_counts()
@@ -641,14 +630,12 @@ def show_emotion_log():
                     all_thoughts = " ".join(negative_logs['thoughts'].dropna().astype(str))
                     
                     if all_thoughts:
-                        # 簡易的な単語分割（形態素解析ライブラリがあるとより良い）
-                        words = all_thoughts.split()
-                        
-                        # 頻出単語を抽出（ストップワードを除外するとより良い）
-                        word_counts = pd.Series(words).value_counts().head(20)
+                        # 頻出単語を抽出（tokenizer で分割し、ストップワードは除外する）
+                        top_words = tokenizer.keywords(negative_logs['thoughts'].dropna().astype(str), top_n=20)
+                        word_counts = pd.DataFrame(top_words, columns=['index', 'count'])
                         
                         fig_words = px.bar(
-                            word_counts.reset_index(),
+                            word_counts,
                             x='index',
                             y='count',  # 修正: 数値の0ではなく列名を使用
                             title="ネガティブ感情時の頻出単語",
@@ -848,27 +835,28 @@ def show_emotion_log():
                 with col2:
                     filter_option = st.selectbox("表示する感情タイプ", ["すべて", "ポジティブ", "ニュートラル", "ネガティブ"], key="emotion_filter")
                 
-                # 日付でソート
-                sort_ascending = sort_option == "古い順"
-                sorted_logs = emotion_logs_df.sort_values('date', ascending=sort_ascending)
-                
-                # 感情タイプでフィルタリング
+                # 並び順と感情タイプの条件（並べ替え・絞り込みはストレージ側で行い、1ページ分だけ読み込む）
+                filters = {}
                 if filter_option != "すべて":
                     filter_map = {"ポジティブ": "positive", "ニュートラル": "neutral", "ネガティブ": "negative"}
-                    sorted_logs = sorted_logs[sorted_logs['emotion_type'] == filter_map[filter_option]]
-
-                # 最新30件のみ表示（この行を追加）
-                sorted_logs = sorted_logs.head(30)    
+                    recorded_emotions = emotion_logs_df['emotion'].dropna().unique()
+                    filters["emotion"] = [e for e in recorded_emotions if get_emotion_type(e) == filter_map[filter_option]]
+                
+                page_logs = pagination.paginate(
+                    "emotion_log_list",
+                    pagination.table_fetcher(storage.table("emotion_logs"), descending=sort_option == "新しい順", **filters),
+                    query=[sort_option, filter_option]
+                )
                 
-                if sorted_logs.empty:
+                if not page_logs:
                     st.info(f"{filter_option}の感情ログはありません。")
                 else:
-                    # 感情ログを展開可能なセクションで表示
-                    for i, (_, log) in enumerate(sorted_logs.iterrows()):
-                        emotion_type = log['emotion_type']
+                    # 感情ログを開いたときだけ詳細を表示（ボタンのキーは記録のIDから作る）
+                    for row_key, log in page_logs:
+                        emotion_type = get_emotion_type(log['emotion'])
                         card_class = f"emotion-card emotion-{emotion_type}"
                         
-                        with st.expander(f"{log['date']} - {log['emotion']} (強さ: {log['intensity']})", expanded=False):
+                        if pagination.details(f"{log['date']} - {log['emotion']} (強さ: {log['intensity']})", key=f"emotion_open_{row_key}"):
                             st.markdown(f"""
                             <div class="{card_class}">
                                 <p><strong>活動:</strong> {log['activity']} (カテゴリ: {log['category']})</p>
@@ -876,25 +864,18 @@ def show_emotion_log():
                             </div>
                             """, unsafe_allow_html=True)
                             
-                            # 編集・削除ボタンを追加
+                            # 編集・削除ボタン
                             col1, col2 = st.columns([1, 1])
                             with col1:
-                                if st.button("編集", key=f"edit_{i}"):
-                                    # 編集する行のインデックスをセッションステートに保存
-                                    st.session_state.edit_emotion_index = i
-                                    st.session_state.edit_emotion_data = log.to_dict()
+                                if st.button("編集", key=f"edit_{row_key}"):
+                                    # 編集する記録をセッションステートに保存
+                                    st.session_state.edit_emotion_index = row_key
+                                    st.session_state.edit_emotion_data = log
                                     st.rerun()
                             
                             with col2:
-                                if st.button("削除", key=f"delete_{i}"):
-                                    if 'id' in log:
-                                        # IDがある場合はそれを使用して削除
-                                        emotion_logs_df = emotion_logs_df[emotion_logs_df['id'] != log['id']]
-                                    else:
-                                        # インデックスを使用して削除
-                                        emotion_logs_df = emotion_logs_df.drop(log.name)
-                                    
-                                    save_emotion_logs(emotion_logs_df)
+                                if st.button("削除", key=f"delete_{row_key}"):
+                                    delete_emotion_log(log['id'])
                                     st.success("感情ログを削除しました！")
                                     st.rerun()
                 
@@ -941,28 +922,14 @@ def show_emotion_log():
                         
                         if submit:
                             # 変更内容を保存
-                            if 'id' in edit_data:
-                                idx = emotion_logs_df[emotion_logs_df['id'] == edit_data['id']].index[0]
-                            else:
-                                idx = st.session_state.edit_emotion_index
-                            
-                            # 感情タイプを再計算
-                            positive_emotions = ["喜び", "楽しさ", "満足", "安心", "希望", "感謝", "興味", "誇り"]
-                            negative_emotions = ["悲しみ", "不安", "怒り", "恐れ", "疲労", "退屈", "混乱", "罪悪感"]
-                            updated_emotion_type = "positive" if updated_emotion in positive_emotions else \
-                                                "negative" if updated_emotion in negative_emotions else "neutral"
-                            
-                            # データを更新
-                            emotion_logs_df.at[idx, 'emotion'] = updated_emotion
-                            emotion_logs_df.at[idx, 'emotion_type'] = updated_emotion_type
-                            emotion_logs_df.at[idx, 'intensity'] = updated_intensity
-                            emotion_logs_df.at[idx, 'category'] = updated_category
-                            emotion_logs_df.at[idx, 'activity'] = updated_activity
-                            emotion_logs_df.at[idx, 'thoughts'] = updated_thoughts
-                            emotion_logs_df.at[idx, 'date'] = updated_date.strftime("%Y-%m-%d")
-                            
-                            # 保存
-                            save_emotion_logs(emotion_logs_df)
+                            storage.table("emotion_logs").update(edit_data['id'], {
+                                "emotion": updated_emotion,
+                                "intensity": updated_intensity,
+                                "category": updated_category,
+                                "activity": updated_activity,
+                                "thoughts": updated_thoughts,
+                                "date": updated_date.strftime("%Y-%m-%d")
+                            })
                             st.success("感情ログを更新しました！")
                             
                             # 編集モードを終了
@@ -1337,22 +1304,17 @@ def show_strengths_list():
         st.markdown("### 強みとスキルを活かすヒント")
         
         # ワードクラウドで強みとスキルを視覚化
+        wordcloud_slot = None
         if strengths_data["strengths"] or strengths_data["skills"]:
             words = " ".join([s["name"] for s in strengths_data["strengths"]] + [s["name"] for s in strengths_data["skills"]])
             
-            if words:
-                # ワードクラウドの生成
-                try:
-                    wordcloud = WordCloud(width=800, height=400, background_color='white', colormap='viridis').generate(words)
-                    
-                    # Matplotlibのfigureに変換
-                    fig, ax = plt.subplots(figsize=(10, 5))
-                    ax.imshow(wordcloud, interpolation='bilinear')
-                    ax.axis('off')
-                    
-                    st.pyplot(fig)
-                except Exception as e:
-                    st.error(f"ワードクラウドの生成でエラーが発生しました: {e}")
+            if words and not lazy_imports.is_available("wordcloud"):
+                st.info("wordcloud をインストールすると、強みとスキルをワードクラウドで表示できます。")
+            elif words:
+                # ワードクラウドは別スレッドで描画し（同じ内容ならキャッシュを使う）、先にページの残りを表示する
+                wordcloud_slot = st.empty()
+                wordcloud_slot.info("ワードクラウドを生成しています...")
+                wordcloud_future = wordcloud_service.render(words, width=800, height=400, background_color='white', colormap='viridis')
         
         # 自己PR文の自動生成
         st.markdown("#### 自己PR文の生成")
@@ -1451,6 +1413,16 @@ def show_strengths_list():
                 - **人間関係での活かし方**: 行き詰まった状況で新しい視点を提供できます
                 - **自己成長への活かし方**: 芸術や表現活動に取り組むことで、さらに創造性を高められます
                 """)
+        
+        # 描画の終わったワードクラウドを表示
+        if wordcloud_slot is not None:
+            try:
+                result = wordcloud_future.result()
+                with wordcloud_slot.container():
+                    st.image(result.png, use_container_width=True)
+                    st.caption(f"描画時間: {result.render_ms:.0f} ms" + ("（キャッシュ済み）" if result.cached else ""))
+            except Exception as e:
+                wordcloud_slot.error(f"ワードクラウドの生成でエラーが発生しました: {e}")
     else:
         st.info("強みとスキルを登録すると、それらを活かすヒントが表示されます。") 
 
@@ -2301,8 +2273,8 @@ def show_future_vision():
 def show_self_awareness_progress():
     st.markdown('<h2 class="sub-header">📈 自己認識の進歩</h2>', unsafe_allow_html=True)
     
-    # データを読み込む
-    emotion_logs_df = load_emotion_logs()
+    # データを読み込む（感情ログは期間ごとの集計から取る）
+    emotion_log_count = rollups.window("emotion_logs")["count"]
     future_vision = load_future_vision()
     
     st.markdown("""
@@ -2317,42 +2289,35 @@ def show_self_awareness_progress():
     )
     
     # 感情ログの分析（時系列）
-    if not emotion_logs_df.empty and len(emotion_logs_df) > 5:
+    if emotion_log_count > 5:
         st.markdown("### 感情の変化")
         
-        # 感情タイプの列を追加
-        if 'emotion_type' not in emotion_logs_df.columns:
-            emotion_logs_df['emotion_type'] = emotion_logs_df['emotion'].apply(get_emotion_type)
-        
-        # 日付を変換
-        emotion_logs_df['date'] = pd.to_datetime(emotion_logs_df['date'])
-        
-        # 現在と過去の期間を設定
-        today = datetime.now()
+        # 現在と過去の期間を設定（両端を含む日付）
+        today = datetime.now().date()
         
         if comparison_period == "1ヶ月前":
-            past_start = today - timedelta(days=60)
+            past_start = today - timedelta(days=59)
             past_end = today - timedelta(days=30)
         elif comparison_period == "3ヶ月前":
-            past_start = today - timedelta(days=120)
+            past_start = today - timedelta(days=119)
             past_end = today - timedelta(days=90)
         elif comparison_period == "6ヶ月前":
-            past_start = today - timedelta(days=210)
+            past_start = today - timedelta(days=209)
             past_end = today - timedelta(days=180)
         else:  # 1年前
-            past_start = today - timedelta(days=395)
+            past_start = today - timedelta(days=394)
             past_end = today - timedelta(days=365)
         
-        current_start = today - timedelta(days=30)
+        current_start = today - timedelta(days=29)
         
-        # 過去と現在のデータをフィルタリング
-        past_data = emotion_logs_df[(emotion_logs_df['date'] >= past_start) & (emotion_logs_df['date'] <= past_end)]
-        current_data = emotion_logs_df[emotion_logs_df['date'] >= current_start]
+        # 過去と現在の期間の集計（日・週・月のバケットを足し合わせる）
+        past_data = rollups.window("emotion_logs", past_start, past_end)
+        current_data = rollups.window("emotion_logs", current_start, today)
         
-        if not past_data.empty and not current_data.empty:
+        if past_data["count"] and current_data["count"]:
             # 感情タイプの分布を計算
-            past_emotion_types = past_data['emotion_type'].value_counts(normalize=True) * 100
-            current_emotion_types = current_data['emotion_type'].value_counts(normalize=True) * 100
+            past_emotion_types = pd.Series(rollups.emotion_types(past_data), dtype=float) / past_data["count"] * 100
+            current_emotion_types = pd.Series(rollups.emotion_types(current_data), dtype=float) / current_data["count"] * 100
             
             # データフレームにまとめる
             comparison_df = pd.DataFrame({
@@ -2538,8 +2503,8 @@ def show_self_awareness_progress():
     progress_areas = []
     
     # 感情ログの記録数
-    if not emotion_logs_df.empty:
-        progress_areas.append(f"感情ログを{len(emotion_logs_df)}件記録しました")
+    if emotion_log_count:
+        progress_areas.append(f"感情ログを{emotion_log_count}件記録しました")
     
     # 思考パターンの認識
     total_patterns = sum(p["count"] for p in thought_patterns["patterns"])
@@ -1,14 +1,21 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
 import json
 import os
 import random
 import uuid
+import storage
+import gamification
+import task_repository
+import rollups
+import pagination
+import aggregates
+import lazy_imports
+
+# 重いライブラリは使うときに読み込む
+px = lazy_imports.lazy_import("plotly.express")
 
 # ページの設定
 st.set_page_config(
@@ -123,37 +130,29 @@ FUTURE_MESSAGES_FILE = "goal_future_messages.json"
 PROBLEMS_FILE = "goal_problems.json"
 SUCCESS_MEMORIES_FILE = "success_memories.json"
 BADGES_FILE = "badges.json"
-POINTS_FILE = "points.json"
 
 # データファイルの初期化
 def initialize_goal_files():
     if not os.path.exists(GOALS_FILE):
-        with open(GOALS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(GOALS_FILE, [])
     
     if not os.path.exists(SMART_GOALS_FILE):
-        with open(SMART_GOALS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(SMART_GOALS_FILE, [])
     
     if not os.path.exists(TASKS_FILE):
-        with open(TASKS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(TASKS_FILE, [])
     
     if not os.path.exists(REWARDS_FILE):
-        with open(REWARDS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(REWARDS_FILE, [])
     
     if not os.path.exists(FUTURE_MESSAGES_FILE):
-        with open(FUTURE_MESSAGES_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(FUTURE_MESSAGES_FILE, [])
     
     if not os.path.exists(PROBLEMS_FILE):
-        with open(PROBLEMS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(PROBLEMS_FILE, [])
     
     if not os.path.exists(SUCCESS_MEMORIES_FILE):
-        with open(SUCCESS_MEMORIES_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(SUCCESS_MEMORIES_FILE, [])
     
     if not os.path.exists(BADGES_FILE):
         default_badges = {
@@ -166,99 +165,66 @@ def initialize_goal_files():
                 {"id": "reward_planner", "name": "報酬プランナー", "description": "3つの報酬を設定", "image": "🎁", "earned": False}
             ]
         }
-        with open(BADGES_FILE, "w") as f:
-            json.dump(default_badges, f)
-    
-    if not os.path.exists(POINTS_FILE):
-        with open(POINTS_FILE, "w") as f:
-            json.dump({"points": 0}, f)
+        storage.save_document(BADGES_FILE, default_badges)
 
 # 初期化を実行
 initialize_goal_files()
 
 # データを読み込む関数
 def load_goals():
-    with open(GOALS_FILE, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data) if data else pd.DataFrame(columns=["id", "name", "description", "category", "deadline", "progress", "created_at", "status"])
+    return storage.table("goals").load()
 
 def load_smart_goals():
-    with open(SMART_GOALS_FILE, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data) if data else pd.DataFrame(columns=["id", "goal_id", "specific", "measurable", "achievable", "relevant", "time_bound", "mini_goal", "minimum_criteria"])
+    return storage.table("smart_goals").load()
 
 def load_tasks():
-    with open(TASKS_FILE, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data) if data else pd.DataFrame(columns=["id", "goal_id", "description", "status", "deadline", "created_at", "completed_at", "points"])
+    return storage.table("tasks").load()
 
 def load_rewards():
-    with open(REWARDS_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(REWARDS_FILE)
 
 def load_future_messages():
-    with open(FUTURE_MESSAGES_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(FUTURE_MESSAGES_FILE)
 
 def load_problems():
-    with open(PROBLEMS_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(PROBLEMS_FILE)
 
 def load_success_memories():
-    with open(SUCCESS_MEMORIES_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(SUCCESS_MEMORIES_FILE)
 
 def load_badges():
-    with open(BADGES_FILE, "r") as f:
-        return json.load(f)
-
-def load_points():
-    with open(POINTS_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(BADGES_FILE)
 
 # データを保存する関数
 def save_goals(df):
-    with open(GOALS_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("goals").save(df)
 
 def save_smart_goals(df):
-    with open(SMART_GOALS_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("smart_goals").save(df)
 
 def save_tasks(df):
-    with open(TASKS_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("tasks").save(df)
 
 def save_rewards(data):
-    with open(REWARDS_FILE, "w") as f:
-        json.dump(data, f)
+    storage.save_document(REWARDS_FILE, data)
 
 def save_future_messages(data):
-    with open(FUTURE_MESSAGES_FILE, "w") as f:
-        json.dump(data, f)
+    storage.save_document(FUTURE_MESSAGES_FILE, data)
 
 def save_problems(data):
-    with open(PROBLEMS_FILE, "w") as f:
-        json.dump(data, f)
+    storage.save_document(PROBLEMS_FILE, data)
 
 def save_success_memories(data):
-    with open(SUCCESS_MEMORIES_FILE, "w") as f:
-        json.dump(data, f)
+    storage.save_document(SUCCESS_MEMORIES_FILE, data)
 
 def save_badges(data):
-    with open(BADGES_FILE, "w") as f:
-        json.dump(data, f)
-
-def save_points(data):
-    with open(POINTS_FILE, "w") as f:
-        json.dump(data, f)
+    storage.save_document(BADGES_FILE, data)
 
 # ページタイトルとナビゲーション
 st.markdown('<h1 class="main-header">🎯 目標達成サポート</h1>', unsafe_allow_html=True)
 
 # ポイント表示
-points_data = load_points()
-total_points = points_data["points"]
+total_points = gamification.points_balance()
 st.sidebar.markdown(f"### 📊 現在のポイント: {total_points}ポイント")
 
 # バッジ数表示
@@ -277,9 +243,10 @@ page = st.sidebar.radio(
 def show_goal_dashboard():
     st.markdown('<h2 class="sub-header">📊 目標ダッシュボード</h2>', unsafe_allow_html=True)
     
-    # データを読み込む
+    # データを読み込む（件数は書き込み時に更新している集計値を使う）
     goals_df = load_goals()
-    tasks_df = load_tasks()
+    goal_summary = aggregates.summary("goals")
+    task_summary = aggregates.summary("tasks")
     
     if goals_df.empty:
         st.info("まだ目標が設定されていません。「SMART目標設定」から最初の目標を設定しましょう！")
@@ -289,8 +256,8 @@ def show_goal_dashboard():
     st.markdown("### 目標の概要")
     
     # 目標のカテゴリごとに色分けした円グラフ
-    if 'category' in goals_df.columns and not goals_df['category'].empty:
-        category_counts = goals_df['category'].value_counts()
+    if goal_summary["by_category"]:
+        category_counts = pd.Series(goal_summary["by_category"], dtype="int64").sort_values(ascending=False)
         
         fig_category = px.pie(
             category_counts.reset_index(),
@@ -351,8 +318,9 @@ def show_goal_dashboard():
                     deadline_warning = f"締め切りまであと{days_left}日です"
             
             # タスクの完了率計算
-            task_count = len(tasks_df[tasks_df['goal_id'] == goal['id']]) if not tasks_df.empty else 0
-            completed_tasks = len(tasks_df[(tasks_df['goal_id'] == goal['id']) & (tasks_df['status'] == 'completed')]) if not tasks_df.empty else 0
+            goal_tasks = task_summary["by_goal"].get(str(goal['id']), {"total": 0, "by_status": {}})
+            task_count = goal_tasks["total"]
+            completed_tasks = goal_tasks["by_status"].get('completed', 0)
             task_completion = f"{completed_tasks}/{task_count}タスク完了" if task_count > 0 else "タスクなし"
             
             # 目標カードの表示
@@ -386,7 +354,7 @@ def show_goal_dashboard():
     st.markdown("### やる気サポート")
     
     if st.button("今日やる気が出ない…"):
-        micro_tasks = generate_micro_tasks(goals_df, tasks_df)
+        micro_tasks = generate_micro_tasks(goals_df, load_tasks())
         
         if micro_tasks:
             st.markdown("""
@@ -588,16 +556,11 @@ def show_smart_goal_setting():
                     smart_goals_df = pd.concat([smart_goals_df, pd.DataFrame([new_smart_goal])], ignore_index=True)
                 
                 # 保存
-                save_goals(goals_df)
-                save_smart_goals(smart_goals_df)
+                storage.table("goals").append(new_goal)
+                storage.table("smart_goals").append(new_smart_goal)
                 
-                # ポイント獲得
-                points_data = load_points()
-                points_data["points"] += 10
-                save_points(points_data)
-                
-                # バッジ更新
-                update_badges()
+                # ポイント獲得とバッジの判定
+                gamification.dispatch("goal_created", points=10, reason="目標の設定", key=f"goal_created:{goal_id}")
                 
                 st.success("新しい目標を登録しました！10ポイント獲得！")
                 st.balloons()
@@ -671,13 +634,8 @@ def show_smart_goal_setting():
                 if status_map[updated_status] == "completed" and (goals_df.loc[goals_df['id'] == goal_id, 'status'].iloc[0] != "completed"):
                     goals_df.loc[goals_df['id'] == goal_id, 'completed_at'] = datetime.now().strftime("%Y-%m-%d")
                     
-                    # ポイント獲得
-                    points_data = load_points()
-                    points_data["points"] += 50
-                    save_points(points_data)
-                    
-                    # バッジ更新
-                    update_badges()
+                    # ポイント獲得とバッジの判定
+                    gamification.dispatch("goal_completed", points=50, reason="目標達成", key=f"goal_completed:{goal_id}")
                 
                 # SMART詳細情報の更新
                 if not smart_goals_df[smart_goals_df['goal_id'] == goal_id].empty:
@@ -757,7 +715,7 @@ def show_task_management():
                 else:
                     tasks_df = pd.concat([tasks_df, pd.DataFrame([new_task])], ignore_index=True)
                 
-                save_tasks(tasks_df)
+                storage.table("tasks").append(new_task)
                 
                 st.success("新しいタスクを追加しました！")
     
@@ -777,25 +735,32 @@ def show_task_management():
         status_filter_options = ["すべて", "未完了", "完了"]
         selected_status_filter = st.selectbox("表示するステータス", status_filter_options)
         
-        # タスクのフィルタリング
-        filtered_tasks = tasks_df.copy() if not tasks_df.empty else pd.DataFrame()
-        
-        if not filtered_tasks.empty:
-            # 目標でフィルタリング
+        # タスクのフィルタリング（目標ごとの索引から引く）
+        if not tasks_df.empty:
+            filter_goal_id = None
             if selected_goal_filter != "すべての目標":
-                goal_id = goals_df[goals_df['name'] == selected_goal_filter]['id'].iloc[0]
-                filtered_tasks = filtered_tasks[filtered_tasks['goal_id'] == goal_id]
+                filter_goal_id = goals_df[goals_df['name'] == selected_goal_filter]['id'].iloc[0]
             
-            # 状態でフィルタリング
             if selected_status_filter == "未完了":
-                filtered_tasks = filtered_tasks[filtered_tasks['status'] != 'completed']
+                task_filters = task_repository.task_filters(filter_goal_id, exclude_status='completed')
             elif selected_status_filter == "完了":
-                filtered_tasks = filtered_tasks[filtered_tasks['status'] == 'completed']
+                task_filters = task_repository.task_filters(filter_goal_id, status='completed')
+            else:
+                task_filters = task_repository.task_filters(filter_goal_id)
+            
+            # 作成日・id のカーソルで 1 ページ分だけ読み込み、目標名をまとめて付ける
+            # （ページの間にタスクを完了・削除しても、件数の位置ではないので行がずれない）
+            page_tasks = pagination.paginate(
+                "task_list",
+                pagination.table_fetcher(storage.table("tasks"), **task_filters),
+                query=[selected_goal_filter, selected_status_filter]
+            )
+            filtered_tasks = task_repository.with_goal_names(pd.DataFrame([task for _, task in page_tasks]), goals_df)
             
             # タスクがある場合は表示
             if not filtered_tasks.empty:
-                for _, task in filtered_tasks.iterrows():
-                    goal_name = goals_df[goals_df['id'] == task['goal_id']]['name'].iloc[0] if task['goal_id'] in goals_df['id'].values else "不明な目標"
+                for task in filtered_tasks.to_dict("records"):
+                    goal_name = task['goal_name']
                     
                     col1, col2, col3 = st.columns([3, 1, 1])  # 3列に変更: 内容、ステータス変更、削除
                     
@@ -829,39 +794,30 @@ def show_task_management():
                         if task['status'] != 'completed':
                             if st.button("完了にする", key=f"complete_{task['id']}"):
                                 # タスクを完了に変更
-                                tasks_df.loc[tasks_df['id'] == task['id'], 'status'] = 'completed'
-                                tasks_df.loc[tasks_df['id'] == task['id'], 'completed_at'] = datetime.now().strftime("%Y-%m-%d")
-                                
-                                # ポイント獲得
-                                points_data = load_points()
-                                points_data["points"] += task['points']
-                                save_points(points_data)
+                                storage.table("tasks").update(task['id'], {
+                                    "status": "completed",
+                                    "completed_at": datetime.now().strftime("%Y-%m-%d")
+                                })
                                 
-                                # 目標の進捗を更新
-                                update_goal_progress(task['goal_id'])
-                                
-                                # バッジ更新
-                                update_badges()
-                                
-                                save_tasks(tasks_df)
+                                # ポイント獲得・目標の進捗更新・バッジの判定をまとめて保存
+                                with gamification.interaction() as session:
+                                    session.emit("task_completed", points=task['points'], reason="タスク完了")
+                                    update_goal_progress(task['goal_id'], session)
                                 
                                 st.success(f"タスクを完了しました！{task['points']}ポイント獲得！")
                                 st.rerun()
                         else:
                             if st.button("未完了に戻す", key=f"revert_{task['id']}"):
                                 # タスクを未完了に戻す
-                                tasks_df.loc[tasks_df['id'] == task['id'], 'status'] = 'pending'
-                                tasks_df.loc[tasks_df['id'] == task['id'], 'completed_at'] = None
-                                
-                                # ポイントを戻す
-                                points_data = load_points()
-                                points_data["points"] = max(0, points_data["points"] - task['points'])
-                                save_points(points_data)
+                                storage.table("tasks").update(task['id'], {
+                                    "status": "pending",
+                                    "completed_at": None
+                                })
                                 
-                                # 目標の進捗を更新
-                                update_goal_progress(task['goal_id'])
-                                
-                                save_tasks(tasks_df)
+                                # ポイントを戻し、目標の進捗を更新
+                                with gamification.interaction() as session:
+                                    session.emit("task_reopened", points=-task['points'], reason="タスクを未完了に戻した")
+                                    update_goal_progress(task['goal_id'], session)
                                 
                                 st.info(f"タスクを未完了に戻しました。{task['points']}ポイント返却。")
                                 st.rerun()
@@ -881,8 +837,7 @@ def show_task_management():
                                 st.rerun()
                             else:
                                 # タスクを削除
-                                tasks_df = tasks_df[tasks_df['id'] != task_id]
-                                save_tasks(tasks_df)
+                                storage.table("tasks").delete(task_id)
                                 
                                 # 確認状態をリセット
                                 st.session_state.delete_confirmation.pop(task_id, None)
@@ -987,37 +942,32 @@ def show_task_management():
                 </div>
                 """, unsafe_allow_html=True)
 
-# 目標の進捗を更新する関数
-def update_goal_progress(goal_id):
-    goals_df = load_goals()
-    tasks_df = load_tasks()
+# 目標の進捗を更新する関数（目標を達成したら session に goal_completed を追加する）
+def update_goal_progress(goal_id, session):
+    goal = task_repository.goal(goal_id)
     
-    if not goals_df.empty and goal_id in goals_df['id'].values:
-        # 目標に関連するタスクを取得
-        goal_tasks = tasks_df[tasks_df['goal_id'] == goal_id] if not tasks_df.empty else pd.DataFrame()
+    if goal is not None:
+        # 全タスク数と完了タスク数（書き込み時に更新している目標ごとの件数を使う）
+        counts = task_repository.status_counts(goal_id)
+        total_tasks = counts["total"]
+        completed_tasks = counts["by_status"].get("completed", 0)
         
-        if not goal_tasks.empty:
-            # 全タスク数と完了タスク数を計算
-            total_tasks = len(goal_tasks)
-            completed_tasks = len(goal_tasks[goal_tasks['status'] == 'completed'])
-            
+        if total_tasks > 0:
             # 進捗率を計算（完了タスク数 ÷ 全タスク数 × 100）
-            progress = int((completed_tasks / total_tasks) * 100) if total_tasks > 0 else 0
+            progress = int((completed_tasks / total_tasks) * 100)
             
             # 目標の進捗を更新
-            goals_df.loc[goals_df['id'] == goal_id, 'progress'] = progress
+            changes = {"progress": progress}
             
             # 進捗が100%になったら、目標を完了に変更
-            if progress == 100 and goals_df.loc[goals_df['id'] == goal_id, 'status'].iloc[0] != 'completed':
-                goals_df.loc[goals_df['id'] == goal_id, 'status'] = 'completed'
-                goals_df.loc[goals_df['id'] == goal_id, 'completed_at'] = datetime.now().strftime("%Y-%m-%d")
+            if progress == 100 and goal.get('status') != 'completed':
+                changes["status"] = 'completed'
+                changes["completed_at"] = datetime.now().strftime("%Y-%m-%d")
                 
                 # ポイント獲得
-                points_data = load_points()
-                points_data["points"] += 50
-                save_points(points_data)
+                session.emit("goal_completed", points=50, reason="目標達成", key=f"goal_completed:{goal_id}")
             
-            save_goals(goals_df)
+            storage.table("goals").update(goal_id, changes)
             
             return True
     
@@ -1103,13 +1053,8 @@ def show_reward_tab(goals_df):
                 rewards.append(new_reward)
                 save_rewards(rewards)
                 
-                # ポイント獲得
-                points_data = load_points()
-                points_data["points"] += 5
-                save_points(points_data)
-                
-                # バッジの更新確認
-                check_reward_badge()
+                # ポイント獲得とバッジの判定
+                gamification.dispatch("reward_added", points=5, reason="報酬の設定")
                 
                 st.success(f"報酬「{reward_name}」を追加しました！5ポイント獲得！")
                 st.rerun()
@@ -1156,9 +1101,7 @@ def show_reward_tab(goals_df):
                         save_rewards(rewards)
                         
                         # ポイント獲得
-                        points_data = load_points()
-                        points_data["points"] += 20
-                        save_points(points_data)
+                        gamification.dispatch("reward_redeemed", points=20, reason="報酬の獲得", key=f"reward_redeemed:{reward['goal_id']}:{reward['id']}")
                         
                         st.success(f"報酬「{reward['name']}」を獲得しました！20ポイント獲得！")
                         st.balloons()
@@ -1228,9 +1171,7 @@ def show_future_message_tab(goals_df):
                 save_future_messages(messages)
                 
                 # ポイント獲得
-                points_data = load_points()
-                points_data["points"] += 5
-                save_points(points_data)
+                gamification.dispatch("future_message_created", points=5, reason="未来へのメッセージ作成")
                 
                 st.success("未来の自分へのメッセージを保存しました！5ポイント獲得！")
                 st.rerun()
@@ -1297,9 +1238,7 @@ def show_future_message_tab(goals_df):
                             save_future_messages(messages)
                             
                             # ポイント獲得
-                            points_data = load_points()
-                            points_data["points"] += 10
-                            save_points(points_data)
+                            gamification.dispatch("future_message_opened", points=10, reason="未来からのメッセージを開封", key=f"goal_future_message_opened:{message['goal_id']}:{message['id']}")
                             
                             st.success("メッセージを開封しました！10ポイント獲得！")
                         else:
@@ -1340,8 +1279,7 @@ def show_points_section():
     st.markdown("### 達成ポイント")
     
     # ポイント情報を取得
-    points_data = load_points()
-    total_points = points_data["points"]
+    total_points = gamification.points_balance()
     
     # レベル計算
     level = max(1, int(total_points ** 0.5 / 5))
@@ -1609,13 +1547,8 @@ def show_motivation_tab(goals_df):
                         
                         save_problems(problems_data)
                         
-                        # ポイント獲得
-                        points_data = load_points()
-                        points_data["points"] += 5
-                        save_points(points_data)
-                        
-                        # 問題解決者バッジをチェック
-                        check_problem_solver_badge(problems_data)
+                        # ポイント獲得と問題解決者バッジの判定
+                        gamification.dispatch("problem_added", points=5, reason="問題と対策の記録")
                         
                         st.success("問題と対策を保存しました！5ポイント獲得！")
         else:
@@ -1839,19 +1772,22 @@ def show_periodic_review_tab(goals_df, smart_goals_df, tasks_df):
         goal_tasks = tasks_df[tasks_df['goal_id'] == goal_id] if not tasks_df.empty else pd.DataFrame()
         
         if not goal_tasks.empty:
-            # 今月完了したタスク
-            month_completed_tasks = goal_tasks[(goal_tasks['status'] == 'completed') & 
-                                            (pd.to_datetime(goal_tasks['completed_at']).dt.date >= month_ago)]
-            
-            st.markdown(f"**今月完了したタスク:** {len(month_completed_tasks)}件")
-            
-            if not month_completed_tasks.empty:
-                # 完了タスクの日付ごとの集計
-                if 'completed_at' in month_completed_tasks.columns:
-                    month_completed_tasks['completed_date'] = pd.to_datetime(month_completed_tasks['completed_at']).dt.date
-                    completed_by_date = month_completed_tasks.groupby('completed_date').size().reset_index()
-                    completed_by_date.columns = ['date', 'count']
-                    
+            # 今月完了したタスク（完了日ごとの集計から取る）
+            month_completed = rollups.distribution(rollups.window("tasks", month_ago, today), "goal_id").get(str(goal_id), 0)
+            
+            st.markdown(f"**今月完了したタスク:** {month_completed}件")
+            
+            if month_completed:
+                # 完了タスクの日付ごとの集計（日のバケット）
+                completed_by_date = pd.DataFrame(
+                    [
+                        {'date': day, 'count': rollups.distribution(day_summary, "goal_id").get(str(goal_id), 0)}
+                        for day, day_summary in rollups.series("tasks", "day", month_ago, today)
+                    ],
+                    columns=['date', 'count'],
+                )
+                completed_by_date = completed_by_date[completed_by_date['count'] > 0]
+                if not completed_by_date.empty:
                     # タスク完了の日別グラフ
                     fig_tasks = px.bar(
                         completed_by_date,
@@ -2150,9 +2086,7 @@ def show_success_experience_tab():
                     save_success_memories(success_memories)
                     
                     # ポイント獲得
-                    points_data = load_points()
-                    points_data["points"] += 15
-                    save_points(points_data)
+                    gamification.dispatch("success_memory_added", points=15, reason="成功体験の記録", key=f"success_memory_added:{new_memory['id']}")
                     
                     st.success("成功体験を記録しました！15ポイント獲得！")
                     st.balloons()
@@ -2199,152 +2133,6 @@ def show_success_experience_tab():
         
         st.markdown(f"#### 💭 {random.choice(motivation_messages)}")
 
-# バッジの更新確認
-def update_badges():
-    # バッジデータの取得
-    badges_data = load_badges()
-    badges = badges_data["badges"]
-    
-    # 目標設定バッジの確認
-    goals_df = load_goals()
-    if not goals_df.empty and not any(badge["id"] == "first_goal" and badge["earned"] for badge in badges):
-        # 最初の目標設定バッジを獲得
-        for i, badge in enumerate(badges):
-            if badge["id"] == "first_goal":
-                badges[i]["earned"] = True
-                
-                # ポイント獲得
-                points_data = load_points()
-                points_data["points"] += 30
-                save_points(points_data)
-                
-                save_badges({"badges": badges})
-                break
-    
-    # 3つの目標設定バッジの確認
-    if len(goals_df) >= 3 and not any(badge["id"] == "three_goals" and badge["earned"] for badge in badges):
-        # 3つの目標設定バッジを獲得
-        for i, badge in enumerate(badges):
-            if badge["id"] == "three_goals":
-                badges[i]["earned"] = True
-                
-                # ポイント獲得
-                points_data = load_points()
-                points_data["points"] += 30
-                save_points(points_data)
-                
-                save_badges({"badges": badges})
-                break
-    
-    # 最初の目標達成バッジの確認
-    if 'status' in goals_df.columns and (goals_df['status'] == 'completed').any() and not any(badge["id"] == "first_complete" and badge["earned"] for badge in badges):
-        # 最初の目標達成バッジを獲得
-        for i, badge in enumerate(badges):
-            if badge["id"] == "first_complete":
-                badges[i]["earned"] = True
-                
-                # ポイント獲得
-                points_data = load_points()
-                points_data["points"] += 30
-                save_points(points_data)
-                
-                save_badges({"badges": badges})
-                break
-    
-    # 継続のバッジチェック
-    tasks_df = load_tasks()
-    if not tasks_df.empty and 'completed_at' in tasks_df.columns:
-        # 完了したタスクを日付でソート
-        completed_tasks = tasks_df[tasks_df['status'] == 'completed'].copy()
-        
-        if not completed_tasks.empty:
-            completed_tasks['completed_date'] = pd.to_datetime(completed_tasks['completed_at']).dt.date
-            
-            # 日付ごとのタスク完了数
-            daily_completions = completed_tasks.groupby('completed_date').size()
-            
-            # 連続した日付を確認
-            consecutive_days = 0
-            current_date = None
-            
-            for date in sorted(daily_completions.index):
-                if current_date is None:
-                    consecutive_days = 1
-                elif (date - current_date).days == 1:
-                    consecutive_days += 1
-                else:
-                    consecutive_days = 1
-                
-                current_date = date
-                
-                if consecutive_days >= 7 and not any(badge["id"] == "consistent" and badge["earned"] for badge in badges):
-                    # 継続の達人バッジを獲得
-                    for i, badge in enumerate(badges):
-                        if badge["id"] == "consistent":
-                            badges[i]["earned"] = True
-                            
-                            # ポイント獲得
-                            points_data = load_points()
-                            points_data["points"] += 30
-                            save_points(points_data)
-                            
-                            save_badges({"badges": badges})
-                            break
-                    
-                    break
-    
-    save_badges({"badges": badges})
-
-# 報酬バッジの確認
-def check_reward_badge():
-    # バッジデータの取得
-    badges_data = load_badges()
-    badges = badges_data["badges"]
-    
-    # 報酬設定バッジの確認
-    rewards = load_rewards()
-    
-    if len(rewards) >= 3 and not any(badge["id"] == "reward_planner" and badge["earned"] for badge in badges):
-        # 報酬プランナーバッジを獲得
-        for i, badge in enumerate(badges):
-            if badge["id"] == "reward_planner":
-                badges[i]["earned"] = True
-                
-                # ポイント獲得
-                points_data = load_points()
-                points_data["points"] += 30
-                save_points(points_data)
-                
-                save_badges({"badges": badges})
-                return True
-    
-    return False
-
-# 問題解決者バッジの確認
-def check_problem_solver_badge(problems_data):
-    # バッジデータの取得
-    badges_data = load_badges()
-    badges = badges_data["badges"]
-    
-    # 問題と対策のカウント
-    problem_count = sum(len(item.get("problems", [])) for item in problems_data)
-    
-    if problem_count >= 3 and not any(badge["id"] == "problem_solver" and badge["earned"] for badge in badges):
-        # 問題解決者バッジを獲得
-        for i, badge in enumerate(badges):
-            if badge["id"] == "problem_solver":
-                badges[i]["earned"] = True
-                
-                # ポイント獲得
-                points_data = load_points()
-                points_data["points"] += 30
-                save_points(points_data)
-                
-                save_badges({"badges": badges})
-                return True
-    
-    return False
-
 # マイクロタスク生成関数
 # マイクロタスク生成関数
 def generate_micro_tasks(goals_df, tasks_df=None):
@@ -2492,13 +2280,8 @@ def show_problems_and_solutions():
                 
                 save_problems(problems_data)
                 
-                # ポイント獲得
-                points_data = load_points()
-                points_data["points"] += 5
-                save_points(points_data)
-                
-                # 問題解決者バッジをチェック
-                check_problem_solver_badge(problems_data)
+                # ポイント獲得と問題解決者バッジの判定
+                gamification.dispatch("problem_added", points=5, reason="問題と対策の記録")
                 
                 st.success("問題と対策を保存しました！5ポイント獲得！")
     
@@ -2587,9 +2370,7 @@ def show_success_experiences():
                     save_success_memories(success_memories)
                     
                     # ポイント獲得
-                    points_data = load_points()
-                    points_data["points"] += 15
-                    save_points(points_data)
+                    gamification.dispatch("success_memory_added", points=15, reason="成功体験の記録", key=f"success_memory_added:{new_memory['id']}")
                     
                     st.success("成功体験を記録しました！15ポイント獲得！")
                     st.balloons()
@@ -2654,4 +2435,4 @@ elif page == "進捗振り返り":
 
 if __name__ == "__main__":
     # バッジの更新確認
-    update_badges()    
\ No newline at end of file
+    gamification.dispatch(gamification.SYNC)    
\ No newline at end of file
@@ -1,18 +1,22 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
 import json
 import os
 import random
 import uuid
-import calendar
-from PIL import Image
-import io
-import base64
+import storage
+import gamification
+import points_ledger
+import activity_calendar
+import pagination
+import aggregates
+import streaks
+import lazy_imports
+
+# 重いライブラリは使うときに読み込む
+px = lazy_imports.lazy_import("plotly.express")
 
 # ページの設定
 st.set_page_config(
@@ -172,6 +176,40 @@ st.markdown("""
         background-color: #F5F5F5;
         color: #9E9E9E;
     }
+    .heatmap-wrapper {
+        background-color: white;
+        padding: 1rem;
+        border-radius: 10px;
+        box-shadow: 0 2px 5px rgba(0,0,0,0.1);
+        margin-bottom: 10px;
+        overflow-x: auto;
+    }
+    .heatmap-grid {
+        display: grid;
+        grid-template-rows: repeat(7, 12px);
+        grid-auto-flow: column;
+        grid-auto-columns: 12px;
+        grid-gap: 3px;
+    }
+    .heatmap-cell {
+        display: inline-block;
+        width: 12px;
+        height: 12px;
+        border-radius: 2px;
+    }
+    .heatmap-legend {
+        display: flex;
+        align-items: center;
+        gap: 3px;
+        font-size: 0.8rem;
+        color: #757575;
+    }
+    .heat-0 { background-color: #EEEEEE; }
+    .heat-1 { background-color: #C8E6C9; }
+    .heat-2 { background-color: #81C784; }
+    .heat-3 { background-color: #4CAF50; }
+    .heat-4 { background-color: #2E7D32; }
+    .heat-future { background-color: transparent; }
 </style>
 """, unsafe_allow_html=True)
 
@@ -186,8 +224,7 @@ DAILY_QUOTE_FILE = "daily_quotes.json"
 # データファイルの初期化
 def initialize_motivation_files():
     if not os.path.exists(ACTIVITY_LOG_FILE):
-        with open(ACTIVITY_LOG_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(ACTIVITY_LOG_FILE, [])
     
     if not os.path.exists(CHALLENGE_FILE):
         default_challenges = [
@@ -212,8 +249,7 @@ def initialize_motivation_files():
                 "reward_points": 200
             }
         ]
-        with open(CHALLENGE_FILE, "w") as f:
-            json.dump(default_challenges, f)
+        storage.save_document(CHALLENGE_FILE, default_challenges)
     
     if not os.path.exists(TITLE_FILE):
         default_titles = [
@@ -223,16 +259,13 @@ def initialize_motivation_files():
             {"id": "master", "name": "継続マスター", "description": "50日間アプリを使用", "requirement": 50, "image": "🌟", "earned": False},
             {"id": "guru", "name": "自己肯定の達人", "description": "100日間アプリを使用", "requirement": 100, "image": "👑", "earned": False}
         ]
-        with open(TITLE_FILE, "w") as f:
-            json.dump({"titles": default_titles}, f)
+        storage.save_document(TITLE_FILE, {"titles": default_titles})
     
     if not os.path.exists(MESSAGES_FILE):
-        with open(MESSAGES_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(MESSAGES_FILE, [])
     
     if not os.path.exists(ACHIEVEMENTS_FILE):
-        with open(ACHIEVEMENTS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(ACHIEVEMENTS_FILE, [])
     
     if not os.path.exists(DAILY_QUOTE_FILE):
         default_quotes = [
@@ -247,235 +280,72 @@ def initialize_motivation_files():
             {"quote": "小さな進歩も、進歩です。自分の成長を祝いましょう。", "author": "不明"},
             {"quote": "一度の失敗は成功への一歩です。諦めないでください。", "author": "不明"}
         ]
-        with open(DAILY_QUOTE_FILE, "w") as f:
-            json.dump(default_quotes, f)
+        storage.save_document(DAILY_QUOTE_FILE, default_quotes)
 
 # 初期化を実行
 initialize_motivation_files()
 
 # データ読み込み関数
-def load_activity_log():
-    with open(ACTIVITY_LOG_FILE, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data) if data else pd.DataFrame(columns=["date", "activity_type", "notes", "points"])
+def load_activity_log(typed=False):
+    return storage.table("activity_log").load(typed=typed)
 
 def load_challenges():
-    with open(CHALLENGE_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(CHALLENGE_FILE)
 
 def load_titles():
-    with open(TITLE_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(TITLE_FILE)
 
 def load_messages():
-    with open(MESSAGES_FILE, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data) if data else pd.DataFrame(columns=["id", "content", "created_date", "target_date", "opened"])
+    return storage.table("motivation_messages").load()
 
 def load_achievements():
-    with open(ACHIEVEMENTS_FILE, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data) if data else pd.DataFrame(columns=["id", "name", "description", "date", "points"])
+    return storage.table("motivation_achievements").load()
 
 def load_daily_quotes():
-    with open(DAILY_QUOTE_FILE, "r") as f:
-        return json.load(f)
+    return storage.load_document(DAILY_QUOTE_FILE)
 
 # データ保存関数
 def save_activity_log(df):
-    with open(ACTIVITY_LOG_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("activity_log").save(df)
 
 def save_challenges(challenges):
-    with open(CHALLENGE_FILE, "w") as f:
-        json.dump(challenges, f)
+    storage.save_document(CHALLENGE_FILE, challenges)
 
 def save_titles(titles_data):
-    with open(TITLE_FILE, "w") as f:
-        json.dump(titles_data, f)
+    storage.save_document(TITLE_FILE, titles_data)
 
 def save_messages(df):
-    with open(MESSAGES_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("motivation_messages").save(df)
 
 def save_achievements(df):
-    with open(ACHIEVEMENTS_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
-
-# ポイント関数（04_goal_achievementと共有）
-def get_points():
-    try:
-        with open("points.json", "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        # ファイルが存在しない、または読み込めない場合は新規作成
-        points_data = {"points": 0}
-        with open("points.json", "w") as f:
-            json.dump(points_data, f)
-        return points_data
-
-def save_points(points_data):
-    with open("points.json", "w") as f:
-        json.dump(points_data, f)
-
-def add_points(amount, reason="活動"):
-    points_data = get_points()
-    points_data["points"] += amount
-    save_points(points_data)
-    
-    # アクティビティログに記録
-    activity_log = load_activity_log()
-    new_activity = {
-        "date": datetime.now().strftime("%Y-%m-%d"),
-        "activity_type": "ポイント獲得",
-        "notes": reason,
-        "points": amount
-    }
-    
-    if activity_log.empty:
-        activity_log = pd.DataFrame([new_activity])
-    else:
-        activity_log = pd.concat([activity_log, pd.DataFrame([new_activity])], ignore_index=True)
-    
-    save_activity_log(activity_log)
-    
-    return points_data["points"]
+    storage.table("motivation_achievements").save(df)
 
 # 今日のアクティビティを記録
 def record_daily_activity():
     today = date.today().strftime("%Y-%m-%d")
-    activity_log = load_activity_log()
     
-    # 今日の記録があるか確認
-    today_login = activity_log[(activity_log['date'] == today) & (activity_log['activity_type'] == "ログイン")]
-    
-    if today_login.empty:
-        # 今日初めてのログイン
-        new_activity = {
-            "date": today,
-            "activity_type": "ログイン",
-            "notes": "アプリを開いた",
-            "points": 5
-        }
-        
-        if activity_log.empty:
-            activity_log = pd.DataFrame([new_activity])
-        else:
-            activity_log = pd.concat([activity_log, pd.DataFrame([new_activity])], ignore_index=True)
-        
-        save_activity_log(activity_log)
-        
-        # ポイント追加
-        add_points(5, "毎日のログイン")
-        
-        # チャレンジ更新
-        update_challenges()
-        
-        # 称号更新
-        update_titles()
+    # 今日の記録があるか確認（同時に開いた別のセッションと二重に記録しないようロックする）
+    activity_log = storage.table("activity_log")
+    with activity_log.lock():
+        today_login = activity_log.query(start=today, end=today, activity_type="ログイン")
+        first_login = today_login.empty
+        if first_login:
+            new_activity = {
+                "date": today,
+                "activity_type": "ログイン",
+                "notes": "アプリを開いた",
+                "points": 5
+            }
+            activity_log.append(new_activity)
+    
+    if first_login:
+        # ポイント追加・チャレンジと称号の判定をまとめて保存
+        gamification.dispatch("login", points=5, reason="毎日のログイン", key=f"login:{today}", log_activity=True)
         
         return True
     
     return False
 
-# チャレンジの更新
-def update_challenges():
-    today = date.today()
-    challenges = load_challenges()
-    activity_log = load_activity_log()
-    
-    # アクティビティログから日付のリスト作成（昇順）
-    if not activity_log.empty and 'date' in activity_log.columns:
-        activity_dates = pd.to_datetime(activity_log['date']).dt.date.unique()
-        activity_dates = sorted(activity_dates)
-    else:
-        activity_dates = []
-    
-    for i, challenge in enumerate(challenges):
-        # チャレンジがまだ開始されていない場合、今日から開始
-        if challenge["start_date"] is None and not challenge["completed"]:
-            challenges[i]["start_date"] = today.strftime("%Y-%m-%d")
-            challenges[i]["current_streak"] = 1
-        elif not challenge["completed"]:
-            # 開始日から今日までの連続日数を計算
-            start_date = datetime.strptime(challenge["start_date"], "%Y-%m-%d").date()
-            
-            # 連続日数を計算
-            streak = 0
-            expected_date = start_date
-            
-            for activity_date in activity_dates:
-                if activity_date == expected_date:
-                    streak += 1
-                    expected_date = activity_date + timedelta(days=1)
-                elif activity_date > expected_date:
-                    # 連続が途切れた
-                    break
-            
-            # 今日のログインがあれば+1
-            if today in activity_dates:
-                if expected_date == today:
-                    streak += 1
-            
-            challenges[i]["current_streak"] = streak
-            
-            # チャレンジ達成確認
-            if streak >= challenge["target_days"]:
-                challenges[i]["completed"] = True
-                
-                # ポイント獲得
-                add_points(challenge["reward_points"], f"チャレンジ達成: {challenge['name']}")
-                
-                # 実績に追加
-                add_achievement(challenge["name"], challenge["description"], challenge["reward_points"])
-    
-    save_challenges(challenges)
-
-# 称号の更新
-def update_titles():
-    activity_log = load_activity_log()
-    titles_data = load_titles()
-    titles = titles_data["titles"]
-    
-    # アクティビティログからユニークな日付をカウント
-    if not activity_log.empty and 'date' in activity_log.columns:
-        unique_days = activity_log['date'].nunique()
-    else:
-        unique_days = 0
-    
-    for i, title in enumerate(titles):
-        if not title["earned"] and unique_days >= title["requirement"]:
-            # 称号獲得
-            titles[i]["earned"] = True
-            
-            # ポイント獲得
-            add_points(title["requirement"] * 2, f"称号獲得: {title['name']}")
-            
-            # 実績に追加
-            add_achievement(f"称号「{title['name']}」を獲得", title["description"], title["requirement"] * 2)
-    
-    titles_data["titles"] = titles
-    save_titles(titles_data)
-
-# 実績の追加
-def add_achievement(name, description, points):
-    achievements = load_achievements()
-    
-    new_achievement = {
-        "id": str(uuid.uuid4()),
-        "name": name,
-        "description": description,
-        "date": date.today().strftime("%Y-%m-%d"),
-        "points": points
-    }
-    
-    if achievements.empty:
-        achievements = pd.DataFrame([new_achievement])
-    else:
-        achievements = pd.concat([achievements, pd.DataFrame([new_achievement])], ignore_index=True)
-    
-    save_achievements(achievements)
-
 # マルチページアプリのタイトル
 st.markdown('<h1 class="main-header">💪 モチベーション管理</h1>', unsafe_allow_html=True)
 
@@ -483,8 +353,7 @@ st.markdown('<h1 class="main-header">💪 モチベーション管理</h1>', uns
 first_login_today = record_daily_activity()
 
 # サイドバーにポイント表示
-points_data = get_points()
-st.sidebar.markdown(f"### 📊 現在のポイント: {points_data['points']}ポイント")
+st.sidebar.markdown(f"### 📊 現在のポイント: {gamification.points_balance()}ポイント")
 
 # ページナビゲーション
 page = st.sidebar.radio(
@@ -509,8 +378,8 @@ if first_login_today:
 def show_motivation_dashboard():
     st.markdown('<h2 class="sub-header">📊 モチベーションダッシュボード</h2>', unsafe_allow_html=True)
     
-    # データを読み込む
-    activity_log = load_activity_log()
+    # データを読み込む（活動ログは全件ではなく、書き込み時に更新している集計値を使う）
+    activity_summary = aggregates.summary("activity_log")
     challenges = load_challenges()
     titles_data = load_titles()
     messages = load_messages()
@@ -519,20 +388,14 @@ def show_motivation_dashboard():
     # 過去30日間の活動グラフ
     st.markdown("### 過去30日間の活動状況")
     
-    if not activity_log.empty and 'date' in activity_log.columns:
-        # 日付を変換
-        activity_log['date'] = pd.to_datetime(activity_log['date']).dt.date
-        
+    if activity_summary["total"] > 0:
         # 過去30日間の日付範囲を作成
         today = date.today()
         date_range = [today - timedelta(days=x) for x in range(29, -1, -1)]
         
         # 各日のアクティビティ数をカウント
-        activity_counts = []
-        
-        for single_date in date_range:
-            day_activity = activity_log[activity_log['date'] == single_date]
-            activity_counts.append(len(day_activity))
+        daily_counts = activity_summary["by_day"]
+        activity_counts = [daily_counts.get(single_date.strftime("%Y-%m-%d"), 0) for single_date in date_range]
         
         # グラフデータの作成
         graph_data = pd.DataFrame({
@@ -553,13 +416,17 @@ def show_motivation_dashboard():
         st.plotly_chart(fig, use_container_width=True)
         
         # 累計ポイントの折れ線グラフを表示
-        if 'points' in activity_log.columns:
+        points_by_day = activity_summary["points_by_day"]
+        if points_by_day:
             # 日付ごとの累計ポイントを計算
-            activity_log = activity_log.sort_values('date')
-            activity_log['cumulative_points'] = activity_log['points'].cumsum()
+            points_series = pd.Series(points_by_day).sort_index()
+            activity_points = pd.DataFrame({
+                'date': pd.to_datetime(points_series.index, errors="coerce"),
+                'cumulative_points': points_series.cumsum().values
+            })
             
             # 最新のデータを30日分取得
-            recent_activity = activity_log.drop_duplicates('date', keep='last').tail(30)
+            recent_activity = activity_points.tail(30)
             
             if not recent_activity.empty:
                 fig_points = px.line(
@@ -577,8 +444,11 @@ def show_motivation_dashboard():
     
     col1, col2, col3 = st.columns(3)
     
+    # ログインした日の一覧
+    login_dates = [day for day, types in activity_summary["types_by_day"].items() if types.get("ログイン", 0) > 0]
+    
     # 継続日数
-    current_streak = calculate_current_streak(activity_log)
+    current_streak = calculate_current_streak(login_dates)
     
     with col1:
         st.markdown("""
@@ -590,7 +460,7 @@ def show_motivation_dashboard():
         """.format(current_streak), unsafe_allow_html=True)
     
     # 最長継続日数
-    max_streak = calculate_max_streak(activity_log)
+    max_streak = calculate_max_streak(login_dates)
     
     with col2:
         st.markdown("""
@@ -602,7 +472,7 @@ def show_motivation_dashboard():
         """.format(max_streak), unsafe_allow_html=True)
     
     # 総活動ポイント
-    total_points = points_data["points"]
+    total_points = gamification.points_balance()
     
     with col3:
         st.markdown("""
@@ -617,17 +487,20 @@ def show_motivation_dashboard():
     st.markdown("### 先週の振り返り")
     
     # 先週のデータを抽出
-    if not activity_log.empty and 'date' in activity_log.columns:
+    if activity_summary["total"] > 0:
         today = date.today()
-        week_ago = today - timedelta(days=7)
+        last_week = [(today - timedelta(days=x)).strftime("%Y-%m-%d") for x in range(7, 0, -1)]
+        last_week = [day for day in last_week if day in activity_summary["by_day"]]
         
-        last_week_activity = activity_log[(activity_log['date'] >= week_ago) & (activity_log['date'] < today)]
-        
-        if not last_week_activity.empty:
+        if last_week:
             # アクティビティの分析
-            activity_types = last_week_activity['activity_type'].value_counts()
-            total_points_week = last_week_activity['points'].sum()
-            active_days = last_week_activity['date'].nunique()
+            week_types = pd.DataFrame([activity_summary["types_by_day"].get(day, {}) for day in last_week])
+            activity_types = week_types.sum().sort_values(ascending=False)
+            total_points_week = points_ledger.total(
+                start=(today - timedelta(days=7)).strftime("%Y-%m-%d"),
+                end=(today - timedelta(days=1)).strftime("%Y-%m-%d"),
+            )
+            active_days = len(last_week)
             
             # フィードバックを生成
             feedback = generate_weekly_feedback(activity_types, total_points_week, active_days)
@@ -704,15 +577,6 @@ def show_motivation_dashboard():
 def show_effort_calendar():
     st.markdown('<h2 class="sub-header">📅 努力カレンダー</h2>', unsafe_allow_html=True)
     
-    # データを読み込む
-    activity_log = load_activity_log()
-    
-    # アクティブな日付のリスト作成
-    active_dates = []
-    if not activity_log.empty and 'date' in activity_log.columns:
-        activity_log['date'] = pd.to_datetime(activity_log['date'])
-        active_dates = activity_log['date'].dt.strftime('%Y-%m-%d').unique()
-    
     # 月を選択とカレンダー表示を同じ行に
     col1, col2 = st.columns([1, 3])
     
@@ -730,51 +594,9 @@ def show_effort_calendar():
         selected_year = int(selected_month_str.split('年')[0])
         selected_month = int(selected_month_str.split('年')[1].split('月')[0])
     
-    # カレンダー部分をHTMLで直接構築
-    cal = calendar.monthcalendar(selected_year, selected_month)
-    
-    # HTMLカレンダーの構築
-    calendar_html = f"""
-    <div class="calendar-wrapper">
-        <div class="calendar-title">{selected_year}年{selected_month}月</div>
-        <div class="calendar-grid">
-            <div class="weekday-label">月</div>
-            <div class="weekday-label">火</div>
-            <div class="weekday-label">水</div>
-            <div class="weekday-label">木</div>
-            <div class="weekday-label">金</div>
-            <div class="weekday-label">土</div>
-            <div class="weekday-label">日</div>
-    """
-    
-    for week in cal:
-        for day in week:
-            if day == 0:
-                # 月に含まれない日
-                calendar_html += '<div class="calendar-cell"></div>'
-            else:
-                date_str = f"{selected_year}-{selected_month:02d}-{day:02d}"
-                is_today = (date(selected_year, selected_month, day) == date.today())
-                is_active = date_str in active_dates
-                
-                cell_class = "calendar-cell"
-                if is_active:
-                    cell_class += " calendar-cell-active"
-                else:
-                    cell_class += " calendar-cell-empty"
-                
-                if is_today:
-                    cell_class += " calendar-cell-today"
-                
-                calendar_html += f'<div class="{cell_class}">{day}</div>'
-    
-    calendar_html += """
-        </div>
-    </div>
-    """
-    
+    # カレンダーのHTML（日別の活動数の配列から作り、データが変わるまではキャッシュを使う）
     with col2:
-        st.markdown(calendar_html, unsafe_allow_html=True)
+        st.markdown(activity_calendar.month_html(selected_year, selected_month), unsafe_allow_html=True)
     
     # 月間活動統計
     st.markdown("### 月間活動統計")
@@ -782,65 +604,89 @@ def show_effort_calendar():
     # 表示を3列に分けて横に並べる
     stat_cols = st.columns(3)
     
-    # 選択した月のデータを抽出
-    if not activity_log.empty:
-        month_activity = activity_log[(activity_log['date'].dt.year == selected_year) & 
-                                     (activity_log['date'].dt.month == selected_month)]
+    # 選択した月の日別の活動数と獲得ポイント
+    month_stats = activity_calendar.month_stats(selected_year, selected_month)
+    
+    if month_stats["active_days"] > 0:
+        # 活動日数と月の日数
+        active_days_count = month_stats["active_days"]
+        days_in_month = month_stats["days_in_month"]
         
-        if not month_activity.empty:
-            # 活動日数
-            active_days_count = month_activity['date'].dt.date.nunique()
-            
-            # 月の日数
-            _, days_in_month = calendar.monthrange(selected_year, selected_month)
-            
-            # 活動率
-            activity_rate = (active_days_count / days_in_month) * 100
-            
-            with stat_cols[0]:
-                st.markdown(f"""
-                <div class="stat-card">
-                    <p>活動日数</p>
-                    <p class="stat-value">{active_days_count}</p>
-                    <p>/ {days_in_month}日</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with stat_cols[1]:
-                st.markdown(f"""
-                <div class="stat-card">
-                    <p>活動率</p>
-                    <p class="stat-value">{activity_rate:.1f}%</p>
-                    <p>の日にアクティブ</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with stat_cols[2]:
-                if 'points' in month_activity.columns:
-                    total_points = month_activity['points'].sum()
-                    st.markdown(f"""
-                    <div class="stat-card">
-                        <p>獲得ポイント</p>
-                        <p class="stat-value">{total_points}</p>
-                        <p>ポイント</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-            
-            # カレンダーの活動グラフ
-            activity_by_date = month_activity.groupby(month_activity['date'].dt.date).size().reset_index()
-            activity_by_date.columns = ['date', 'count']
-            
-            fig = px.bar(
-                activity_by_date,
-                x='date',
-                y='count',
-                title=f"{selected_year}年{selected_month}月の活動分布",
-                labels={'date': '日付', 'count': 'アクティビティ数'}
-            )
-            fig.update_layout(height=300)  # グラフの高さを小さくする
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info(f"{selected_year}年{selected_month}月のデータがありません。")
+        # 活動率
+        activity_rate = (active_days_count / days_in_month) * 100
+        
+        with stat_cols[0]:
+            st.markdown(f"""
+            <div class="stat-card">
+                <p>活動日数</p>
+                <p class="stat-value">{active_days_count}</p>
+                <p>/ {days_in_month}日</p>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with stat_cols[1]:
+            st.markdown(f"""
+            <div class="stat-card">
+                <p>活動率</p>
+                <p class="stat-value">{activity_rate:.1f}%</p>
+                <p>の日にアクティブ</p>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with stat_cols[2]:
+            st.markdown(f"""
+            <div class="stat-card">
+                <p>獲得ポイント</p>
+                <p class="stat-value">{month_stats["points"]}</p>
+                <p>ポイント</p>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        # カレンダーの活動グラフ（活動のあった日だけ）
+        counts = month_stats["counts"]
+        active_index = np.flatnonzero(counts)
+        activity_by_date = pd.DataFrame({
+            'date': [date(selected_year, selected_month, int(i) + 1) for i in active_index],
+            'count': counts[active_index]
+        })
+        
+        fig = px.bar(
+            activity_by_date,
+            x='date',
+            y='count',
+            title=f"{selected_year}年{selected_month}月の活動分布",
+            labels={'date': '日付', 'count': 'アクティビティ数'}
+        )
+        fig.update_layout(height=300)  # グラフの高さを小さくする
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info(f"{selected_year}年{selected_month}月のデータがありません。")
+    
+    # 年間の活動ヒートマップ
+    st.markdown("### 年間の活動ヒートマップ")
+    
+    years = activity_calendar.active_years()
+    if years:
+        first_year = min(years[0], today.year)
+        year_options = list(range(today.year, first_year - 1, -1))
+        years_to_show = st.slider("表示する年数", 1, len(year_options), min(3, len(year_options))) if len(year_options) > 1 else 1
+        
+        for year in year_options[:years_to_show]:
+            st.markdown(activity_calendar.year_heatmap_html(year), unsafe_allow_html=True)
+        
+        st.markdown("""
+        <div class="heatmap-legend">
+            少ない
+            <span class="heatmap-cell heat-0"></span>
+            <span class="heatmap-cell heat-1"></span>
+            <span class="heatmap-cell heat-2"></span>
+            <span class="heatmap-cell heat-3"></span>
+            <span class="heatmap-cell heat-4"></span>
+            多い
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.info("まだ活動の記録がありません。")
     
     # 今後の目標設定
     st.markdown("### 来月の活動目標")
@@ -1004,15 +850,12 @@ def show_future_messages():
                     "opened": False
                 }
                 
-                if messages.empty:
-                    messages = pd.DataFrame([new_message])
-                else:
-                    messages = pd.concat([messages, pd.DataFrame([new_message])], ignore_index=True)
-                
-                save_messages(messages)
+                storage.table("motivation_messages").append(new_message)
+                # 待機中の一覧に今保存したメッセージも出す（テーブルのキャッシュから読み直す）
+                messages = load_messages()
                 
                 # ポイント獲得
-                add_points(10, "未来へのメッセージ作成")
+                gamification.dispatch("future_message_created", points=10, reason="未来へのメッセージ作成", key=f"future_message_created:{new_message['id']}", log_activity=True)
                 
                 st.success("メッセージを保存しました！指定した日になると開封できます。")
                 st.balloons()
@@ -1049,10 +892,10 @@ def show_future_messages():
                     
                     # メッセージを開封済みに更新
                     messages.loc[messages['id'] == message['id'], 'opened'] = True
-                    save_messages(messages)
+                    storage.table("motivation_messages").update(message['id'], {"opened": True})
                     
                     # ポイント獲得
-                    add_points(20, "未来からのメッセージを開封")
+                    gamification.dispatch("future_message_opened", points=20, reason="未来からのメッセージを開封", key=f"future_message_opened:{message['id']}", log_activity=True)
                     
                     st.success("メッセージを開封しました！20ポイント獲得！")
         else:
@@ -1170,10 +1013,13 @@ def show_achievements_titles():
     st.markdown("### 獲得した実績")
     
     if not achievements.empty:
-        # 実績を日付順にソート
-        achievements = achievements.sort_values('date', ascending=False)
+        # 新しい実績から1ページ分だけ読み込む
+        achievement_page = pagination.paginate(
+            "achievement_list",
+            pagination.table_fetcher(storage.table("motivation_achievements"), descending=True)
+        )
         
-        for _, achievement in achievements.iterrows():
+        for _, achievement in achievement_page:
             st.markdown(f"""
             <div class="achievement-card">
                 <h4>🏆 {achievement['name']}</h4>
@@ -1210,73 +1056,13 @@ def show_achievements_titles():
         st.plotly_chart(fig, use_container_width=True)
 
 # ユーティリティ関数
-def calculate_current_streak(activity_log):
-    """現在の連続ログイン日数を計算"""
-    if activity_log.empty or 'date' not in activity_log.columns:
-        return 0
-    
-    # 日付をソート
-    activity_log['date'] = pd.to_datetime(activity_log['date']).dt.date
-    login_dates = activity_log[activity_log['activity_type'] == "ログイン"]['date'].unique()
-    login_dates = sorted(login_dates, reverse=True)
-    
-    if not login_dates:
-        return 0
-    
-    # 今日または昨日のログインがあるか確認
-    today = date.today()
-    yesterday = today - timedelta(days=1)
-    
-    if today not in login_dates and yesterday not in login_dates:
-        return 0
-    
-    # 連続日数を計算
-    streak = 1
-    prev_date = login_dates[0]
-    
-    for i in range(1, len(login_dates)):
-        current_date = login_dates[i]
-        days_diff = (prev_date - current_date).days
-        
-        if days_diff == 1:
-            streak += 1
-            prev_date = current_date
-        else:
-            break
-    
-    return streak
+def calculate_current_streak(login_dates):
+    """現在の連続ログイン日数を計算（今日か昨日まで続いていなければ 0）"""
+    return streaks.current_streak(login_dates, end=date.today(), grace=1)
 
-def calculate_max_streak(activity_log):
+def calculate_max_streak(login_dates):
     """最長の連続ログイン日数を計算"""
-    if activity_log.empty or 'date' not in activity_log.columns:
-        return 0
-    
-    # 日付をソート
-    activity_log['date'] = pd.to_datetime(activity_log['date']).dt.date
-    login_dates = activity_log[activity_log['activity_type'] == "ログイン"]['date'].unique()
-    login_dates = sorted(login_dates)
-    
-    if not login_dates:
-        return 0
-    
-    # 最長連続日数を計算
-    max_streak = 1
-    current_streak = 1
-    prev_date = login_dates[0]
-    
-    for i in range(1, len(login_dates)):
-        current_date = login_dates[i]
-        days_diff = (current_date - prev_date).days
-        
-        if days_diff == 1:
-            current_streak += 1
-            max_streak = max(max_streak, current_streak)
-        else:
-            current_streak = 1
-        
-        prev_date = current_date
-    
-    return max_streak
+    return streaks.max_streak(login_dates)
 
 def generate_weekly_feedback(activity_types, total_points, active_days):
     """週間アクティビティに基づいたフィードバックを生成"""
@@ -1,29 +1,21 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
 import json
 import os
 import random
+from collections import Counter
 import uuid
 import re
-from collections import Counter
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
+import storage
+import daily_features
+import keyword_index
+import rollups
+import lazy_imports
 
-# NLTKのダウンロード（初回実行時のみ必要）
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+# 重いライブラリは使うときに読み込む
+px = lazy_imports.lazy_import("plotly.express")
 
 # ページの設定
 st.set_page_config(
@@ -193,8 +185,7 @@ SELF_ESTEEM_LOG_FILE = "self_esteem_log.json"
 # データファイルの初期化
 def initialize_analysis_files():
     if not os.path.exists(ANALYSIS_REPORT_FILE):
-        with open(ANALYSIS_REPORT_FILE, "w", encoding='utf-8') as f:
-            json.dump([], f)
+        storage.save_document(ANALYSIS_REPORT_FILE, [])
     
     if not os.path.exists(THOUGHT_PATTERNS_FILE):
         default_patterns = {
@@ -207,8 +198,7 @@ def initialize_analysis_files():
                 {"id": "growth_mindset", "name": "成長思考", "count": 0, "keywords": ["挑戦", "学習", "進歩", "努力"], "examples": [], "type": "positive"}
             ]
         }
-        with open(THOUGHT_PATTERNS_FILE, "w", encoding='utf-8') as f:
-            json.dump(default_patterns, f)
+        storage.save_document(THOUGHT_PATTERNS_FILE, default_patterns)
     
     if not os.path.exists(STRENGTH_WEAKNESS_FILE):
         default_strengths = {
@@ -224,111 +214,63 @@ def initialize_analysis_files():
                 {"id": "inconsistency", "name": "不一貫性", "score": 0, "evidence": []}
             ]
         }
-        with open(STRENGTH_WEAKNESS_FILE, "w", encoding='utf-8') as f:
-            json.dump(default_strengths, f)
+        storage.save_document(STRENGTH_WEAKNESS_FILE, default_strengths)
     
     if not os.path.exists(SELF_ESTEEM_LOG_FILE):
-        with open(SELF_ESTEEM_LOG_FILE, "w", encoding='utf-8') as f:
-            json.dump([], f)
+        storage.save_document(SELF_ESTEEM_LOG_FILE, [])
 
 # 初期化を実行
 initialize_analysis_files()
 
 # データ読み込み関数
-def load_emotion_logs():
-    try:
-        with open(EMOTION_LOGS_FILE, "r", encoding='utf-8') as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_emotion_logs(columns=None):
+    return storage.table("emotion_logs").load(columns=columns)
 
-def load_growth_data():
-    try:
-        with open(GROWTH_DATA_FILE, "r", encoding='utf-8') as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_growth_data(columns=None):
+    return storage.table("growth_data").load(columns=columns)
 
-def load_goals():
-    try:
-        with open(GOALS_FILE, "r", encoding='utf-8') as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_goals(columns=None):
+    return storage.table("goals").load(columns=columns)
 
-def load_habit_records():
-    try:
-        with open(HABIT_RECORDS_FILE, "r", encoding='utf-8') as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_habit_records(columns=None):
+    return storage.table("habit_records").load(columns=columns)
 
-def load_small_wins():
-    try:
-        with open(SMALL_WINS_FILE, "r", encoding='utf-8') as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_small_wins(columns=None):
+    return storage.table("small_wins").load(columns=columns)
 
-def load_activity_log():
-    try:
-        with open(ACTIVITY_LOG_FILE, "r", encoding='utf-8') as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_activity_log(columns=None):
+    return storage.table("activity_log").load(columns=columns)
 
 def load_analysis_reports():
-    try:
-        with open(ANALYSIS_REPORT_FILE, "r", encoding='utf-8') as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+    return storage.table("analysis_report").load()
 
 def load_thought_patterns():
-    try:
-        with open(THOUGHT_PATTERNS_FILE, "r", encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {"patterns": []}
+    data = storage.load_document(THOUGHT_PATTERNS_FILE)
+    if data is not None:
+        return data
+    return {"patterns": []}
 
 def load_strength_weakness():
-    try:
-        with open(STRENGTH_WEAKNESS_FILE, "r", encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {"strengths": [], "weaknesses": []}
+    data = storage.load_document(STRENGTH_WEAKNESS_FILE)
+    if data is not None:
+        return data
+    return {"strengths": [], "weaknesses": []}
 
 def load_self_esteem_log():
-    try:
-        with open(SELF_ESTEEM_LOG_FILE, "r", encoding='utf-8') as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+    return storage.table("self_esteem_log").load()
 
 # データ保存関数
 def save_analysis_reports(df):
-    with open(ANALYSIS_REPORT_FILE, "w", encoding='utf-8') as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("analysis_report").save(df)
 
 def save_thought_patterns(patterns_data):
-    with open(THOUGHT_PATTERNS_FILE, "w", encoding='utf-8') as f:
-        json.dump(patterns_data, f)
+    storage.save_document(THOUGHT_PATTERNS_FILE, patterns_data)
 
 def save_strength_weakness(strength_data):
-    with open(STRENGTH_WEAKNESS_FILE, "w", encoding='utf-8') as f:
-        json.dump(strength_data, f)
+    storage.save_document(STRENGTH_WEAKNESS_FILE, strength_data)
 
 def save_self_esteem_log(df):
-    with open(SELF_ESTEEM_LOG_FILE, "w", encoding='utf-8') as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("self_esteem_log").save(df)
 
 # マルチページアプリのタイトル
 st.markdown('<h1 class="main-header">🔍 自己分析</h1>', unsafe_allow_html=True)
@@ -343,25 +285,23 @@ page = st.sidebar.radio(
 def show_behavior_emotion_analysis():
     st.markdown('<h2 class="sub-header">📊 行動・感情分析</h2>', unsafe_allow_html=True)
     
-    # 各種データの読み込み
-    emotion_logs = load_emotion_logs()
-    growth_data = load_growth_data()
-    habit_records = load_habit_records()
-    small_wins = load_small_wins()
-    activity_log = load_activity_log()
+    # 日ごとの特徴量（感情・習慣・小さな成功・活動・成長記録を日付で揃えた 1 日 1 行の表）
+    features = daily_features.frame()
+    totals = features[["emotions", "growth_records", "habit_records", "wins", "activities"]].sum()
     
     # データがない場合の処理
-    if (emotion_logs.empty and growth_data.empty and 
-        habit_records.empty and small_wins.empty and activity_log.empty):
+    if not totals.any():
         st.warning("分析に必要なデータがまだ十分にありません。他の機能を使って活動データを増やしましょう！")
         return
     
     # 感情ログの分析
     st.markdown("### 感情傾向の分析")
     
-    if not emotion_logs.empty and 'emotion' in emotion_logs.columns:
-        # 感情の種類をカウント
-        emotions_count = emotion_logs['emotion'].value_counts()
+    if totals["emotions"]:
+        # 感情の種類をカウント（期間ごとの集計から）
+        emotions_count = pd.Series(
+            rollups.distribution(rollups.window("emotion_logs"), "emotion"), dtype=int
+        ).sort_values(ascending=False, kind="stable")
         
         # 最も多い感情
         if not emotions_count.empty:
@@ -385,22 +325,9 @@ def show_behavior_emotion_analysis():
             )
             st.plotly_chart(fig_emotion, use_container_width=True)
         
-        # 感情の種類を正・中立・負に分類
-        if 'emotion_type' in emotion_logs.columns:
-            # 既存の感情タイプ列を使用
-            emotion_types = emotion_logs['emotion_type'].value_counts()
-        else:
-            # 感情タイプを定義
-            positive_emotions = ["喜び", "楽しさ", "満足", "安心", "希望", "感謝", "興味", "誇り"]
-            negative_emotions = ["悲しみ", "不安", "怒り", "恐れ", "疲労", "退屈", "混乱", "罪悪感"]
-            
-            # 感情タイプを追加
-            emotion_logs['emotion_type'] = emotion_logs['emotion'].apply(
-                lambda x: "positive" if x in positive_emotions else 
-                ("negative" if x in negative_emotions else "neutral")
-            )
-            
-            emotion_types = emotion_logs['emotion_type'].value_counts()
+        # 感情の種類を正・中立・負に分類した日ごとの件数を合計する
+        emotion_types = features[["positive", "neutral", "negative"]].sum()
+        emotion_types = emotion_types[emotion_types > 0]
         
         if not emotion_types.empty:
             # 感情タイプの円グラフ
@@ -451,13 +378,12 @@ def show_behavior_emotion_analysis():
             st.markdown(emotional_balance, unsafe_allow_html=True)
         
         # 時系列での感情変化
-        if 'date' in emotion_logs.columns:
-            # 日付を変換
-            emotion_logs['date'] = pd.to_datetime(emotion_logs['date'])
-            
-            # 時系列でグループ化
-            emotion_by_date = emotion_logs.groupby(['date', 'emotion_type']).size().reset_index()
-            emotion_by_date.columns = ['date', 'emotion_type', 'count']
+        if not features.empty:
+            # 日ごとの感情タイプ別の件数を縦持ちにする（記録のない組み合わせは除く）
+            emotion_by_date = features[["positive", "neutral", "negative"]].reset_index().melt(
+                id_vars="date", var_name="emotion_type", value_name="count"
+            )
+            emotion_by_date = emotion_by_date[emotion_by_date["count"] > 0]
             
             # 時系列グラフ
             fig_timeline = px.line(
@@ -481,200 +407,155 @@ def show_behavior_emotion_analysis():
     st.markdown("### 行動と成長の関連分析")
     
     # 習慣と気分の関連
-    if not habit_records.empty and not emotion_logs.empty:
-        # 日付ごとのデータ準備
-        if 'date' in habit_records.columns and 'date' in emotion_logs.columns:
-            # 日付を揃える
-            habit_records['date'] = pd.to_datetime(habit_records['date']).dt.date
-            emotion_logs['date'] = pd.to_datetime(emotion_logs['date']).dt.date
+    if totals["habit_records"] and totals["emotions"]:
+        # 両方のデータがある日を抽出
+        common_days = features[(features["habit_records"] > 0) & (features["emotions"] > 0)]
+        
+        if not common_days.empty:
+            # 習慣を達成した日と達成しなかった日の感情を比較
+            achieved = features["habits_achieved"] > 0
+            completed_days = features[achieved]
+            not_completed_days = features[~achieved]
             
-            # 両方のデータがある日を抽出
-            common_dates = set(habit_records['date']) & set(emotion_logs['date'])
+            # ポジティブ感情の割合比較（その日々の感情の記録に占めるポジティブな感情の割合）
+            def positive_share(days):
+                emotions = days["emotions"].sum()
+                return days["positive"].sum() / emotions * 100 if emotions else 0
             
-            if common_dates:
-                # 習慣達成日と感情の関連を分析
-                habit_completion = habit_records[habit_records['status'] == 'completed']
-                habit_completion_dates = set(habit_completion['date'])
-                
-                # 習慣達成日と未達成日の感情を比較
-                completed_emotion_logs = emotion_logs[emotion_logs['date'].isin(habit_completion_dates)]
-                not_completed_emotion_logs = emotion_logs[~emotion_logs['date'].isin(habit_completion_dates)]
-                
-                # 感情タイプの比較
-                if 'emotion_type' in completed_emotion_logs.columns and 'emotion_type' in not_completed_emotion_logs.columns:
-                    completed_emotion_types = completed_emotion_logs['emotion_type'].value_counts(normalize=True) * 100
-                    not_completed_emotion_types = not_completed_emotion_logs['emotion_type'].value_counts(normalize=True) * 100
-                    
-                    # ポジティブ感情の割合比較
-                    completed_positive = completed_emotion_types.get("positive", 0)
-                    not_completed_positive = not_completed_emotion_types.get("positive", 0)
-                    
-                    positive_diff = completed_positive - not_completed_positive
-                    
-                    if abs(positive_diff) > 10:
-                        habit_emotion_insight = f"""
-                        <div class="trend-card">
-                            <h4>習慣達成と気分の関連</h4>
-                            <p>習慣を達成した日は、達成しなかった日に比べて、ポジティブな感情の割合が<strong>{abs(positive_diff):.1f}%{'高い' if positive_diff > 0 else '低い'}</strong>傾向があります。</p>
-                            <p>{'習慣の達成があなたの気分を向上させている可能性があります。継続していきましょう！' if positive_diff > 0 else '習慣の達成とネガティブな感情に関連がある可能性があります。習慣の内容や達成方法を見直してみましょう。'}</p>
-                        </div>
-                        """
-                        st.markdown(habit_emotion_insight, unsafe_allow_html=True)
+            completed_positive = positive_share(completed_days)
+            not_completed_positive = positive_share(not_completed_days)
+            
+            positive_diff = completed_positive - not_completed_positive
+            
+            if abs(positive_diff) > 10:
+                habit_emotion_insight = f"""
+                <div class="trend-card">
+                    <h4>習慣達成と気分の関連</h4>
+                    <p>習慣を達成した日は、達成しなかった日に比べて、ポジティブな感情の割合が<strong>{abs(positive_diff):.1f}%{'高い' if positive_diff > 0 else '低い'}</strong>傾向があります。</p>
+                    <p>{'習慣の達成があなたの気分を向上させている可能性があります。継続していきましょう！' if positive_diff > 0 else '習慣の達成とネガティブな感情に関連がある可能性があります。習慣の内容や達成方法を見直してみましょう。'}</p>
+                </div>
+                """
+                st.markdown(habit_emotion_insight, unsafe_allow_html=True)
     
     # 活動と成長の関連分析
-    activity_data_exists = (not growth_data.empty and not activity_log.empty)
-    
-    if activity_data_exists:
-        # 日付データの準備
-        if 'date' in growth_data.columns and 'date' in activity_log.columns:
-            # 日付を揃える
-            growth_data['date'] = pd.to_datetime(growth_data['date']).dt.date
-            activity_log['date'] = pd.to_datetime(activity_log['date']).dt.date
+    if totals["growth_records"] and totals["activities"]:
+        # 成長カテゴリと活動タイプが同じ日に記録された日数（日のバケットから数える）
+        growth_by_day = rollups.buckets("growth_data", "day")
+        activity_by_day = rollups.buckets("activity_log", "day")
+        common_day_counts = Counter()
+        for day in growth_by_day.keys() & activity_by_day.keys():
+            for category in rollups.distribution(growth_by_day[day], "category"):
+                for activity in rollups.distribution(activity_by_day[day], "activity_type"):
+                    common_day_counts[(category, activity)] += 1
+        
+        category_activity_data = [
+            {'category': category, 'activity': activity, 'common_days': common_days}
+            for (category, activity), common_days in common_day_counts.items()
+        ]
+        
+        if category_activity_data:
+            category_activity_df = pd.DataFrame(category_activity_data)
             
-            # 活動タイプと成長カテゴリの分析
-            if 'category' in growth_data.columns and 'activity_type' in activity_log.columns:
-                # 成長カテゴリ別の活動タイプ
-                growth_categories = growth_data['category'].unique()
-                activity_types = activity_log['activity_type'].unique()
-                
-                category_activity_data = []
-                
-                for category in growth_categories:
-                    category_dates = set(growth_data[growth_data['category'] == category]['date'])
-                    
-                    for activity in activity_types:
-                        activity_dates = set(activity_log[activity_log['activity_type'] == activity]['date'])
-                        
-                        # 共通の日付
-                        common_days = len(category_dates & activity_dates)
-                        
-                        if common_days > 0:
-                            category_activity_data.append({
-                                'category': category,
-                                'activity': activity,
-                                'common_days': common_days
-                            })
-                
-                if category_activity_data:
-                    category_activity_df = pd.DataFrame(category_activity_data)
-                    
-                    # トップの組み合わせを抽出
-                    top_combination = category_activity_df.sort_values('common_days', ascending=False).iloc[0]
-                    
-                    st.markdown(f"""
-                    <div class="trend-card">
-                        <h4>活動と成長の関連</h4>
-                        <p>あなたは「<strong>{top_combination['activity']}</strong>」という活動を行った日に、「<strong>{top_combination['category']}</strong>」カテゴリーでの成長を記録する傾向があります。</p>
-                        <p>この組み合わせは{top_combination['common_days']}日間で見られました。この関連性を活かして、意識的に成長を促進できるかもしれません。</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # 関連をヒートマップで表示
-                    pivot_df = category_activity_df.pivot(index='category', columns='activity', values='common_days').fillna(0)
-                    
-                    fig_heatmap = px.imshow(
-                        pivot_df,
-                        labels=dict(x="活動タイプ", y="成長カテゴリ", color="共通日数"),
-                        title="活動タイプと成長カテゴリの関連性",
-                        color_continuous_scale="Viridis"
-                    )
-                    st.plotly_chart(fig_heatmap, use_container_width=True)
+            # トップの組み合わせを抽出
+            top_combination = category_activity_df.sort_values('common_days', ascending=False).iloc[0]
+            
+            st.markdown(f"""
+            <div class="trend-card">
+                <h4>活動と成長の関連</h4>
+                <p>あなたは「<strong>{top_combination['activity']}</strong>」という活動を行った日に、「<strong>{top_combination['category']}</strong>」カテゴリーでの成長を記録する傾向があります。</p>
+                <p>この組み合わせは{top_combination['common_days']}日間で見られました。この関連性を活かして、意識的に成長を促進できるかもしれません。</p>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # 関連をヒートマップで表示
+            pivot_df = category_activity_df.pivot(index='category', columns='activity', values='common_days').fillna(0)
+            
+            fig_heatmap = px.imshow(
+                pivot_df,
+                labels=dict(x="活動タイプ", y="成長カテゴリ", color="共通日数"),
+                title="活動タイプと成長カテゴリの関連性",
+                color_continuous_scale="Viridis"
+            )
+            st.plotly_chart(fig_heatmap, use_container_width=True)
     
     # 成長を感じた出来事のランキング
     st.markdown("### 成長を感じた出来事ランキング")
     
-    if not small_wins.empty:
+    if totals["wins"]:
         # 小さな成功体験を分析
-        if 'description' in small_wins.columns and 'date' in small_wins.columns:
-            # 日付を揃える
-            small_wins['date'] = pd.to_datetime(small_wins['date'])
-            
-            # 直近1ヶ月のデータを抽出
-            one_month_ago = datetime.now() - timedelta(days=30)
-            recent_wins = small_wins[small_wins['date'] >= one_month_ago]
-            
-            if not recent_wins.empty:
-                # 感情分析（もし感情データがあれば）
-                if 'feeling' in recent_wins.columns:
-                    feeling_counts = recent_wins['feeling'].value_counts()
-                    top_feelings = feeling_counts.head(3)
-                    
-                    st.markdown("#### この1ヶ月で最も感じた達成感情")
-                    
-                    feeling_cols = st.columns(min(3, len(top_feelings)))
-                    
-                    for i, (feeling, count) in enumerate(top_feelings.items()):
-                        with feeling_cols[i % 3]:
-                            st.markdown(f"""
-                            <div class="stat-card">
-                                <p>{feeling}</p>
-                                <p class="stat-value">{count}</p>
-                                <p>回</p>
-                            </div>
-                            """, unsafe_allow_html=True)
-
-            # 成長を感じた出来事のテキスト分析
-                win_texts = recent_wins['description'].tolist()
+        # 直近1ヶ月のデータだけを読み込む
+        one_month_ago = datetime.now() - timedelta(days=30)
+        recent_wins = storage.table("small_wins").query(start=(one_month_ago + timedelta(days=1)).strftime("%Y-%m-%d"))
+        recent_wins['date'] = pd.to_datetime(recent_wins['date'])
+        
+        if not recent_wins.empty:
+            # 感情分析（もし感情データがあれば）
+            if 'feeling' in recent_wins.columns:
+                feeling_counts = recent_wins['feeling'].value_counts()
+                top_feelings = feeling_counts.head(3)
                 
-                # 簡易的な単語頻度分析
-                all_text = " ".join(win_texts)
+                st.markdown("#### この1ヶ月で最も感じた達成感情")
                 
-                # 形態素解析（簡易的な方法）
-                try:
-                    words = word_tokenize(all_text)
-                    stop_words = set(stopwords.words('english'))
-                    
-                    # ストップワードの除去
-                    words = [word.lower() for word in words if word.isalpha() and word.lower() not in stop_words]
-                    
-                    # 単語の頻度をカウント
-                    word_freq = Counter(words)
+                feeling_cols = st.columns(min(3, len(top_feelings)))
+                
+                for i, (feeling, count) in enumerate(top_feelings.items()):
+                    with feeling_cols[i % 3]:
+                        st.markdown(f"""
+                        <div class="stat-card">
+                            <p>{feeling}</p>
+                            <p class="stat-value">{count}</p>
+                            <p>回</p>
+                        </div>
+                        """, unsafe_allow_html=True)
+
+        # 成長を感じた出来事のテキスト分析
+            # 単語の頻度分析（保存時に更新している単語の索引から直近1ヶ月分を取り出す）
+            try:
+                # 上位の単語を表示
+                top_words = keyword_index.top_keywords("small_wins", "description", start=one_month_ago, top_n=10)
+                
+                if top_words:
+                    st.markdown("#### 成長の記録によく出てくるキーワード")
                     
-                    # 上位の単語を表示
-                    top_words = word_freq.most_common(10)
+                    st.markdown('<div class="tag-cloud">', unsafe_allow_html=True)
                     
-                    if top_words:
-                        st.markdown("#### 成長の記録によく出てくるキーワード")
+                    for word, count in top_words:
+                        # フォントサイズを頻度に応じて変更
+                        font_size = 14 + min(count * 2, 24)
                         
-                        st.markdown('<div class="tag-cloud">', unsafe_allow_html=True)
-                        
-                        for word, count in top_words:
-                            # フォントサイズを頻度に応じて変更
-                            font_size = 14 + min(count * 2, 24)
-                            
-                            st.markdown(f"""
-                            <span class="tag-item" style="font-size: {font_size}px">{word} ({count})</span>
-                            """, unsafe_allow_html=True)
-                        
-                        st.markdown('</div>', unsafe_allow_html=True)
-                        
-                        # キーワード分析の解釈
                         st.markdown(f"""
-                        <div class="insight-card">
-                            <h4>キーワード分析</h4>
-                            <p>あなたの成長記録からは、「<strong>{top_words[0][0]}</strong>」というキーワードが最も多く登場しています。これはあなたの成長や成功において重要な要素であることを示唆しています。</p>
-                            <p>記録を続けることで、あなたの成長パターンやキーワードの変化を追跡できます。</p>
-                        </div>
+                        <span class="tag-item" style="font-size: {font_size}px">{word} ({count})</span>
                         """, unsafe_allow_html=True)
-                except Exception as e:
-                    st.warning(f"テキスト分析中にエラーが発生しました: {e}")
-                
-                # 成長を感じた出来事のランキング
-                st.markdown("#### この1ヶ月で最も成長を感じた出来事")
-                
-                # 日付順にソートして表示
-                sorted_wins = recent_wins.sort_values('date', ascending=False)
-                
-                for i, (_, win) in enumerate(sorted_wins.head(3).iterrows()):
+                    
+                    st.markdown('</div>', unsafe_allow_html=True)
+                    
+                    # キーワード分析の解釈
                     st.markdown(f"""
                     <div class="insight-card">
-                        <h4>#{i+1}: {win['date'].strftime('%Y/%m/%d')}</h4>
-                        <p>{win['description']}</p>
-                        <p><em>感情: {win.get('feeling', '記録なし')}</em></p>
+                        <h4>キーワード分析</h4>
+                        <p>あなたの成長記録からは、「<strong>{top_words[0][0]}</strong>」というキーワードが最も多く登場しています。これはあなたの成長や成功において重要な要素であることを示唆しています。</p>
+                        <p>記録を続けることで、あなたの成長パターンやキーワードの変化を追跡できます。</p>
                     </div>
                     """, unsafe_allow_html=True)
-            else:
-                st.info("最近の成長記録がありません。「小さな成功の記録」機能を使って記録を増やしましょう！")
+            except Exception as e:
+                st.warning(f"テキスト分析中にエラーが発生しました: {e}")
+            
+            # 成長を感じた出来事のランキング
+            st.markdown("#### この1ヶ月で最も成長を感じた出来事")
+            
+            # 日付順にソートして表示
+            sorted_wins = recent_wins.sort_values('date', ascending=False)
+            
+            for i, (_, win) in enumerate(sorted_wins.head(3).iterrows()):
+                st.markdown(f"""
+                <div class="insight-card">
+                    <h4>#{i+1}: {win['date'].strftime('%Y/%m/%d')}</h4>
+                    <p>{win['description']}</p>
+                    <p><em>感情: {win.get('feeling', '記録なし')}</em></p>
+                </div>
+                """, unsafe_allow_html=True)
+        else:
+            st.info("最近の成長記録がありません。「小さな成功の記録」機能を使って記録を増やしましょう！")
     else:
         st.info("成長記録のデータがまだありません。「小さな成功の記録」機能を使って記録を増やしましょう！")
     
@@ -682,67 +563,57 @@ def show_behavior_emotion_analysis():
     st.markdown("### AIによる行動傾向の分析")
     
     # 活動ログと感情ログのデータがある場合
-    data_available = not activity_log.empty and not emotion_logs.empty
+    data_available = totals["activities"] and totals["emotions"]
     
     if data_available:
         # モチベーションが高かった日の分析
-        if 'date' in activity_log.columns and 'date' in emotion_logs.columns and 'emotion_type' in emotion_logs.columns:
-            # 日付を揃える
-            activity_log['date'] = pd.to_datetime(activity_log['date']).dt.date
-            emotion_logs['date'] = pd.to_datetime(emotion_logs['date']).dt.date
-            
-            # ポジティブ感情が記録された日
-            positive_days = set(emotion_logs[emotion_logs['emotion_type'] == 'positive']['date'])
+        # ポジティブ感情が記録された日
+        positive_days = features.index[features["positive"] > 0].strftime("%Y-%m-%d")
+        
+        # ポジティブな日の活動タイプをカウント（その日々のバケットを足し合わせる）
+        activity_counts = pd.Series(
+            rollups.distribution(rollups.days("activity_log", positive_days), "activity_type"), dtype=int
+        ).sort_values(ascending=False, kind="stable")
+        
+        if not activity_counts.empty:
+            top_activity = activity_counts.index[0]
             
-            # ポジティブな日の活動タイプをカウント
-            positive_day_activities = activity_log[activity_log['date'].isin(positive_days)]
+            st.markdown(f"""
+            <div class="insight-card">
+                <h4>モチベーション向上の活動傾向</h4>
+                <p>あなたがポジティブな感情を記録した日には、「<strong>{top_activity}</strong>」という活動を行う傾向があります。</p>
+                <p>モチベーションを高めたいときは、この活動を意識的に取り入れることを検討してみましょう。</p>
+            </div>
+            """, unsafe_allow_html=True)
             
-            if not positive_day_activities.empty and 'activity_type' in positive_day_activities.columns:
-                activity_counts = positive_day_activities['activity_type'].value_counts()
-                
-                if not activity_counts.empty:
-                    top_activity = activity_counts.index[0]
-                    
-                    st.markdown(f"""
-                    <div class="insight-card">
-                        <h4>モチベーション向上の活動傾向</h4>
-                        <p>あなたがポジティブな感情を記録した日には、「<strong>{top_activity}</strong>」という活動を行う傾向があります。</p>
-                        <p>モチベーションを高めたいときは、この活動を意識的に取り入れることを検討してみましょう。</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # 活動頻度のグラフ
-                    fig_activities = px.bar(
-                        activity_counts.reset_index(),
-                        x='index',
-                        y=activity_counts.values,
-                        title="ポジティブな日に行った活動",
-                        labels={'index': '活動タイプ', 'y': '回数'}
-                    )
-                    st.plotly_chart(fig_activities, use_container_width=True)
+            # 活動頻度のグラフ
+            fig_activities = px.bar(
+                activity_counts.reset_index(),
+                x='index',
+                y=activity_counts.values,
+                title="ポジティブな日に行った活動",
+                labels={'index': '活動タイプ', 'y': '回数'}
+            )
+            st.plotly_chart(fig_activities, use_container_width=True)
         
         # 成長しやすい行動パターンの分析
-        if not growth_data.empty and 'date' in growth_data.columns:
-            # 日付の整形
-            growth_data['date'] = pd.to_datetime(growth_data['date']).dt.date
-            
+        if totals["growth_records"]:
             # 成長記録がある日の活動を分析
-            growth_days = set(growth_data['date'])
-            growth_day_activities = activity_log[activity_log['date'].isin(growth_days)]
+            growth_days = features.index[features["growth_records"] > 0].strftime("%Y-%m-%d")
+            growth_activity_counts = pd.Series(
+                rollups.distribution(rollups.days("activity_log", growth_days), "activity_type"), dtype=int
+            ).sort_values(ascending=False, kind="stable")
             
-            if not growth_day_activities.empty and 'activity_type' in growth_day_activities.columns:
-                growth_activity_counts = growth_day_activities['activity_type'].value_counts()
+            if not growth_activity_counts.empty:
+                top_growth_activity = growth_activity_counts.index[0]
                 
-                if not growth_activity_counts.empty:
-                    top_growth_activity = growth_activity_counts.index[0]
-                    
-                    st.markdown(f"""
-                    <div class="trend-card">
-                        <h4>成長につながる行動パターン</h4>
-                        <p>あなたが成長を記録した日には、「<strong>{top_growth_activity}</strong>」という活動を行う傾向があります。</p>
-                        <p>この行動は、あなたの成長を促進している可能性があります。意識的に取り入れることで、さらなる成長が期待できるでしょう。</p>
-                    </div>
-                    """, unsafe_allow_html=True)
+                st.markdown(f"""
+                <div class="trend-card">
+                    <h4>成長につながる行動パターン</h4>
+                    <p>あなたが成長を記録した日には、「<strong>{top_growth_activity}</strong>」という活動を行う傾向があります。</p>
+                    <p>この行動は、あなたの成長を促進している可能性があります。意識的に取り入れることで、さらなる成長が期待できるでしょう。</p>
+                </div>
+                """, unsafe_allow_html=True)
     else:
         st.info("行動と感情の関連分析には、さらに多くのデータが必要です。「感情ログ」や「活動ログ」を記録していきましょう！")                
 
@@ -750,12 +621,12 @@ def show_behavior_emotion_analysis():
 def show_strength_weakness_analysis():
     st.markdown('<h2 class="sub-header">💪 強み・弱み分析</h2>', unsafe_allow_html=True)
     
-    # データを読み込む
-    growth_data = load_growth_data()
-    emotion_logs = load_emotion_logs()
-    goals = load_goals()
-    habit_records = load_habit_records()
-    small_wins = load_small_wins()
+    # データを読み込む（有無の確認だけなので日付列だけ）
+    growth_data = load_growth_data(columns=["date"])
+    emotion_logs = load_emotion_logs(columns=["date"])
+    goals = load_goals(columns=["created_at"])
+    habit_records = load_habit_records(columns=["date"])
+    small_wins = load_small_wins(columns=["date"])
     strength_weakness = load_strength_weakness()
     
     # データがない場合の処理
@@ -1549,7 +1420,7 @@ def show_self_esteem_tracker():
                 
                 self_esteem_log = pd.concat([self_esteem_log, pd.DataFrame([new_record])], ignore_index=True)
             
-            save_self_esteem_log(self_esteem_log)
+            storage.table("self_esteem_log").upsert(new_record)
             
             st.success("自己肯定感を記録しました！")
             
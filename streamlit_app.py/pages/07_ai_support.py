@@ -1,18 +1,21 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
 import json
 import os
 import random
 import uuid
 import re
+import storage
+import daily_features
+import pagination
+import reports
 from collections import Counter
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
+import lazy_imports
+
+# 重いライブラリは使うときに読み込む
+go = lazy_imports.lazy_import("plotly.graph_objects")
 
 # ページの設定
 st.set_page_config(
@@ -250,16 +253,13 @@ AI_CHAT_HISTORY_FILE = "ai_chat_history.json"
 # データファイルの初期化
 def initialize_ai_support_files():
     if not os.path.exists(AI_DAILY_LOGS_FILE):
-        with open(AI_DAILY_LOGS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(AI_DAILY_LOGS_FILE, [])
     
     if not os.path.exists(AI_WEEKLY_REPORTS_FILE):
-        with open(AI_WEEKLY_REPORTS_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(AI_WEEKLY_REPORTS_FILE, [])
     
     if not os.path.exists(AI_INSIGHTS_FILE):
-        with open(AI_INSIGHTS_FILE, "w") as f:
-            json.dump({"goal_insights": [], "emotion_insights": [], "habit_insights": [], "productivity_insights": []}, f)
+        storage.save_document(AI_INSIGHTS_FILE, {"goal_insights": [], "emotion_insights": [], "habit_insights": [], "productivity_insights": []})
     
     if not os.path.exists(AI_USER_PROFILE_FILE):
         default_profile = {
@@ -279,160 +279,99 @@ def initialize_ai_support_files():
             "improvement_areas": [],
             "last_updated": datetime.now().strftime("%Y-%m-%d")
         }
-        with open(AI_USER_PROFILE_FILE, "w") as f:
-            json.dump(default_profile, f)
+        storage.save_document(AI_USER_PROFILE_FILE, default_profile)
     
     if not os.path.exists(AI_CHAT_HISTORY_FILE):
-        with open(AI_CHAT_HISTORY_FILE, "w") as f:
-            json.dump([], f)
+        storage.save_document(AI_CHAT_HISTORY_FILE, [])
 
 # 初期化を実行
 initialize_ai_support_files()
 
+# 週間レポートのバックグラウンド生成を開始
+reports.start()
+
 # セッション状態の初期化
 if 'customize_strategy' not in st.session_state:
     st.session_state.customize_strategy = False
 
 # データ読み込み関数
-def load_emotion_logs():
-    try:
-        with open(EMOTION_LOGS_FILE, "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_emotion_logs(columns=None):
+    return storage.table("emotion_logs").load(columns=columns)
 
-def load_growth_data():
-    try:
-        with open(GROWTH_DATA_FILE, "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_growth_data(columns=None):
+    return storage.table("growth_data").load(columns=columns)
 
 def load_goals():
-    try:
-        with open(GOALS_FILE, "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+    return storage.table("goals").load()
 
 def load_tasks():
-    try:
-        with open(TASK_FILE, "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+    return storage.table("tasks").load()
 
-def load_habit_records():
-    try:
-        with open(HABIT_RECORDS_FILE, "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_habit_records(columns=None):
+    return storage.table("habit_records").load(columns=columns)
 
-def load_small_wins():
-    try:
-        with open(SMALL_WINS_FILE, "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_small_wins(typed=False, columns=None):
+    return storage.table("small_wins").load(typed=typed, columns=columns)
 
-def load_activity_log():
-    try:
-        with open(ACTIVITY_LOG_FILE, "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_activity_log(columns=None):
+    return storage.table("activity_log").load(columns=columns)
 
 def load_self_esteem_log():
-    try:
-        with open(SELF_ESTEEM_LOG_FILE, "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+    return storage.table("self_esteem_log").load()
 
-def load_ai_daily_logs():
-    try:
-        with open(AI_DAILY_LOGS_FILE, "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+def load_ai_daily_logs(typed=False):
+    return storage.table("ai_daily_logs").load(typed=typed)
 
 def load_ai_weekly_reports():
-    try:
-        with open(AI_WEEKLY_REPORTS_FILE, "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+    return storage.table("ai_weekly_reports").load()
 
 def load_ai_insights():
-    try:
-        with open(AI_INSIGHTS_FILE, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {"goal_insights": [], "emotion_insights": [], "habit_insights": [], "productivity_insights": []}
+    data = storage.load_document(AI_INSIGHTS_FILE)
+    if data is not None:
+        return data
+    return {"goal_insights": [], "emotion_insights": [], "habit_insights": [], "productivity_insights": []}
 
 def load_user_profile():
-    try:
-        with open(AI_USER_PROFILE_FILE, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        # デフォルトプロファイルを返す
-        return {
-            "goal_pattern": "unknown",
-            "motivation_triggers": [],
-            "demotivation_triggers": [],
-            "productive_time": "unknown",
-            "learning_style": "unknown",
-            "personality_traits": {
-                "conscientiousness": 50,
-                "resilience": 50,
-                "openness": 50,
-                "social_orientation": 50,
-                "planning_preference": 50
-            },
-            "strength_areas": [],
-            "improvement_areas": [],
-            "last_updated": datetime.now().strftime("%Y-%m-%d")
-        }
+    data = storage.load_document(AI_USER_PROFILE_FILE)
+    if data is not None:
+        return data
+    # デフォルトプロファイルを返す
+    return {
+        "goal_pattern": "unknown",
+        "motivation_triggers": [],
+        "demotivation_triggers": [],
+        "productive_time": "unknown",
+        "learning_style": "unknown",
+        "personality_traits": {
+            "conscientiousness": 50,
+            "resilience": 50,
+            "openness": 50,
+            "social_orientation": 50,
+            "planning_preference": 50
+        },
+        "strength_areas": [],
+        "improvement_areas": [],
+        "last_updated": datetime.now().strftime("%Y-%m-%d")
+    }
 
 def load_chat_history():
-    try:
-        with open(AI_CHAT_HISTORY_FILE, "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data) if data else pd.DataFrame()
-    except (FileNotFoundError, json.JSONDecodeError):
-        return pd.DataFrame()
+    return storage.table("ai_chat_history").load()
 
 # データ保存関数
 def save_ai_daily_logs(df):
-    with open(AI_DAILY_LOGS_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("ai_daily_logs").save(df)
 
 def save_ai_weekly_reports(df):
-    with open(AI_WEEKLY_REPORTS_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("ai_weekly_reports").save(df)
 
 def save_ai_insights(insights_data):
-    with open(AI_INSIGHTS_FILE, "w") as f:
-        json.dump(insights_data, f)
+    storage.save_document(AI_INSIGHTS_FILE, insights_data)
 
 def save_user_profile(profile_data):
-    with open(AI_USER_PROFILE_FILE, "w") as f:
-        json.dump(profile_data, f)
+    storage.save_document(AI_USER_PROFILE_FILE, profile_data)
 
 def save_chat_history(df):
-    with open(AI_CHAT_HISTORY_FILE, "w") as f:
-        json.dump(df.to_dict("records"), f)
+    storage.table("ai_chat_history").save(df)
 
 # マルチページアプリのタイトル
 st.markdown('<h1 class="main-header">🤖 AIサポート</h1>', unsafe_allow_html=True)
@@ -453,14 +392,17 @@ def show_ai_chat_support():
     また、あなたのこれまでの活動データを分析した上で、パーソナライズされたアドバイスも提供します。
     """)
     
-    # チャット履歴の読み込み
-    chat_history = load_chat_history()
+    # チャット履歴の表示（新しいものから1ページ分だけ読み込み、ページ内は古い順に並べる）
+    chat_page = pagination.paginate(
+        "chat_history_page",
+        pagination.table_fetcher(storage.table("ai_chat_history"), descending=True),
+        labels=("← 新しいメッセージ", "以前のメッセージ →")
+    )
     
-    # チャット履歴の表示
-    if not chat_history.empty and 'message' in chat_history.columns and 'sender' in chat_history.columns:
+    if chat_page:
         st.markdown('<div class="chat-container">', unsafe_allow_html=True)
         
-        for _, chat in chat_history.iterrows():
+        for _, chat in reversed(chat_page):
             if chat['sender'] == 'user':
                 st.markdown(f"""
                 <div class="chat-bubble user-bubble">
@@ -492,11 +434,6 @@ def show_ai_chat_support():
                 "message": user_message
             }
             
-            if chat_history.empty:
-                chat_history = pd.DataFrame([new_user_message])
-            else:
-                chat_history = pd.concat([chat_history, pd.DataFrame([new_user_message])], ignore_index=True)
-            
             # AIの応答を生成
             ai_response = generate_ai_response(user_message)
             
@@ -507,10 +444,8 @@ def show_ai_chat_support():
                 "message": ai_response
             }
             
-            chat_history = pd.concat([chat_history, pd.DataFrame([new_ai_message])], ignore_index=True)
-            
             # チャット履歴を保存
-            save_chat_history(chat_history)
+            storage.table("ai_chat_history").extend([new_user_message, new_ai_message])
             
             # 画面を更新して新しいメッセージを表示
             st.rerun()
@@ -529,11 +464,6 @@ def show_ai_chat_support():
                 "message": "モチベーションが下がっています。どうすれば良いですか？"
             }
             
-            if chat_history.empty:
-                chat_history = pd.DataFrame([new_user_message])
-            else:
-                chat_history = pd.concat([chat_history, pd.DataFrame([new_user_message])], ignore_index=True)
-            
             # AIの応答を生成
             ai_response = generate_motivation_boost()
             
@@ -544,10 +474,8 @@ def show_ai_chat_support():
                 "message": ai_response
             }
             
-            chat_history = pd.concat([chat_history, pd.DataFrame([new_ai_message])], ignore_index=True)
-            
             # チャット履歴を保存
-            save_chat_history(chat_history)
+            storage.table("ai_chat_history").extend([new_user_message, new_ai_message])
             
             # 画面を更新して新しいメッセージを表示
             st.experimental_rerun()
@@ -561,11 +489,6 @@ def show_ai_chat_support():
                 "message": "目標達成のアドバイスが欲しいです。"
             }
             
-            if chat_history.empty:
-                chat_history = pd.DataFrame([new_user_message])
-            else:
-                chat_history = pd.concat([chat_history, pd.DataFrame([new_user_message])], ignore_index=True)
-            
             # AIの応答を生成
             ai_response = generate_goal_advice()
             
@@ -576,10 +499,8 @@ def show_ai_chat_support():
                 "message": ai_response
             }
             
-            chat_history = pd.concat([chat_history, pd.DataFrame([new_ai_message])], ignore_index=True)
-            
             # チャット履歴を保存
-            save_chat_history(chat_history)
+            storage.table("ai_chat_history").extend([new_user_message, new_ai_message])
             
             # 画面を更新して新しいメッセージを表示
             st.experimental_rerun()
@@ -593,11 +514,6 @@ def show_ai_chat_support():
                 "message": "私の強みは何ですか？"
             }
             
-            if chat_history.empty:
-                chat_history = pd.DataFrame([new_user_message])
-            else:
-                chat_history = pd.concat([chat_history, pd.DataFrame([new_user_message])], ignore_index=True)
-            
             # AIの応答を生成
             ai_response = generate_strength_analysis()
             
@@ -608,10 +524,8 @@ def show_ai_chat_support():
                 "message": ai_response
             }
             
-            chat_history = pd.concat([chat_history, pd.DataFrame([new_ai_message])], ignore_index=True)
-            
             # チャット履歴を保存
-            save_chat_history(chat_history)
+            storage.table("ai_chat_history").extend([new_user_message, new_ai_message])
             
             # 画面を更新して新しいメッセージを表示
             st.experimental_rerun()
@@ -680,8 +594,7 @@ def show_daily_checkin():
         # 記録を更新するオプション
         if st.button("記録を更新する"):
             # 既存の記録を削除
-            daily_logs = daily_logs[daily_logs['date'] != today_str]
-            save_ai_daily_logs(daily_logs)
+            storage.table("ai_daily_logs").delete(today_str)
             st.experimental_rerun()
     else:
         # 新しい記録を作成
@@ -714,7 +627,7 @@ def show_daily_checkin():
                 else:
                     daily_logs = pd.concat([daily_logs, pd.DataFrame([new_log])], ignore_index=True)
                 
-                save_ai_daily_logs(daily_logs)
+                storage.table("ai_daily_logs").append(new_log)
                 
                 # ユーザープロファイルの更新
                 update_user_profile_from_daily_log(mood, progress, insights, challenges)
@@ -1268,34 +1181,23 @@ def show_weekly_report():
         
         # レポートの更新ボタン
         if st.button("レポートを更新する"):
-            # レポートを再生成
-            new_report = generate_weekly_report(start_of_week, end_of_week)
-            
-            # 既存のレポートを置き換え
-            weekly_reports.loc[weekly_reports['week_range'] == week_range] = new_report
-            
-            save_ai_weekly_reports(weekly_reports)
+            # バックグラウンドで再生成して保存するのを待つ
+            with st.spinner("週間レポートを更新しています..."):
+                reports.request_weekly(start_of_week).result()
             
             st.success("週間レポートを更新しました！")
             st.experimental_rerun()
     else:
         # 新しいレポートを生成
+        # 今週のレポートはバックグラウンドで作成しているので、まだなければ待つこともできる
         if st.button("今週のレポートを生成"):
-            # レポートを生成
-            new_report = generate_weekly_report(start_of_week, end_of_week)
-            
-            # レポートを保存
-            if weekly_reports.empty:
-                weekly_reports = pd.DataFrame([new_report])
-            else:
-                weekly_reports = pd.concat([weekly_reports, pd.DataFrame([new_report])], ignore_index=True)
-            
-            save_ai_weekly_reports(weekly_reports)
+            with st.spinner("週間レポートを生成しています..."):
+                reports.request_weekly(start_of_week).result()
             
             st.success("週間レポートを生成しました！")
             st.experimental_rerun()
         else:
-            st.info("「今週のレポートを生成」ボタンをクリックして、今週のレポートを作成しましょう。")
+            st.info("今週のレポートはバックグラウンドで作成しています。すぐに見たい場合は「今週のレポートを生成」ボタンをクリックしてください。")
     
     # 過去のレポート
     if not weekly_reports.empty and len(weekly_reports) > 1:
@@ -2078,105 +1980,6 @@ def generate_daily_feedback(mood, progress, insights, challenges):
     
     return feedback
 
-def generate_weekly_report(start_of_week, end_of_week):
-    """週間レポートを生成する"""
-    # 日付範囲の文字列
-    week_range = f"{start_of_week.strftime('%Y-%m-%d')}_{end_of_week.strftime('%Y-%m-%d')}"
-    
-    # 一週間のデータを集計
-    daily_logs = load_ai_daily_logs()
-    
-    # 日付を変換
-    if not daily_logs.empty and 'date' in daily_logs.columns:
-        daily_logs['date'] = pd.to_datetime(daily_logs['date']).dt.date
-    
-    # 指定した週のデータをフィルタリング
-    week_logs = daily_logs[(daily_logs['date'] >= start_of_week) & (daily_logs['date'] <= end_of_week)] if not daily_logs.empty else pd.DataFrame()
-    
-    # 日々のデータを収集
-    daily_data = []
-    if not week_logs.empty:
-        for _, log in week_logs.iterrows():
-            daily_data.append({
-                'date': log['date'].strftime('%Y-%m-%d'),
-                'mood': log['mood'],
-                'progress': log['progress'],
-                'insights': log['insights'],
-                'challenges': log['challenges']
-            })
-    
-    # 達成したことのリスト
-    achievements = []
-    
-    # 週間の小さな成功体験を抽出
-    small_wins = load_small_wins()
-    if not small_wins.empty and 'date' in small_wins.columns:
-        small_wins['date'] = pd.to_datetime(small_wins['date']).dt.date
-        week_wins = small_wins[(small_wins['date'] >= start_of_week) & (small_wins['date'] <= end_of_week)]
-        
-        if not week_wins.empty and 'description' in week_wins.columns:
-            for _, win in week_wins.iterrows():
-                achievements.append(win['description'])
-    
-    # 週間の気づきや学びのリスト
-    insights = []
-    
-    # 日々のログから気づきを抽出
-    if not week_logs.empty and 'insights' in week_logs.columns:
-        for _, log in week_logs.iterrows():
-            if log['insights']:
-                insights.append(log['insights'])
-    
-    # 週間の課題や困難のリスト
-    challenges = []
-    
-    # 日々のログから課題を抽出
-    if not week_logs.empty and 'challenges' in week_logs.columns:
-        for _, log in week_logs.iterrows():
-            if log['challenges']:
-                challenges.append(log['challenges'])
-    
-    # 来週の戦略提案
-    strategies = []
-    
-    # 課題に基づく戦略を生成
-    if challenges:
-        for challenge in challenges[:3]:  # 上位3つの課題に対する戦略
-            if "時間" in challenge.lower():
-                strategies.append("時間管理を改善するために「タイムブロッキング」を試してみる。一日の始めに、重要なタスクのための時間を予め確保しておく。")
-            elif "モチベーション" in challenge.lower() or "やる気" in challenge.lower():
-                strategies.append("モチベーション低下に対しては「5分ルール」を試してみる。まずは5分だけ始める約束をし、多くの場合はそのまま続けられるようになる。")
-            elif "集中" in challenge.lower():
-                strategies.append("集中力向上のためにポモドーロテクニック（25分集中＋5分休憩）を活用し、集中と休息のリズムを作る。")
-            else:
-                strategies.append(f"「{challenge[:20]}...」という課題に対しては、問題を小さく分解し、一つずつ対処する戦略を取る。")
-    
-    # デフォルトの戦略提案
-    if len(strategies) < 3:
-        default_strategies = [
-            "週の始めに「最重要目標」を3つ特定し、それらに焦点を当てる",
-            "毎日、短時間でも目標に向けた行動を取る「習慣の連鎖」を意識する",
-            "週末に振り返りの時間を設け、進捗を確認し、次週の計画を立てる",
-            "「完璧」を目指すのではなく、「継続」を重視する姿勢を持つ",
-            "自分の生産性が高い時間帯を特定し、その時間に最重要タスクに取り組む"
-        ]
-        for strategy in default_strategies:
-            if len(strategies) < 3:
-                strategies.append(strategy)
-    
-    # レポートデータを構築
-    report = {
-        "week_range": week_range,
-        "achievements": achievements[:5],  # 最大5つの達成
-        "insights": insights[:5],  # 最大5つの気づき
-        "challenges": challenges[:5],  # 最大5つの課題
-        "strategies": strategies[:5],  # 最大5つの戦略
-        "daily_data": daily_data,
-        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
-    
-    return report 
-
 def generate_custom_strategy(focus_area, time_available, motivation_level, obstacle):
     """ユーザーの現在の状況に合わせてカスタマイズされた戦略を生成する"""
     
@@ -2404,11 +2207,11 @@ def update_user_profile_from_daily_log(mood, progress, insights, challenges):
     """日々のチェックインデータからユーザープロファイルを更新する"""
     user_profile = load_user_profile()
     
-    # 直近のデータを分析
-    daily_logs = load_ai_daily_logs()
+    # 直近のデータを分析（日ごとの特徴量の表から）
+    features = daily_features.frame()
     
     # 十分なデータがある場合（少なくとも7日分）
-    if not daily_logs.empty and len(daily_logs) >= 7:
+    if features["mood"].notna().sum() >= 7:
         # 目標達成パターンの分析
         # 短期目標の達成率と長期目標の達成率を比較
         goals_df = load_goals()
@@ -2427,7 +2230,7 @@ def update_user_profile_from_daily_log(mood, progress, insights, challenges):
                     user_profile['goal_pattern'] = 'long_term'
         
         # 生産性の高い時間帯の分析
-        activity_log = load_activity_log()
+        activity_log = load_activity_log(columns=["timestamp", "productivity_rating"])
         
         if not activity_log.empty and 'timestamp' in activity_log.columns and 'productivity_rating' in activity_log.columns:
             activity_log['hour'] = pd.to_datetime(activity_log['timestamp']).dt.hour
@@ -2449,7 +2252,7 @@ def update_user_profile_from_daily_log(mood, progress, insights, challenges):
                     user_profile['productive_time'] = 'evening'
         
         # 学習スタイルの分析
-        growth_data = load_growth_data()
+        growth_data = load_growth_data(columns=["learning_method", "effectiveness"])
         
         if not growth_data.empty and 'learning_method' in growth_data.columns and 'effectiveness' in growth_data.columns:
             visual_effectiveness = growth_data[growth_data['learning_method'].str.contains('visual', case=False, na=False)]['effectiveness'].mean()
@@ -2502,7 +2305,7 @@ def update_user_profile_from_daily_log(mood, progress, insights, challenges):
                         user_profile['demotivation_triggers'].pop(0)
     
     # 強みと改善点の更新
-    habit_records = load_habit_records()
+    habit_records = load_habit_records(columns=["habit_name", "completed"])
     tasks = load_tasks()
     
     if not habit_records.empty and 'habit_name' in habit_records.columns and 'completed' in habit_records.columns:
@@ -2534,32 +2337,25 @@ def update_user_profile_from_daily_log(mood, progress, insights, challenges):
         user_profile['improvement_areas'] = list(set(existing_improvements + improvements))[:5]  # 最大5つまで
     
     # パーソナリティ特性の更新
-    emotion_logs = load_emotion_logs()
+    emotion_days = features[features["emotions"] > 0]
     
-    if not emotion_logs.empty and 'emotion' in emotion_logs.columns:
+    if emotion_days["negative"].any():
         # 感情ログから回復力を推定
-        negative_emotions = emotion_logs[emotion_logs['emotion'].isin(['悲しい', '不安', '怒り', 'フラストレーション', '落ち込み'])]
-        
-        if not negative_emotions.empty:
-            # 感情の回復速度の分析
-            negative_emotions['date'] = pd.to_datetime(negative_emotions['date'])
-            negative_emotions = negative_emotions.sort_values('date')
-            
-            recovery_times = []
-            for i in range(len(negative_emotions) - 1):
-                current = negative_emotions.iloc[i]
-                next_log = emotion_logs[emotion_logs['date'] > current['date']].sort_values('date').iloc[0] if not emotion_logs[emotion_logs['date'] > current['date']].empty else None
-                
-                if next_log is not None and next_log['emotion'] in ['幸せ', '満足', '穏やか', '前向き', '希望']:
-                    recovery_time = (pd.to_datetime(next_log['date']) - pd.to_datetime(current['date'])).total_seconds() / 3600  # 時間単位
-                    if recovery_time < 48:  # 2日以内の回復のみカウント
-                        recovery_times.append(recovery_time)
-            
-            if recovery_times:
-                avg_recovery_time = sum(recovery_times) / len(recovery_times)
-                # 回復時間から回復力スコアを計算（短いほど高スコア）
-                resilience_score = max(0, min(100, 100 - (avg_recovery_time / 48) * 100))
-                user_profile['personality_traits']['resilience'] = int(resilience_score)
+        # ネガティブな感情を記録した日の次の記録日にポジティブな感情があれば回復とみなす
+        gaps = (emotion_days.index.to_series().shift(-1) - emotion_days.index.to_series()).dt.total_seconds() / 3600  # 時間単位
+        recovered = (
+            (emotion_days["negative"] > 0)
+            & (emotion_days["positive"].shift(-1) > 0)
+            & (gaps < 48)  # 2日以内の回復のみカウント
+        )
+        # ネガティブな感情の記録 1 件ごとに数える
+        weights = emotion_days["negative"][recovered]
+        
+        if weights.sum() > 0:
+            avg_recovery_time = (gaps[recovered] * weights).sum() / weights.sum()
+            # 回復時間から回復力スコアを計算（短いほど高スコア）
+            resilience_score = max(0, min(100, 100 - (avg_recovery_time / 48) * 100))
+            user_profile['personality_traits']['resilience'] = int(resilience_score)
     
     # 最終更新日を記録
     user_profile['last_updated'] = datetime.now().strftime("%Y-%m-%d")
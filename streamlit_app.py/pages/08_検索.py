@@ -0,0 +1,87 @@
+import streamlit as st
+from datetime import datetime, timedelta, date
+import search
+
+# ページの設定
+st.set_page_config(
+    page_title="検索 - 自己肯定アプリ",
+    page_icon="🔎",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# CSSスタイルの定義
+st.markdown("""
+<style>
+    .main-header {
+        font-size: 2.5rem;
+        color: #4CAF50;
+        text-align: center;
+        margin-bottom: 1rem;
+    }
+    .result-card {
+        background-color: #F5F5F5;
+        padding: 1rem;
+        border-radius: 10px;
+        margin-bottom: 1rem;
+        border-left: 5px solid #4CAF50;
+    }
+    .result-meta {
+        color: #757575;
+        font-size: 0.9rem;
+    }
+    .result-card mark {
+        background-color: #FFF59D;
+        padding: 0 2px;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+# 1回の検索で表示する件数
+RESULT_LIMIT = 50
+
+st.markdown('<h1 class="main-header">🔎 記録の検索</h1>', unsafe_allow_html=True)
+st.write("感情ログ・小さな成功・AIサポートの記録・未来へのメッセージ・成功体験をまとめて検索できます。")
+
+# 検索条件
+query = st.text_input("キーワード", placeholder="例：プレゼン 緊張（空白で区切るとすべてを含む記録を探します）")
+
+col1, col2 = st.columns([2, 1])
+with col1:
+    selected_labels = st.multiselect(
+        "検索する記録",
+        [spec["label"] for spec in search.SOURCES.values()],
+        default=[spec["label"] for spec in search.SOURCES.values()]
+    )
+with col2:
+    use_period = st.checkbox("期間を指定する")
+    if use_period:
+        period = st.date_input("期間", (date.today() - timedelta(days=365), date.today()))
+    else:
+        period = ()
+
+sources = [name for name, spec in search.SOURCES.items() if spec["label"] in selected_labels]
+start = period[0] if len(period) > 0 else None
+end = period[1] if len(period) > 1 else None
+
+if query and sources:
+    started = datetime.now()
+    results = search.search(query, sources=sources, start=start, end=end, limit=RESULT_LIMIT)
+    elapsed = (datetime.now() - started).total_seconds() * 1000
+
+    if results:
+        note = f"（上位 {RESULT_LIMIT} 件を表示）" if len(results) >= RESULT_LIMIT else ""
+        st.caption(f"{len(results)} 件見つかりました{note} - {elapsed:.0f} ms")
+
+        for result in results:
+            title = f" - {result['title_html']}" if result["title"] else ""
+            st.markdown(f"""
+            <div class="result-card">
+                <p class="result-meta">{result['label']} ・ {result['date'] or '日付なし'}{title}</p>
+                <p>{result['snippet']}</p>
+            </div>
+            """, unsafe_allow_html=True)
+    else:
+        st.info("一致する記録は見つかりませんでした。別のキーワードや期間で試してみてください。")
+elif query:
+    st.warning("検索する記録を1つ以上選択してください。")
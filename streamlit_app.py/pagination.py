@@ -0,0 +1,68 @@
+"""
+履歴一覧のページ送り
+
+感情ログ・チャット・タスク・実績などの一覧を、全件ではなく 1 ページ分だけ読み込んで表示する。
+
+    - 読み込みは fetch(cursor, limit) -> (rows, next_cursor) の形の関数に任せる
+      （テーブルなら table_fetcher で storage の Table.page を使い、並べ替え・絞り込みも
+      storage 側で行う。カーソルは日付とキーなので、ページの間に行が増減しても位置がずれない）
+    - rows は (row_key, レコード) のリスト。row_key はレコードごとに決まる値なので、
+      ボタンなどのキーに使えば並び順や絞り込みが変わっても別のレコードと取り違えない
+    - 各ページの開始カーソルをセッションに積んでおき、前後のページへ移動する
+      （並べ替えや絞り込みの条件が変わったら最初のページに戻す）
+    - details() は開いたときだけ中身を表示する折りたたみ
+
+    rows = pagination.paginate("emotion_log_list", pagination.table_fetcher(storage.table("emotion_logs")))
+    for row_key, log in rows:
+        if pagination.details(f"{log['date']} - {log['emotion']}", key=f"emotion_log_{row_key}"):
+            ...
+"""
+import json
+
+import streamlit as st
+
+# 1 ページに表示する件数
+PAGE_SIZE = 20
+
+
+# 読み込み関数
+def table_fetcher(tbl, descending=True, start=None, end=None, **filters):
+    """テーブルを日付列の順にページ送りする fetch 関数（Table.page を参照）"""
+    def fetch(cursor, limit):
+        return tbl.page(cursor=cursor, limit=limit, descending=descending, start=start, end=end, **filters)
+    return fetch
+
+
+# 表示
+def paginate(state_key, fetch, page_size=PAGE_SIZE, query=None, labels=("← 前へ", "次へ →")):
+    """現在のページの (row_key, レコード) のリストを返し、ページ送りのボタンを表示する
+
+    state_key はセッションに状態を保存するキー（一覧ごとに別にする）。
+    query には並べ替え・絞り込みの条件を渡す（変わったら最初のページに戻す）。
+    """
+    query_key = json.dumps(query, ensure_ascii=False, sort_keys=True, default=str)
+    state = st.session_state.get(state_key)
+    if state is None or state["query"] != query_key:
+        state = {"query": query_key, "cursors": [None]}
+        st.session_state[state_key] = state
+
+    rows, next_cursor = fetch(state["cursors"][-1], page_size)
+    page = len(state["cursors"])
+
+    if page > 1 or next_cursor is not None:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if page > 1 and st.button(labels[0], key=f"{state_key}_prev"):
+                state["cursors"].pop()
+                st.rerun()
+        with col2:
+            st.caption(f"{page} ページ目")
+        with col3:
+            if next_cursor is not None and st.button(labels[1], key=f"{state_key}_next"):
+                state["cursors"].append(next_cursor)
+                st.rerun()
+    return rows
+
+def details(label, key, expanded=False):
+    """開いているかどうかを返す折りたたみ（開いたときだけ呼び出し側で中身を表示する）"""
+    return st.checkbox(label, value=expanded, key=key)
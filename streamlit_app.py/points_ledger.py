@@ -0,0 +1,160 @@
+"""
+ポイントの台帳
+
+ポイントの増減を 1 件ずつ追記する台帳（points_ledger データセット）で管理する。
+points.json の合計値を読み込み・加算・保存する方式では、同時に加算すると
+片方の加算が失われ、期間ごとの合計もアクティビティログを数え直す必要があった。
+
+    - 台帳の行は (event_id, amount, reason, timestamp)。追記だけで書き換えない
+    - event_id を冪等キーにし、同じキーの記録は 2 回目以降は無視する
+      （画面の再実行などで同じ操作が二重に送られてもポイントは 1 回だけ付く）
+    - 残高と日・週・月ごとの合計は aggregates の集計値として差分で保持するので、
+      残高の取得は台帳の件数によらない
+    - 履歴は日付の範囲で検索する（SQLite バックエンドでは日付のインデックスを使う）
+
+    points_ledger.post([("login:2024-05-01", 5, "毎日のログイン")])
+    points_ledger.balance()
+    points_ledger.total(start="2024-04-24", end="2024-04-30")
+"""
+import threading
+import uuid
+from datetime import date, datetime
+
+import aggregates
+import storage
+
+DATASET = "points_ledger"
+
+# 台帳を使う前のポイント（points.json の合計値）
+LEGACY_POINTS_FILE = "points.json"
+OPENING_EVENT_ID = "opening:points.json"
+
+
+# ユーティリティ関数
+def _day(value):
+    """日付・日時の値から YYYY-MM-DD 部分を取り出す"""
+    if value is None or value == "":
+        return None
+    return str(value)[:10]
+
+def _add(counter, key, amount):
+    """期間ごとの合計に足し込む（0 になった期間は消す）"""
+    value = counter.get(key, 0) + amount
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+def _week(day):
+    """YYYY-MM-DD を ISO 週（YYYY-Www）にする"""
+    year, week, _ = date.fromisoformat(day).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+# 集計値（残高と期間ごとの合計）
+def _init():
+    return {"entries": 0, "balance": 0, "by_day": {}, "by_week": {}, "by_month": {}}
+
+def _fold(summary, record, sign):
+    amount = (record.get("amount") or 0) * sign
+    summary["entries"] += sign
+    summary["balance"] += amount
+    day = _day(record.get("timestamp"))
+    if day is None:
+        return
+    _add(summary["by_day"], day, amount)
+    _add(summary["by_week"], _week(day), amount)
+    _add(summary["by_month"], day[:7], amount)
+
+aggregates.register(DATASET, DATASET, _init, _fold)
+
+
+# 冪等キーの確認
+_ids = {"signature": None, "ids": set()}
+_ids_lock = threading.Lock()
+
+def _known_ids(tbl):
+    """記録済みの event_id（台帳が変わったときだけ読み直す。台帳のロックを取って呼ぶ）"""
+    signature = tbl.signature()
+    with _ids_lock:
+        if _ids["signature"] != signature:
+            _ids["ids"] = {r.get("event_id") for r in tbl.records()}
+            _ids["signature"] = signature
+        return _ids["ids"]
+
+
+# 記録
+def post(entries):
+    """ポイントの増減をまとめて台帳に記録し、記録した行のリストを返す
+
+    entries は (event_id, amount, reason) の並び。event_id が None なら新しく採番する。
+    記録済みの event_id と 0 ポイントの行は記録しない。
+    残高が 0 未満にならないよう、減算は残高の範囲に切り詰める。
+    """
+    tbl = storage.table(DATASET)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with tbl.lock():
+        _migrate()
+        known = _known_ids(tbl)
+        balance = aggregates.summary(DATASET)["balance"]
+        rows = []
+        seen = set()
+        for event_id, amount, reason in entries:
+            event_id = event_id or str(uuid.uuid4())
+            if event_id in known or event_id in seen:
+                continue
+            amount = max(amount, -balance)
+            if not amount:
+                continue
+            balance += amount
+            seen.add(event_id)
+            rows.append({"event_id": event_id, "amount": amount, "reason": reason, "timestamp": timestamp})
+        if rows:
+            tbl.extend(rows)
+            # 自分の追記だけなら記録済みの event_id を読み直さずに済ませる
+            with _ids_lock:
+                if _ids["ids"] is known:
+                    known.update(seen)
+                    _ids["signature"] = tbl.signature()
+    return rows
+
+def _migrate():
+    """台帳が空なら points.json の合計値を開始残高として記録する（台帳のロックを取って呼ぶ）"""
+    if aggregates.summary(DATASET)["entries"]:
+        return
+    legacy = storage.load_document(LEGACY_POINTS_FILE, default={}) or {}
+    points = legacy.get("points", 0)
+    if isinstance(points, (int, float)) and points > 0:
+        storage.table(DATASET).append({
+            "event_id": OPENING_EVENT_ID,
+            "amount": points,
+            "reason": "台帳に移行する前のポイント",
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+
+# 参照
+def balance():
+    """現在のポイント"""
+    summary = aggregates.summary(DATASET)
+    if not summary["entries"]:
+        with storage.table(DATASET).lock():
+            _migrate()
+        summary = aggregates.summary(DATASET)
+    return summary["balance"]
+
+def total(start=None, end=None):
+    """期間（両端を含む YYYY-MM-DD）に増減したポイントの合計"""
+    start, end = _day(start), _day(end)
+    return sum(
+        amount for day, amount in aggregates.summary(DATASET)["by_day"].items()
+        if (start is None or day >= start) and (end is None or day <= end)
+    )
+
+def totals(period="week"):
+    """期間ごとの合計（period は day / week / month。キーは YYYY-MM-DD / YYYY-Www / YYYY-MM）"""
+    return dict(aggregates.summary(DATASET)[f"by_{period}"])
+
+def history(start=None, end=None):
+    """期間（両端を含む YYYY-MM-DD）の台帳の行を DataFrame で取得する"""
+    return storage.table(DATASET).query(start=start, end=end)
@@ -0,0 +1,401 @@
+"""
+週間・月間レポートのバックグラウンド生成
+
+AI サポート（07）の週間レポートと成長記録（01）の月間レポートを、ボタンを押したときに
+ページの中で生成するのをやめ、バックグラウンドのスレッドで生成して保存しておく。
+ページは保存済みのレポートを読むだけにする。
+
+    - 週間レポートは ai_weekly_reports（キーは週の範囲 YYYY-MM-DD_YYYY-MM-DD）、
+      月間レポートは growth_monthly_reports（キーは YYYY-MM）に保存する
+    - 元のデータセットへの書き込みを storage の変更通知で受け、追加・削除したレコードの
+      日付を含む週・月だけを「要再生成」にする（全件の保存で差分がわからないときは
+      保存済みのレポートをすべて対象にする）
+    - 要再生成の期間は report_schedule.json にも保存するので、再起動しても失われない
+    - スケジューラーのスレッドが CHECK_INTERVAL ごと（書き込みがあればすぐ）に、
+      期間の切り替わりで必要になったレポート（今週・先週・先月）と要再生成のレポートを
+      生成用のスレッドに依頼する
+    - 生成中に元のデータが変わった期間は、変更通知でもう一度要再生成になる
+
+    reports.start()
+    report = reports.weekly_report(date(2024, 5, 6))   # 保存済みのレポート（なければ None）
+    report = reports.request_weekly(date(2024, 5, 6)).result()   # すぐに生成して完了を待つ
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import keyword_index
+import rollups
+import storage
+import tokenizer
+
+# 要再生成の期間を保存するファイル
+SCHEDULE_FILE = "report_schedule.json"
+
+# 期間の切り替わりと要再生成のレポートを確認する間隔（秒）
+CHECK_INTERVAL = 60
+
+# 書き込みの通知を受けてから生成を始めるまでの待ち時間（続けて書き込んだ分をまとめる）
+DEBOUNCE_SECONDS = 2
+
+# 全件の保存などで、保存済みのレポートをすべて要再生成にする印
+ALL = "*"
+
+# レポートの種類（dataset: 保存先 / sources: 元のデータセット）
+KINDS = {
+    "weekly": {"dataset": "ai_weekly_reports", "sources": ["ai_daily_logs", "small_wins"]},
+    "monthly": {"dataset": "growth_monthly_reports", "sources": ["growth_data"]},
+}
+
+logger = logging.getLogger(__name__)
+
+
+# 期間
+def _to_date(value):
+    """日付・日時の値を date にする（読めなければ None）"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, date):
+        return value if type(value) is date else value.date()
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+def week_bounds(day):
+    """day を含む週の月曜日と日曜日"""
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=6)
+
+def week_range(day):
+    """day を含む週の範囲の文字列（週間レポートのキー）"""
+    start, end = week_bounds(day)
+    return f"{start.strftime('%Y-%m-%d')}_{end.strftime('%Y-%m-%d')}"
+
+def _period_key(kind, day):
+    return week_range(day) if kind == "weekly" else day.strftime("%Y-%m")
+
+def _expected_keys(kind, today):
+    """期間の切り替わりで用意しておくレポート（週間は今週と先週、月間は先月）"""
+    if kind == "weekly":
+        return {week_range(today), week_range(today - timedelta(days=7))}
+    return {_period_key(kind, today.replace(day=1) - timedelta(days=1))}
+
+
+# 週間レポートの生成
+def generate_weekly_report(start_of_week, end_of_week):
+    """週間レポートを生成する"""
+    # 日付範囲の文字列
+    week_key = f"{start_of_week.strftime('%Y-%m-%d')}_{end_of_week.strftime('%Y-%m-%d')}"
+    start, end = start_of_week.strftime("%Y-%m-%d"), end_of_week.strftime("%Y-%m-%d")
+
+    # 指定した週の日次ログを日付順に 1 回だけたどり、日々のデータ・気づき・課題を集める
+    week_logs = storage.table("ai_daily_logs").query(start=start, end=end)
+    daily_data = []
+    insights = []
+    challenges = []
+    for log in sorted(week_logs.to_dict("records"), key=lambda r: str(r.get("date"))):
+        daily_data.append({
+            'date': str(log.get('date'))[:10],
+            'mood': log.get('mood'),
+            'progress': log.get('progress'),
+            'insights': log.get('insights'),
+            'challenges': log.get('challenges')
+        })
+        if log.get('insights'):
+            insights.append(log['insights'])
+        if log.get('challenges'):
+            challenges.append(log['challenges'])
+
+    # 週間の小さな成功体験を抽出
+    week_wins = storage.table("small_wins").query(start=start, end=end)
+    achievements = week_wins['description'].tolist() if 'description' in week_wins.columns else []
+
+    # 来週の戦略提案
+    strategies = []
+
+    # 課題に基づく戦略を生成
+    # その週によく出てくる単語（保存時に更新している単語の索引）を多く含む課題から順に、上位3つの課題に対する戦略を選ぶ
+    keyword_counts = dict(keyword_index.top_keywords("ai_daily_logs", "challenges", start=start, end=end, top_n=None))
+    ranked_challenges = sorted(
+        challenges,
+        key=lambda challenge: -sum(keyword_counts.get(term, 0) for term in set(tokenizer.tokenize(challenge)))
+    )
+    for challenge in ranked_challenges[:3]:
+        if "時間" in challenge.lower():
+            strategy = "時間管理を改善するために「タイムブロッキング」を試してみる。一日の始めに、重要なタスクのための時間を予め確保しておく。"
+        elif "モチベーション" in challenge.lower() or "やる気" in challenge.lower():
+            strategy = "モチベーション低下に対しては「5分ルール」を試してみる。まずは5分だけ始める約束をし、多くの場合はそのまま続けられるようになる。"
+        elif "集中" in challenge.lower():
+            strategy = "集中力向上のためにポモドーロテクニック（25分集中＋5分休憩）を活用し、集中と休息のリズムを作る。"
+        else:
+            strategy = f"「{challenge[:20]}...」という課題に対しては、問題を小さく分解し、一つずつ対処する戦略を取る。"
+        if strategy not in strategies:
+            strategies.append(strategy)
+
+    # デフォルトの戦略提案
+    if len(strategies) < 3:
+        default_strategies = [
+            "週の始めに「最重要目標」を3つ特定し、それらに焦点を当てる",
+            "毎日、短時間でも目標に向けた行動を取る「習慣の連鎖」を意識する",
+            "週末に振り返りの時間を設け、進捗を確認し、次週の計画を立てる",
+            "「完璧」を目指すのではなく、「継続」を重視する姿勢を持つ",
+            "自分の生産性が高い時間帯を特定し、その時間に最重要タスクに取り組む"
+        ]
+        for strategy in default_strategies:
+            if len(strategies) < 3:
+                strategies.append(strategy)
+
+    # レポートデータを構築
+    return {
+        "week_range": week_key,
+        "achievements": achievements[:5],  # 最大5つの達成
+        "insights": insights[:5],  # 最大5つの気づき
+        "challenges": challenges[:5],  # 最大5つの課題
+        "strategies": strategies[:5],  # 最大5つの戦略
+        "daily_data": daily_data,
+        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+# 月間レポートの生成
+def generate_monthly_report(year, month):
+    """月間レポート（Markdown）を生成する（その月の記録がなければ None）"""
+    first_day = date(year, month, 1)
+    last_day = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+    # 月の集計（月のバケット）
+    month_summary = rollups.bucket("growth_data", "month", first_day.strftime("%Y-%m"))
+    if not month_summary["count"]:
+        return None
+
+    # 基本統計
+    total_achievements = month_summary["count"]
+    category_counts = rollups.distribution(month_summary, "category")
+    categories = len(category_counts)
+    most_frequent_category = max(category_counts, key=category_counts.get) if category_counts else "なし"
+
+    # カテゴリーごとの最初と最後の値はその月の記録だけを読み込んで求める
+    month_data = storage.table("growth_data").query(start=first_day.strftime("%Y-%m-%d"), end=last_day.strftime("%Y-%m-%d"))
+    by_category = {}
+    for record in sorted(month_data.to_dict("records"), key=lambda r: str(r.get("date"))):
+        by_category.setdefault(record.get("category"), []).append(record.get("value"))
+
+    # 成長率の計算
+    growth_data = []
+    for category, values in by_category.items():
+        if len(values) >= 2:
+            first_value = values[0]
+            last_value = values[-1]
+            if first_value > 0:  # ゼロ除算を避ける
+                growth_rate = (last_value - first_value) / first_value * 100
+                growth_data.append((category, growth_rate))
+
+    # レポート生成
+    report = f"## {year}年{month}月の振り返りレポート\n\n"
+    report += f"### 基本統計\n"
+    report += f"- 総記録数: {total_achievements}件\n"
+    report += f"- 活動カテゴリー数: {categories}個\n"
+    report += f"- 最も活動したカテゴリー: {most_frequent_category}\n\n"
+
+    if growth_data:
+        report += f"### 成長率\n"
+        for category, rate in sorted(growth_data, key=lambda x: x[1], reverse=True):
+            report += f"- {category}: {rate:.1f}%\n"
+
+        max_growth = max(growth_data, key=lambda x: x[1])
+        report += f"\n**今月最も成長したのは {max_growth[0]} でした！ (成長率: {max_growth[1]:.1f}%)**\n\n"
+
+    # 感情分析
+    emotion_counts = rollups.emotion_types(month_summary)
+    total_emotions = sum(emotion_counts.values())
+
+    if total_emotions > 0:
+        report += f"### 感情分析\n"
+        positive_ratio = emotion_counts.get('positive', 0) / total_emotions * 100
+        report += f"- ポジティブな感情の割合: {positive_ratio:.1f}%\n"
+        report += f"- ニュートラルな感情の割合: {emotion_counts.get('neutral', 0) / total_emotions * 100:.1f}%\n"
+        report += f"- ネガティブな感情の割合: {emotion_counts.get('negative', 0) / total_emotions * 100:.1f}%\n\n"
+
+        if positive_ratio >= 70:
+            report += "**素晴らしい！ポジティブな感情が多かった月でした！**\n\n"
+        elif positive_ratio >= 50:
+            report += "**良い傾向です。ポジティブな感情がやや多めでした。**\n\n"
+        else:
+            report += "**次の月はもう少しポジティブな体験を増やしていきましょう。**\n\n"
+
+    # 来月の目標提案
+    report += f"### 来月の目標提案\n"
+
+    # カテゴリーごとの提案
+    for category, values in by_category.items():
+        report += f"- **{category}**: "
+        if len(values) >= 2:
+            # 簡単な目標提案（前月の最終値から5-10%アップ）
+            target = values[-1] * (1 + random.uniform(0.05, 0.1))
+            report += f"目標値 {target:.1f} を目指しましょう！\n"
+        else:
+            report += f"継続して記録していきましょう！\n"
+
+    report += "\n**新しい月も頑張りましょう！**"
+
+    return report
+
+
+# 生成と保存
+def _build(kind, key):
+    """レポートを生成して保存し、保存したレコードを返す（記録がなければ削除して None）"""
+    tbl = storage.table(KINDS[kind]["dataset"])
+    if kind == "weekly":
+        start = date.fromisoformat(key.split("_")[0])
+        record = generate_weekly_report(*week_bounds(start))
+    else:
+        year, month = (int(part) for part in key.split("-"))
+        report = generate_monthly_report(year, month)
+        record = None if report is None else {
+            "month": key,
+            "report": report,
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+    if record is None:
+        if tbl.get(key) is not None:
+            tbl.delete(key)
+        return None
+    tbl.upsert(record)
+    return record
+
+def _stored_keys(kind):
+    spec = KINDS[kind]
+    key = storage.DATASETS[spec["dataset"]]["key"]
+    return {record.get(key) for record in storage.table(spec["dataset"]).records()}
+
+
+# 要再生成の期間
+_dirty = {kind: set() for kind in KINDS}
+_lock = threading.Lock()
+_wake = threading.Event()
+
+def _mark_dirty(kind, keys):
+    """期間を要再生成にする（新しく増えたときだけファイルに書く）"""
+    with _lock:
+        new = set(keys) - _dirty[kind]
+        if not new:
+            return
+        _dirty[kind] |= new
+    def add(schedule):
+        schedule[kind] = sorted(set(schedule.get(kind, [])) | new)
+    storage.update_document(SCHEDULE_FILE, add, default={})
+    _wake.set()
+
+def _take_dirty(kind):
+    """要再生成の期間を取り出して空にする（ほかのプロセスが記録した分も含む）"""
+    taken = set()
+    def take(schedule):
+        taken.update(schedule.pop(kind, []))
+    storage.update_document(SCHEDULE_FILE, take, default={})
+    with _lock:
+        taken |= _dirty[kind]
+        _dirty[kind] = set()
+    return taken
+
+def _on_change(dataset, before, after, added, removed):
+    """元のデータセットへの書き込みから要再生成の期間を求める（storage から呼ばれる）"""
+    date_field = storage.DATASETS[dataset]["date_field"]
+    for kind, spec in KINDS.items():
+        if dataset not in spec["sources"]:
+            continue
+        if added is None:
+            # 差分がわからないので、保存済みのレポートをすべて作り直す（ロックの順序のため一覧は後で読む）
+            _mark_dirty(kind, {ALL})
+            continue
+        days = {_to_date(record.get(date_field)) for record in [*added, *removed]}
+        _mark_dirty(kind, {_period_key(kind, day) for day in days if day is not None})
+
+storage.add_listener(_on_change)
+
+
+# スケジューラー
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reports")
+_pending = {}  # 生成中の (種類, キー) → Future
+_scheduler = None
+
+def _request(kind, key):
+    """生成を依頼して Future（結果は保存したレコードか None）を返す（同じレポートの生成中はそれを共有する）"""
+    with _lock:
+        future = _pending.get((kind, key))
+        if future is None:
+            future = _executor.submit(_run, kind, key)
+            _pending[(kind, key)] = future
+        return future
+
+def _run(kind, key):
+    try:
+        return _build(kind, key)
+    except Exception:
+        # 失敗したものは次の確認でもう一度生成する
+        _mark_dirty(kind, {key})
+        raise
+    finally:
+        with _lock:
+            _pending.pop((kind, key), None)
+
+def check(today=None):
+    """期間の切り替わりで必要になったレポートと要再生成のレポートの生成を依頼する"""
+    today = today or date.today()
+    futures = []
+    for kind in KINDS:
+        stored = _stored_keys(kind)
+        expected = _expected_keys(kind, today)
+        dirty = _take_dirty(kind)
+        if ALL in dirty:
+            dirty = (dirty - {ALL}) | stored
+        # 保存済みか、いま用意しておく期間のレポートだけを作り直す（古い週のレポートを新しく作らない）
+        targets = {key for key in dirty if key in stored or key in expected}
+        targets |= expected - stored
+        futures.extend(_request(kind, key) for key in sorted(targets))
+    return futures
+
+def _loop():
+    # メインスレッドが終わったら止める（終了処理で実行器が止まった後は生成を依頼できない）
+    while threading.main_thread().is_alive():
+        try:
+            check()
+        except RuntimeError:
+            if not threading.main_thread().is_alive():
+                return
+            logger.exception("レポートの生成の確認に失敗しました")
+        except Exception:
+            logger.exception("レポートの生成の確認に失敗しました")
+        if _wake.wait(CHECK_INTERVAL):
+            time.sleep(DEBOUNCE_SECONDS)
+        _wake.clear()
+
+def start():
+    """スケジューラーのスレッドを起動する（プロセスごとに 1 つ）"""
+    global _scheduler
+    if _scheduler is None:
+        with _lock:
+            if _scheduler is None:
+                _scheduler = threading.Thread(target=_loop, name="reports-scheduler", daemon=True)
+                _scheduler.start()
+
+
+# 参照
+def weekly_report(day):
+    """day を含む週の保存済みの週間レポート（なければ None）"""
+    return storage.table("ai_weekly_reports").get(week_range(day))
+
+def monthly_report(year, month):
+    """保存済みの月間レポート（なければ None。report 列が Markdown）"""
+    return storage.table("growth_monthly_reports").get(f"{year:04d}-{month:02d}")
+
+def request_weekly(day):
+    """day を含む週の週間レポートの生成を依頼する（Future を返す）"""
+    return _request("weekly", week_range(day))
+
+def request_monthly(year, month):
+    """月間レポートの生成を依頼する（Future を返す）"""
+    return _request("monthly", f"{year:04d}-{month:02d}")
@@ -0,0 +1,273 @@
+"""
+期間ごとの集計（ロールアップ）
+
+データセットのレコードを日・ISO 週・月のバケットに分けて、件数・数値項目の合計と件数
+（平均はここから求める）・分類項目の値ごとの件数を保持する。
+「今月と 3ヶ月前の比較」のような期間の集計を、全履歴を読み込んで日付で絞り込む
+代わりに、いくつかのバケットを足し合わせるだけで求められる。
+
+    - バケットは aggregates に登録するので、保存のたびに追加・削除したレコードの分だけ更新する
+    - 期間の集計（window）は、期間に丸ごと入る月・週のバケットと端の日のバケットを足し合わせる
+    - 感情のポジティブ・ネガティブは emotions.json の設定で変わるので、感情名ごとの件数を
+      持っておき、読み出すときに emotion_taxonomy で分類する
+
+    current = rollups.window("emotion_logs", start="2024-05-01", end="2024-05-31")
+    rollups.distribution(current, "emotion")  # {"喜び": 12, "不安": 3, ...}
+    rollups.mean(current, "intensity")
+"""
+from datetime import date, timedelta
+
+import aggregates
+import emotion_taxonomy
+import storage
+
+# 集計するデータセット
+#   date_field: バケットを決める日付の項目（省略時はデータセットの日付列）
+#   measures: 合計と平均を求める数値の項目
+#   dimensions: 値ごとの件数を数える項目（タプルは組み合わせごとの件数。{値1: {値2: 件数}} の入れ子）
+#   where: この条件に一致するレコードだけを集計する
+ROLLUPS = {
+    "growth_data": {"measures": ["value"], "dimensions": ["category", "emotion"]},
+    "emotion_logs": {"measures": ["intensity"], "dimensions": ["emotion", "category"]},
+    "habit_records": {"measures": [], "dimensions": ["status", ("habit_id", "status")]},
+    "activity_log": {"measures": ["points"], "dimensions": ["activity_type"]},
+    "tasks": {"date_field": "completed_at", "measures": ["points"], "dimensions": ["goal_id"], "where": {"status": "completed"}},
+    "small_wins": {"measures": [], "dimensions": ["feeling"]},
+    "ai_daily_logs": {"measures": ["mood", "progress"], "dimensions": []},
+    "self_esteem_log": {"measures": ["score"], "dimensions": []},
+    "points_ledger": {"measures": ["amount"], "dimensions": []},
+}
+
+# バケットの粒度
+PERIODS = ("day", "week", "month")
+
+
+# ユーティリティ関数
+def _name(dataset):
+    """aggregates に登録する集計名"""
+    return f"{dataset}_rollup"
+
+def _dimension_name(dimension):
+    """分類項目の名前（組み合わせは項目名を / でつなぐ）"""
+    return "/".join(dimension) if isinstance(dimension, tuple) else dimension
+
+def _to_date(value):
+    """日付・日時の値を date にする（読めなければ None）"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, date):
+        return value if type(value) is date else value.date()
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+def _keys(day):
+    """日付が属する日・週・月のバケットのキー"""
+    year, week, _ = day.isocalendar()
+    return {"day": day.isoformat(), "week": f"{year}-W{week:02d}", "month": day.strftime("%Y-%m")}
+
+def _measure(value):
+    """数値の項目の値（数値として読めなければ None）"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _bump(counter, path, delta):
+    """入れ子のカウンターを増減する（0 になったキー・空になった入れ子は消す）"""
+    key = str(path[0])
+    if len(path) == 1:
+        value = counter.get(key, 0) + delta
+        if value:
+            counter[key] = value
+        else:
+            counter.pop(key, None)
+        return
+    child = counter.setdefault(key, {})
+    _bump(child, path[1:], delta)
+    if not child:
+        del counter[key]
+
+
+# 集計の定義
+def _empty_bucket():
+    return {"count": 0, "measures": {}, "dimensions": {}}
+
+def _init():
+    return {period: {} for period in PERIODS}
+
+def _make_fold(dataset, spec):
+    date_field = spec.get("date_field") or storage.DATASETS[dataset]["date_field"]
+    where = spec.get("where", {})
+
+    def fold(summary, record, sign):
+        if any(record.get(field) != value for field, value in where.items()):
+            return
+        day = _to_date(record.get(date_field))
+        if day is None:
+            return
+        for period, key in _keys(day).items():
+            buckets = summary[period]
+            bucket = buckets.setdefault(key, _empty_bucket())
+            bucket["count"] += sign
+            if bucket["count"] == 0:
+                # 最後のレコードを除いたバケットは消す（小数の合計の誤差を残さない）
+                del buckets[key]
+                continue
+            for field in spec["measures"]:
+                value = _measure(record.get(field))
+                if value is None:
+                    continue
+                measure = bucket["measures"].setdefault(field, {"count": 0, "sum": 0})
+                measure["count"] += sign
+                measure["sum"] += value * sign
+                if measure["count"] == 0:
+                    del bucket["measures"][field]
+            for dimension in spec["dimensions"]:
+                fields = dimension if isinstance(dimension, tuple) else (dimension,)
+                values = [record.get(field) for field in fields]
+                if any(value is None for value in values):
+                    continue
+                name = _dimension_name(dimension)
+                counts = bucket["dimensions"].setdefault(name, {})
+                _bump(counts, values, sign)
+                if not counts:
+                    del bucket["dimensions"][name]
+    return fold
+
+for _dataset, _spec in ROLLUPS.items():
+    aggregates.register(_name(_dataset), _dataset, _init, _make_fold(_dataset, _spec))
+
+
+# バケットの取得
+def buckets(dataset, period="day"):
+    """粒度ごとのバケット（{キー: バケット}。呼び出し側で変更しないこと）
+
+    キーは day なら YYYY-MM-DD、week なら YYYY-Www（ISO 週）、month なら YYYY-MM。
+    """
+    if dataset not in ROLLUPS:
+        raise KeyError(f"期間ごとの集計がないデータセットです: {dataset}")
+    if period not in PERIODS:
+        raise ValueError(f"未対応の粒度です: {period}")
+    return aggregates.summary(_name(dataset))[period]
+
+def bucket(dataset, period, key):
+    """1 つのバケット（記録がなければ空のバケット）"""
+    return buckets(dataset, period).get(key) or _empty_bucket()
+
+def series(dataset, period="day", start=None, end=None):
+    """期間（両端を含む）にあるバケットを (キー, バケット) のリストでキーの順に返す
+
+    start / end は日付で指定する（week・month ではその日を含む週・月から）。
+    記録のないバケットは含まない。
+    """
+    start, end = _to_date(start), _to_date(end)
+    first = _keys(start)[period] if start else None
+    last = _keys(end)[period] if end else None
+    return sorted(
+        (key, value) for key, value in buckets(dataset, period).items()
+        if (first is None or key >= first) and (last is None or key <= last)
+    )
+
+def _cover(start, end):
+    """期間（両端を含む）を覆うバケットの (粒度, キー) を、なるべく大きい粒度で返す"""
+    day = start
+    while day <= end:
+        next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        if day.day == 1 and next_month - timedelta(days=1) <= end:
+            yield "month", day.strftime("%Y-%m")
+            day = next_month
+        elif day.weekday() == 0 and day + timedelta(days=6) <= end:
+            yield "week", _keys(day)["week"]
+            day += timedelta(days=7)
+        else:
+            yield "day", day.isoformat()
+            day += timedelta(days=1)
+
+def window(dataset, start=None, end=None):
+    """期間（両端を含む）のレコードをまとめた 1 つのバケット
+
+    start / end を省略すると記録のある最初・最後の日までを対象にする。
+    """
+    start, end = _to_date(start), _to_date(end)
+    if start is None or end is None:
+        days = buckets(dataset, "day")
+        if not days:
+            return _empty_bucket()
+        start = start or date.fromisoformat(min(days))
+        end = end or date.fromisoformat(max(days))
+    summary = aggregates.summary(_name(dataset))
+    return merge(summary[period].get(key) for period, key in _cover(start, end))
+
+def days(dataset, day_keys):
+    """指定した日（YYYY-MM-DD の並び）のレコードをまとめた 1 つのバケット"""
+    by_day = buckets(dataset, "day")
+    return merge(by_day.get(key) for key in day_keys)
+
+
+# バケットの読み出し
+def merge(parts):
+    """バケットを足し合わせた新しいバケット（None は飛ばす）"""
+    merged = _empty_bucket()
+    for part in parts:
+        if not part:
+            continue
+        merged["count"] += part["count"]
+        for field, measure in part["measures"].items():
+            total = merged["measures"].setdefault(field, {"count": 0, "sum": 0})
+            total["count"] += measure["count"]
+            total["sum"] += measure["sum"]
+        for name, counts in part["dimensions"].items():
+            _merge_counts(merged["dimensions"].setdefault(name, {}), counts)
+    return merged
+
+def _merge_counts(target, counts):
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            _merge_counts(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+
+def total(bucket, field):
+    """数値の項目の合計（値のあるレコードがなければ 0）"""
+    return bucket["measures"].get(field, {}).get("sum", 0)
+
+def mean(bucket, field):
+    """数値の項目の平均（値のあるレコードがなければ None）"""
+    measure = bucket["measures"].get(field)
+    if not measure or not measure["count"]:
+        return None
+    return measure["sum"] / measure["count"]
+
+def distribution(bucket, dimension, normalize=False):
+    """分類項目の値ごとの件数（normalize=True なら合計を 100 とした割合）
+
+    組み合わせの項目は {値1: {値2: 件数}} の入れ子で返す（normalize は使えない）。
+    値はキーとして保存するので文字列になる。
+    """
+    counts = bucket["dimensions"].get(_dimension_name(dimension), {})
+    if not normalize:
+        return {key: (dict(value) if isinstance(value, dict) else value) for key, value in counts.items()}
+    total_count = sum(counts.values())
+    return {key: value / total_count * 100 for key, value in counts.items()} if total_count else {}
+
+def emotion_types(bucket, dimension="emotion"):
+    """感情の項目の件数をタイプ（positive / neutral / negative）ごとにまとめる
+
+    感情が記録されていないレコードは emotion_taxonomy.categorize と同じく neutral に数える。
+    """
+    counts = bucket["dimensions"].get(dimension, {})
+    mapping = emotion_taxonomy.taxonomy()
+    by_type = {}
+    for emotion, count in counts.items():
+        emotion_type = mapping.get(emotion, emotion_taxonomy.DEFAULT_TYPE)
+        by_type[emotion_type] = by_type.get(emotion_type, 0) + count
+    missing = bucket["count"] - sum(counts.values())
+    if missing:
+        by_type[emotion_taxonomy.DEFAULT_TYPE] = by_type.get(emotion_taxonomy.DEFAULT_TYPE, 0) + missing
+    return by_type
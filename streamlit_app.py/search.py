@@ -0,0 +1,390 @@
+"""
+記録の全文検索
+
+感情ログの思考・小さな成功・AI 日次ログ・AI チャット・未来へのメッセージ・
+成功体験を SQLite の FTS5（trigram）で索引し、キーワードで横断検索する。
+trigram は 3 文字ずつに区切って索引するので、日本語の分かち書きは不要。
+
+    - 索引は search_index.db に保存し、データとは別に持つ
+    - テーブル経由の書き込みは storage の変更通知で、追加・削除したレコードだけを索引に反映する
+    - 検索のたびに各データの signature を確認し、索引が遅れているもの（ほかのプロセスの
+      書き込みや設定系ファイル）だけ全件と突き合わせる
+      （レコードの内容のハッシュで比較するので、変更のあったレコードだけを入れ替える）
+    - 3 文字以上の語は FTS5 の索引で探し、関連度（bm25）の順に並べる
+    - 2 文字以下の語は trigram の索引を使えないので LIKE で絞り込む
+    - trigram は SQLite 3.34 以降でしか使えないので、使えない環境ではすべての語を LIKE で探す
+
+    results = search.search("プレゼン 緊張", start="2024-01-01", sources=["emotion_logs"])
+"""
+import hashlib
+import html
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+import storage
+
+SEARCH_DB_FILE = os.environ.get("SELF_AFFIRMATION_SEARCH_DB", "search_index.db")
+
+# 検索対象（dataset: テーブル / document: 設定系の JSON ファイル）
+# date: 日付の列 / title: 見出しにする列 / fields: 本文として索引する列
+SOURCES = {
+    "emotion_logs": {
+        "label": "感情ログ",
+        "dataset": "emotion_logs",
+        "date": "date",
+        "title": ["emotion"],
+        "fields": ["thoughts", "activity"],
+    },
+    "small_wins": {
+        "label": "小さな成功",
+        "dataset": "small_wins",
+        "date": "date",
+        "title": ["feeling"],
+        "fields": ["description"],
+    },
+    "ai_daily_logs": {
+        "label": "AI 日次ログ",
+        "dataset": "ai_daily_logs",
+        "date": "date",
+        "title": [],
+        "fields": ["insights", "challenges", "ai_feedback"],
+    },
+    "ai_chat_history": {
+        "label": "AI チャット",
+        "dataset": "ai_chat_history",
+        "date": "timestamp",
+        "title": ["sender"],
+        "fields": ["message"],
+    },
+    "future_messages": {
+        "label": "未来へのメッセージ（習慣）",
+        "dataset": "future_messages",
+        "date": "creation_date",
+        "title": [],
+        "fields": ["message"],
+    },
+    "goal_future_messages": {
+        "label": "未来へのメッセージ（目標）",
+        "document": "goal_future_messages.json",
+        "date": "created_at",
+        "title": ["goal_name"],
+        "fields": ["message"],
+    },
+    "success_memories": {
+        "label": "成功体験",
+        "document": "success_memories.json",
+        "date": "created_at",
+        "title": ["title"],
+        "fields": ["description", "success_factors", "learnings"],
+    },
+}
+
+# FTS5 の trigram で索引できる最短の語の長さ
+TRIGRAM = 3
+
+def _trigram_available():
+    """この SQLite で FTS5 の trigram が使えるか（3.34 より前や FTS5 なしのビルドでは使えない）"""
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE probe USING fts5(body, tokenize='trigram')")
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+    return True
+
+FTS_AVAILABLE = _trigram_available()
+
+_local = threading.local()
+_ready = set()
+_ready_lock = threading.Lock()
+
+
+# ユーティリティ関数
+def _normalize(text):
+    """全角・半角の違いをそろえる（索引と検索語の両方に使う）"""
+    return unicodedata.normalize("NFKC", text)
+
+def _join(record, columns):
+    values = [record.get(c) for c in columns]
+    return "\n".join(str(v) for v in values if v not in (None, ""))
+
+def _ref(record):
+    """レコードの内容のハッシュ（差分の検出に使う）"""
+    data = json.dumps(record, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+def _entry(spec, record):
+    """レコードを索引の 1 行（ref, day, title, body）に変換する"""
+    value = record.get(spec["date"])
+    day = str(value)[:10] if value not in (None, "") else None
+    return (_ref(record), day, _normalize(_join(record, spec["title"])), _normalize(_join(record, spec["fields"])))
+
+def terms_of(query):
+    """検索文字列を語に分ける（空白区切り・すべての語を含むものを探す）"""
+    return [term for term in _normalize(query or "").split() if term]
+
+
+# 索引の用意
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(SEARCH_DB_FILE, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        _local.conn = conn
+    if SEARCH_DB_FILE not in _ready:
+        with _ready_lock:
+            if SEARCH_DB_FILE not in _ready:
+                _create(conn)
+                _ready.add(SEARCH_DB_FILE)
+    return conn
+
+def _create(conn):
+    """索引のテーブルを作る（本文は entries に持ち、FTS5 は外部コンテンツとして参照する）"""
+    conn.executescript("""
+        BEGIN;
+        CREATE TABLE IF NOT EXISTS entries (
+            id INTEGER PRIMARY KEY, source TEXT NOT NULL, ref TEXT NOT NULL,
+            day TEXT, title TEXT, body TEXT
+        );
+        CREATE INDEX IF NOT EXISTS entries_source_ref ON entries (source, ref);
+        CREATE INDEX IF NOT EXISTS entries_day ON entries (day);
+        CREATE TABLE IF NOT EXISTS sources (name TEXT PRIMARY KEY, signature TEXT);
+        COMMIT;
+    """)
+    if not FTS_AVAILABLE:
+        # trigram を使える SQLite で作った索引なら、entries への書き込みで FTS5 を更新しないようにする
+        conn.executescript("""
+            BEGIN;
+            DROP TRIGGER IF EXISTS entries_ai;
+            DROP TRIGGER IF EXISTS entries_ad;
+            COMMIT;
+        """)
+        return
+    # トリガーがなかった（FTS5 を使わずに entries を更新していた）なら FTS5 を作り直す
+    synced = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'entries_ai'").fetchone() is not None
+    conn.executescript("""
+        BEGIN;
+        CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+            title, body, content='entries', content_rowid='id', tokenize='trigram'
+        );
+        CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+            INSERT INTO entries_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+            INSERT INTO entries_fts (entries_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        END;
+        COMMIT;
+    """)
+    if not synced:
+        conn.execute("INSERT INTO entries_fts (entries_fts) VALUES ('rebuild')")
+
+def _signature(spec):
+    """検索対象のデータが変わると値が変わるキー"""
+    if "dataset" in spec:
+        return json.dumps(storage.table(spec["dataset"]).signature())
+    try:
+        st = os.stat(spec["document"])
+    except FileNotFoundError:
+        return json.dumps(None)
+    return json.dumps([st.st_ino, st.st_mtime_ns, st.st_size])
+
+def _records(spec):
+    if "dataset" in spec:
+        return storage.table(spec["dataset"]).records()
+    data = storage.load_document(spec["document"], default=[])
+    return [r for r in data if isinstance(r, dict)] if isinstance(data, list) else []
+
+
+# 索引の更新
+def sync(names=None):
+    """データが変わった検索対象の索引を更新し、更新した対象の名前を返す"""
+    conn = _connect()
+    updated = []
+    for name in names or SOURCES:
+        spec = SOURCES[name]
+        signature = _signature(spec)
+        row = conn.execute("SELECT signature FROM sources WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[0] == signature:
+            continue
+        entries = {}
+        for record in _records(spec):
+            entry = _entry(spec, record)
+            entries.setdefault(entry[0], []).append(entry)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # ほかのプロセスが先に更新していれば何もしない
+            row = conn.execute("SELECT signature FROM sources WHERE name = ?", (name,)).fetchone()
+            if row is None or row[0] != signature:
+                _apply(conn, name, entries)
+                conn.execute("INSERT OR REPLACE INTO sources (name, signature) VALUES (?, ?)", (name, signature))
+                updated.append(name)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return updated
+
+def _apply(conn, name, entries):
+    """索引の行を entries（ref → 行のリスト）と同じ内容にする"""
+    indexed = {}
+    for rowid, ref in conn.execute("SELECT id, ref FROM entries WHERE source = ?", (name,)):
+        indexed.setdefault(ref, []).append(rowid)
+    stale = []
+    for ref, rowids in indexed.items():
+        keep = len(entries.get(ref, ()))
+        stale.extend(rowids[keep:])
+    conn.executemany("DELETE FROM entries WHERE id = ?", [(rowid,) for rowid in stale])
+    new_rows = []
+    for ref, rows in entries.items():
+        new_rows.extend((name, *row) for row in rows[len(indexed.get(ref, ())):])
+    conn.executemany("INSERT INTO entries (source, ref, day, title, body) VALUES (?, ?, ?, ?, ?)", new_rows)
+
+_by_dataset = {spec["dataset"]: name for name, spec in SOURCES.items() if "dataset" in spec}
+
+def _on_change(dataset, before, after, added, removed):
+    """テーブル経由の書き込みで、追加・削除したレコードだけを索引に反映する
+
+    索引が変更前のデータ（signature が before）と一致しているときだけ反映する。
+    全件の置き換えや、索引がまだない・遅れているときは何もせず、次の sync で全件と突き合わせる。
+    """
+    name = _by_dataset.get(dataset)
+    if name is None or added is None or not os.path.exists(SEARCH_DB_FILE):
+        return
+    spec = SOURCES[name]
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT signature FROM sources WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[0] == json.dumps(before):
+            for record in removed:
+                conn.execute(
+                    "DELETE FROM entries WHERE id = (SELECT id FROM entries WHERE source = ? AND ref = ? LIMIT 1)",
+                    (name, _ref(record)),
+                )
+            conn.executemany(
+                "INSERT INTO entries (source, ref, day, title, body) VALUES (?, ?, ?, ?, ?)",
+                [(name, *_entry(spec, record)) for record in added],
+            )
+            conn.execute("UPDATE sources SET signature = ? WHERE name = ?", (json.dumps(after), name))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+storage.add_listener(_on_change)
+
+def rebuild():
+    """索引をすべて作り直す"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM sources")
+        if FTS_AVAILABLE:
+            conn.execute("INSERT INTO entries_fts (entries_fts) VALUES ('rebuild')")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return sync()
+
+
+# 検索
+def highlight(text, terms, width=None):
+    """text の中の語を <mark> で囲んだ HTML を返す
+
+    width を指定すると、最初に見つかった語の前後 width 文字程度に切り詰める。
+    """
+    text = text or ""
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE) if terms else None
+    prefix = suffix = ""
+    if width is not None and len(text) > width * 2:
+        match = pattern.search(text) if pattern else None
+        center = match.start() if match else 0
+        begin = max(0, center - width)
+        end = min(len(text), center + width)
+        prefix = "…" if begin > 0 else ""
+        suffix = "…" if end < len(text) else ""
+        text = text[begin:end]
+    if pattern is None:
+        return prefix + html.escape(text) + suffix
+    parts = []
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return prefix + "".join(parts) + suffix
+
+def _like(term):
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def search(query, sources=None, start=None, end=None, limit=50, snippet_width=60):
+    """キーワードで記録を検索する
+
+    query は空白区切りの語（すべての語を含むものを探す）。sources で検索対象
+    （SOURCES の名前）、start / end で日付の範囲（両端を含む）を絞り込める。
+    3 文字以上の語があれば関連度の高い順、なければ新しい順に並べる
+    （trigram が使えない環境では常に新しい順）。
+    戻り値は辞書のリスト（source, label, date, title, body, score, title_html, snippet）。
+    snippet と title_html は語を <mark> で囲んだ HTML。
+    """
+    terms = terms_of(query)
+    if not terms:
+        return []
+    names = list(sources) if sources else list(SOURCES)
+    sync(names)
+
+    if FTS_AVAILABLE:
+        long_terms = [t for t in terms if len(t) >= TRIGRAM]
+        short_terms = [t for t in terms if len(t) < TRIGRAM]
+    else:
+        long_terms, short_terms = [], terms
+    conditions = [f"e.source IN ({', '.join('?' for _ in names)})"]
+    params = list(names)
+    if start is not None:
+        conditions.append("e.day >= ?")
+        params.append(str(start)[:10])
+    if end is not None:
+        conditions.append("e.day <= ?")
+        params.append(str(end)[:10])
+    for term in short_terms:
+        conditions.append("(e.title LIKE ? ESCAPE '\\' OR e.body LIKE ? ESCAPE '\\')")
+        params.extend([_like(term), _like(term)])
+
+    if long_terms:
+        match = " ".join('"{}"'.format(t.replace('"', '""')) for t in long_terms)
+        sql = (
+            "SELECT e.source, e.day, e.title, e.body, bm25(entries_fts) AS score "
+            "FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid "
+            f"WHERE entries_fts MATCH ? AND {' AND '.join(conditions)} "
+            "ORDER BY score, e.day DESC LIMIT ?"
+        )
+        params = [match] + params
+    else:
+        sql = (
+            "SELECT e.source, e.day, e.title, e.body, NULL AS score FROM entries e "
+            f"WHERE {' AND '.join(conditions)} ORDER BY e.day DESC LIMIT ?"
+        )
+    params.append(int(limit))
+
+    results = []
+    for source, day, title, body, score in _connect().execute(sql, params):
+        results.append({
+            "source": source,
+            "label": SOURCES[source]["label"],
+            "date": day,
+            "title": title,
+            "body": body,
+            "score": score,
+            "title_html": highlight(title, terms),
+            "snippet": highlight(body, terms, width=snippet_width),
+        })
+    return results
@@ -0,0 +1,1320 @@
+"""
+データストレージ共通モジュール
+
+各ページの load_*/save_* はここを経由してデータを読み書きする。
+データセット（emotion_logs, habit_records, activity_log, tasks, goals など）は
+テーブルとして扱い、追加・ID指定の更新/削除・日付範囲での検索ができる。
+
+バックエンドは差し替え可能:
+    - json   : 従来どおりの JSON ファイル（既定・互換用）
+    - sqlite : インデックス付きの SQLite データベース
+
+環境変数 SELF_AFFIRMATION_STORAGE で切り替える（例: SELF_AFFIRMATION_STORAGE=sqlite）。
+"""
+import bisect
+import copy
+import json
+import logging
+import os
+import secrets
+import shutil
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows では msvcrt のバイト範囲ロックを使う
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow がなければ列指向スナップショットは使わない
+    pa = None
+
+# バックエンドの設定
+STORAGE_BACKEND = os.environ.get("SELF_AFFIRMATION_STORAGE", "json")
+SQLITE_DB_FILE = os.environ.get("SELF_AFFIRMATION_DB", "self_affirmation.db")
+
+# ジャーナルがこのサイズを超えたらスナップショットに書き戻す
+JOURNAL_COMPACT_BYTES = 256 * 1024
+# ロックを取らずにジャーナルを読むとき、書き込みと重なって読み直す回数の上限
+JOURNAL_READ_RETRIES = 5
+
+# 保存時に直前の内容を .bak として残す
+KEEP_BACKUP = os.environ.get("SELF_AFFIRMATION_BACKUP", "1") != "0"
+
+logger = logging.getLogger(__name__)
+
+# データセット定義
+# file: 互換用の JSON ファイル / key: 更新・削除に使うキー列 / date_field: 範囲検索に使う日付列
+# journal: 追記型ジャーナルを使う（JSON バックエンドのみ）
+# dtypes: load(typed=True) で変換する列の型（datetime / category / int8）
+# columnar: 列を指定した読み込みに Arrow 形式のスナップショットを使う（pyarrow がある場合のみ）
+DATASETS = {
+    "growth_data": {
+        "file": "growth_data.json",
+        "key": None,
+        "date_field": "date",
+        "columnar": True,
+        "columns": ["date", "category", "achievement", "value", "comment", "emotion"],
+        "dtypes": {"date": "datetime"},
+    },
+    "achievements": {
+        "file": "achievements.json",
+        "key": None,
+        "date_field": "date",
+        "columns": ["date", "achievement", "category"],
+        "dtypes": {"date": "datetime"},
+    },
+    "habits": {
+        "file": "habits.json",
+        "key": "id",
+        "date_field": "start_date",
+        "columns": ["id", "name", "description", "frequency", "time_of_day", "start_date", "future_vision", "skip_allowed", "reward_milestone", "last_reviewed", "is_active"],
+        "dtypes": {"start_date": "datetime", "last_reviewed": "datetime"},
+    },
+    "habit_records": {
+        "file": "habit_records.json",
+        "key": ("habit_id", "date"),
+        "date_field": "date",
+        "journal": True,
+        "columnar": True,
+        "columns": ["habit_id", "date", "status", "notes"],
+        "dtypes": {"date": "datetime", "status": "category"},
+    },
+    "small_wins": {
+        "file": "small_wins.json",
+        "key": "id",
+        "date_field": "date",
+        "columnar": True,
+        "columns": ["id", "habit_id", "date", "description", "feeling"],
+        "dtypes": {"date": "datetime"},
+    },
+    "future_messages": {
+        "file": "future_messages.json",
+        "key": "id",
+        "date_field": "target_date",
+        "columns": ["id", "habit_id", "creation_date", "target_date", "message"],
+        "dtypes": {"creation_date": "datetime", "target_date": "datetime"},
+    },
+    "emotion_logs": {
+        "file": "emotion_logs.json",
+        "key": "id",
+        "date_field": "date",
+        "journal": True,
+        "columnar": True,
+        "columns": ["id", "date", "emotion", "intensity", "activity", "thoughts", "category"],
+        "dtypes": {"date": "datetime", "emotion": "category", "category": "category", "intensity": "int8"},
+    },
+    "goals": {
+        "file": "goals.json",
+        "key": "id",
+        "date_field": "created_at",
+        "columns": ["id", "name", "description", "category", "deadline", "progress", "created_at", "status"],
+        "dtypes": {"deadline": "datetime", "created_at": "datetime", "status": "category", "category": "category", "progress": "int8"},
+    },
+    "smart_goals": {
+        "file": "smart_goals.json",
+        "key": "id",
+        "date_field": None,
+        "columns": ["id", "goal_id", "specific", "measurable", "achievable", "relevant", "time_bound", "mini_goal", "minimum_criteria"],
+    },
+    "tasks": {
+        "file": "tasks.json",
+        "key": "id",
+        "date_field": "created_at",
+        "columns": ["id", "goal_id", "description", "status", "deadline", "created_at", "completed_at", "points"],
+        "dtypes": {"deadline": "datetime", "created_at": "datetime", "completed_at": "datetime", "status": "category"},
+    },
+    "activity_log": {
+        "file": "activity_log.json",
+        "key": None,
+        "date_field": "date",
+        "journal": True,
+        "columnar": True,
+        "columns": ["date", "activity_type", "notes", "points"],
+        "dtypes": {"date": "datetime"},
+    },
+    "points_ledger": {
+        "file": "points_ledger.json",
+        "key": "event_id",
+        "date_field": "timestamp",
+        "journal": True,
+        "columns": ["event_id", "amount", "reason", "timestamp"],
+        "dtypes": {"timestamp": "datetime"},
+    },
+    "motivation_messages": {
+        "file": "motivation_messages.json",
+        "key": "id",
+        "date_field": "created_date",
+        "columns": ["id", "content", "created_date", "target_date", "opened"],
+        "dtypes": {"created_date": "datetime", "target_date": "datetime"},
+    },
+    "motivation_achievements": {
+        "file": "motivation_achievements.json",
+        "key": "id",
+        "date_field": "date",
+        "columns": ["id", "name", "description", "date", "points"],
+        "dtypes": {"date": "datetime"},
+    },
+    "analysis_report": {
+        "file": "analysis_report.json",
+        "key": None,
+        "date_field": "date",
+        "columns": [],
+    },
+    "self_esteem_log": {
+        "file": "self_esteem_log.json",
+        "key": "date",
+        "date_field": "date",
+        "columns": ["date", "score", "factors", "details", "direction"],
+        "dtypes": {"date": "datetime", "score": "int8"},
+    },
+    "ai_daily_logs": {
+        "file": "ai_daily_logs.json",
+        "key": "date",
+        "date_field": "date",
+        "columnar": True,
+        "columns": ["date", "mood", "progress", "insights", "challenges", "ai_feedback"],
+        "dtypes": {"date": "datetime", "mood": "int8", "progress": "int8"},
+    },
+    "ai_weekly_reports": {
+        "file": "ai_weekly_reports.json",
+        "key": "week_range",
+        "date_field": None,
+        "columns": [],
+    },
+    "growth_monthly_reports": {
+        "file": "growth_monthly_reports.json",
+        "key": "month",
+        "date_field": None,
+        "columns": ["month", "report", "generated_at"],
+    },
+    "ai_chat_history": {
+        "file": "ai_chat_history.json",
+        "key": None,
+        "date_field": "timestamp",
+        "journal": True,
+        "columnar": True,
+        "columns": ["timestamp", "sender", "message"],
+        "dtypes": {"timestamp": "datetime", "sender": "category"},
+    },
+}
+
+
+# ユーティリティ関数
+def _date_part(value):
+    """日付・日時の値から YYYY-MM-DD 部分を取り出す"""
+    if value is None:
+        return None
+    return str(value)[:10]
+
+def _key_of(record, key):
+    """レコードからキー値を取り出す（複合キーはタプル）"""
+    if isinstance(key, tuple):
+        return tuple(record.get(k) for k in key)
+    return record.get(key)
+
+def _normalize_key(key, key_value):
+    """比較用にキー値を揃える"""
+    if isinstance(key, tuple):
+        return tuple(key_value)
+    return key_value
+
+def _to_records(data):
+    """DataFrame またはレコードのリストを JSON 化できるリストに変換"""
+    if isinstance(data, pd.DataFrame):
+        return data.to_dict("records")
+    return list(data)
+
+class Not:
+    """Table.page の絞り込みで「この値（リストならいずれか）以外」を表す条件
+
+    値のない（None・列がない）レコードも一致する。
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f"Not({self.value!r})"
+
+def _matches(value, condition):
+    """列の値が条件に一致するか（条件がリスト・タプル・集合ならいずれかに一致、Not なら不一致）"""
+    if isinstance(condition, Not):
+        return not _matches(value, condition.value)
+    if isinstance(condition, (list, tuple, set, frozenset)):
+        return value in condition
+    return value == condition
+
+def _in_range(record, date_field, start, end):
+    """レコードの日付が範囲内かどうか"""
+    value = _date_part(record.get(date_field))
+    if value is None:
+        return False
+    if start is not None and value < start:
+        return False
+    if end is not None and value > end:
+        return False
+    return True
+
+def _stat_key(path):
+    """ファイルの変更検知用キー（i-node, 更新時刻, サイズ）。存在しなければ None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def coerce_frame(frame, dtypes):
+    """dtypes の定義に従って列の型を変換した DataFrame を返す
+
+    datetime は日付文字列を datetime64 に、category はカテゴリ型に、
+    int8 は数値に変換する（欠損がある場合は欠損を保持できる Int8 にする）。
+    """
+    frame = frame.copy()
+    for column, kind in dtypes.items():
+        if column not in frame.columns:
+            continue
+        if kind == "datetime":
+            frame[column] = pd.to_datetime(frame[column], errors="coerce", format="mixed")
+        elif kind == "category":
+            frame[column] = frame[column].astype("category")
+        elif kind == "int8":
+            values = pd.to_numeric(frame[column], errors="coerce")
+            frame[column] = values.astype("int8" if values.notna().all() else "Int8")
+        else:
+            raise ValueError(f"不明な型です: {kind}")
+    return frame
+
+def as_datetime(series):
+    """datetime64 でなければ変換する（load(typed=True) の列はそのまま返す）"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, errors="coerce", format="mixed")
+
+def _frame_view(frame):
+    """キャッシュした DataFrame を呼び出し側が変更しても影響しない形で渡す"""
+    # Copy-on-Write が有効なら浅いコピーで十分（pandas 3 以降は常に有効）
+    if int(pd.__version__.split(".")[0]) >= 3 or pd.get_option("mode.copy_on_write") is True:
+        return frame.copy(deep=False)
+    return frame.copy()
+
+
+# ファイルロック
+def _lock_fd(fd):
+    """ロックファイルの排他ロックを取る（取れるまで待つ）"""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    # Windows: 先頭 1 バイトをロックする。LK_LOCK は約 10 秒待って取れなければ OSError になるので繰り返す
+    while True:
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+def _unlock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+class FileLock:
+    """<path>.lock を使ったプロセス間の排他ロック
+
+    同じスレッドからは入れ子で取得できる。書き込み側だけが使い、
+    読み込みはアトミックなリネームに任せるのでロックを取らない。
+    POSIX では fcntl.flock、Windows では msvcrt.locking でロックする。
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path) + ".lock"
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and (fcntl is not None or msvcrt is not None):
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                _lock_fd(fd)
+            except BaseException:
+                os.close(fd)
+                self._thread_lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            try:
+                _unlock_fd(self._fd)
+            finally:
+                os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+def file_lock(path):
+    """ファイルごとの FileLock を取得する"""
+    key = os.path.abspath(path)
+    with _file_locks_guard:
+        if key not in _file_locks:
+            _file_locks[key] = FileLock(key)
+        return _file_locks[key]
+
+
+# JSON ファイルの読み書き
+def _backup_path(path):
+    return path + ".bak"
+
+def _fsync_dir(path):
+    """リネームを確定させるためにディレクトリを fsync する（対応 OS のみ）"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def read_json(path, default=None, recover=True):
+    """JSON ファイルを読み込む（存在しない場合は default を返す）
+
+    壊れていて読めない場合、recover=True なら .bak から直前の正常な
+    スナップショットを読み込み、本体をそれで復元する。
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except json.JSONDecodeError:
+        if not recover or not os.path.exists(_backup_path(path)):
+            raise
+    return restore_backup(path)
+
+def write_json(path, data, backup=KEEP_BACKUP):
+    """JSON ファイルを安全に書き込む
+
+    一時ファイルに書いて fsync した後にリネームするため、途中で
+    落ちても元のファイルが壊れることはない。backup=True なら
+    置き換える前の内容を .bak として残す。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        if backup and os.path.exists(path):
+            shutil.copyfile(path, _backup_path(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_dir(path)
+
+def restore_backup(path):
+    """.bak から本体を復元して、その内容を返す（壊れた本体は .corrupt として残す）"""
+    with file_lock(path):
+        # 他のプロセスが先に復元していればそれを使う
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        with open(_backup_path(path), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if os.path.exists(path):
+            shutil.copyfile(path, path + ".corrupt")
+        logger.warning("%s が読み込めないため、バックアップから復元しました", path)
+        write_json(path, data, backup=False)
+        shutil.copystat(_backup_path(path), path)
+    return data
+
+
+# JSON バックエンド
+def _apply_op(records, op, key):
+    """ジャーナルの 1 操作をレコードのリストに適用し、影響した件数を返す"""
+    kind = op["op"]
+    if kind == "append":
+        records.extend(op["records"])
+        return len(op["records"])
+    key_value = _normalize_key(key, op["key"])
+    if kind == "update":
+        count = 0
+        for record in records:
+            if _key_of(record, key) == key_value:
+                record.update(op["changes"])
+                count += 1
+        return count
+    if kind == "delete":
+        remaining = [r for r in records if _key_of(r, key) != key_value]
+        count = len(records) - len(remaining)
+        records[:] = remaining
+        return count
+    raise ValueError(f"不明なジャーナル操作です: {kind}")
+
+class JSONBackend:
+    """データセットごとに 1 つの JSON ファイルへ全件を保存するバックエンド
+
+    journal が有効なデータセット（イベント系のログ）は、変更を
+    <名前>.journal.jsonl に 1 行ずつ追記する。読み込み時は JSON ファイルを
+    スナップショットとしてジャーナルを再生する（ロックは取らない。ジャーナルの先頭行に
+    重ねるスナップショットを記録しておき、書き戻し済みの古いジャーナルは使わない）。書き込みでジャーナルが
+    JOURNAL_COMPACT_BYTES を超えたらスナップショットに書き戻して空にする
+    （読み込み側では書き戻さない。signature が変わったことを Table が変更として通知できるように、
+    書き込みのロックの中で行う）。
+
+    変更系の操作はデータセットのファイルロックを取ってから行うので、
+    複数のセッションやプロセスから同時に書いても更新が失われない。
+    """
+
+    name = "json"
+    indexed = False
+
+    def _lock(self, dataset):
+        return file_lock(DATASETS[dataset]["file"])
+
+    def _journal_path(self, dataset):
+        return os.path.splitext(DATASETS[dataset]["file"])[0] + ".journal.jsonl"
+
+    def _base(self, snapshot_key):
+        """ジャーナルを重ねるスナップショットを表す値（更新時刻とサイズ、なければ None）"""
+        return None if snapshot_key is None else [snapshot_key[1], snapshot_key[2]]
+
+    def _read_journal(self, dataset, base):
+        """ジャーナルの操作を順に読み込む（書きかけの末尾行は無視）
+
+        base は読み込んだスナップショットの _base。ジャーナルの先頭に記録した
+        スナップショットと違えば、すでに書き戻し済みの古いジャーナルなので使わない。
+        """
+        ops = []
+        try:
+            with open(self._journal_path(dataset), "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        op = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if op.get("op") == "base":
+                        if op["snapshot"] != base:
+                            return []
+                        continue
+                    ops.append(op)
+        except FileNotFoundError:
+            pass
+        return ops
+
+    def _log(self, dataset, op):
+        """ジャーナルに操作を 1 行追記する（新しいジャーナルには先頭にスナップショットを記録する）"""
+        lines = []
+        if self._journal_size(dataset) == 0:
+            lines.append(json.dumps({"op": "base", "snapshot": self._base(_stat_key(DATASETS[dataset]["file"]))}))
+        lines.append(json.dumps(op, ensure_ascii=False, default=str))
+        with open(self._journal_path(dataset), "a", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def signature(self, dataset):
+        """データが変わると値が変わるキー（キャッシュの有効確認用）"""
+        return (_stat_key(DATASETS[dataset]["file"]), _stat_key(self._journal_path(dataset)))
+
+    def _journal_size(self, dataset):
+        try:
+            return os.path.getsize(self._journal_path(dataset))
+        except FileNotFoundError:
+            return 0
+
+    def _mutate(self, dataset, op):
+        """操作を適用する（ジャーナル有効なら追記、無効ならファイル全体を書き直す）"""
+        spec = DATASETS[dataset]
+        with self._lock(dataset):
+            if spec.get("journal") and op["op"] == "append":
+                self._log(dataset, op)
+                count = len(op["records"])
+            else:
+                data = self.read(dataset)
+                count = _apply_op(data, op, spec["key"])
+                if count:
+                    if spec.get("journal"):
+                        self._log(dataset, op)
+                    else:
+                        self.write(dataset, data)
+            if spec.get("journal") and self._journal_size(dataset) > JOURNAL_COMPACT_BYTES:
+                self.compact(dataset)
+        return count
+
+    def compact(self, dataset):
+        """ジャーナルをスナップショットに取り込んで空にする"""
+        with self._lock(dataset):
+            self.write(dataset, self.read(dataset))
+
+    def read(self, dataset):
+        """全レコードを読み込む
+
+        ジャーナルはロックを取らずに読む（書きかけの末尾行は無視する）。読んでいる間に
+        書き戻しや追記があると組み合わせがずれるので、前後で signature が変わっていたら
+        読み直す。書き戻しでスナップショットを置き換えてから古いジャーナルを消すまでの間は
+        signature が変わらないので、ジャーナルの先頭のスナップショットと比べて古いものを除く。
+        書き込みが続いて読み直しきれないときだけロックを取って読む。
+        """
+        spec = DATASETS[dataset]
+        if not spec.get("journal"):
+            return read_json(spec["file"], default=[]) or []
+        for _ in range(JOURNAL_READ_RETRIES):
+            before = self.signature(dataset)
+            records = read_json(spec["file"], default=[]) or []
+            ops = self._read_journal(dataset, self._base(before[0]))
+            if self.signature(dataset) == before:
+                break
+        else:
+            with self._lock(dataset):
+                records = read_json(spec["file"], default=[]) or []
+                ops = self._read_journal(dataset, self._base(_stat_key(spec["file"])))
+        for op in ops:
+            _apply_op(records, op, spec["key"])
+        return records
+
+    def write(self, dataset, records):
+        """全件を書き込む（ジャーナル有効なら書き戻しを兼ね、ジャーナルを空にする）
+
+        ジャーナル有効なデータセットは、置き換える前のスナップショットではなく新しい
+        スナップショットを .bak にする。前のスナップショットはジャーナルの操作を
+        取り込む前の内容なので、ジャーナルを消した後にそこへ戻すと操作が失われる。
+        ジャーナルは新しいスナップショットと .bak を書き終えてから消す。
+        """
+        path = DATASETS[dataset]["file"]
+        with self._lock(dataset):
+            if not DATASETS[dataset].get("journal"):
+                write_json(path, records)
+                return
+            write_json(path, records, backup=False)
+            if KEEP_BACKUP:
+                # 復元したときに、その後のジャーナルの先頭のスナップショットと一致するよう更新時刻もそろえる
+                write_json(_backup_path(path), records, backup=False)
+                shutil.copystat(path, _backup_path(path))
+            try:
+                os.remove(self._journal_path(dataset))
+            except FileNotFoundError:
+                pass
+
+    def append(self, dataset, records):
+        self._mutate(dataset, {"op": "append", "records": records})
+
+    def update(self, dataset, key_value, changes):
+        return self._mutate(dataset, {"op": "update", "key": key_value, "changes": changes})
+
+    def delete(self, dataset, key_value):
+        return self._mutate(dataset, {"op": "delete", "key": key_value})
+
+    def get(self, dataset, key_value):
+        key = DATASETS[dataset]["key"]
+        key_value = _normalize_key(key, key_value)
+        for record in self.read(dataset):
+            if _key_of(record, key) == key_value:
+                return record
+        return None
+
+    def query(self, dataset, start=None, end=None):
+        date_field = DATASETS[dataset]["date_field"]
+        return [r for r in self.read(dataset) if _in_range(r, date_field, start, end)]
+
+
+# SQLite バックエンド
+class SQLiteBackend:
+    """データセットごとにテーブルを作り、キー列と日付列にインデックスを張るバックエンド
+
+    レコード本体は JSON 文字列として data 列に保存する。
+    テーブルが空の状態で初めて使うときは、既存の JSON ファイルを取り込む。
+
+    signature はデータセットごとのバージョン（_versions テーブル）で、書き込みと
+    同じトランザクションで 1 つ上げる。データベースファイル全体の更新日時を使うと、
+    どれか 1 つのデータセットへの書き込みで全データセットのキャッシュや集計値が
+    作り直しになるため。
+    """
+
+    name = "sqlite"
+    indexed = True
+
+    def __init__(self, db_file=SQLITE_DB_FILE):
+        self.db_file = db_file
+        self._local = threading.local()
+        self._ready = set()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _table(self, dataset):
+        """テーブルを用意して名前を返す（初回は JSON ファイルから移行）"""
+        table = f'"{dataset}"'
+        if dataset in self._ready:
+            return table
+        with self._lock:
+            if dataset in self._ready:
+                return table
+            conn = self._connect()
+            with conn:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (seq INTEGER PRIMARY KEY AUTOINCREMENT, pk TEXT, day TEXT, data TEXT NOT NULL)")
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "{dataset}_pk" ON {table} (pk)')
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "{dataset}_day" ON {table} (day)')
+                conn.execute('CREATE TABLE IF NOT EXISTS "_versions" (dataset TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+                # データベースを作り直したときに以前のバージョンと一致しないよう、乱数から始める
+                created = conn.execute(
+                    'INSERT OR IGNORE INTO "_versions" (dataset, version) VALUES (?, ?)', (dataset, secrets.randbits(48))
+                ).rowcount == 1
+                # JSON ファイルからの移行はバージョンの行を作ったときの 1 回だけ
+                # （空かどうかで判定すると、すべて削除したデータが次の起動で戻ってしまう）
+                if created and conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0:
+                    legacy = JSONBackend().read(dataset)
+                    conn.executemany(
+                        f"INSERT INTO {table} (pk, day, data) VALUES (?, ?, ?)",
+                        [self._row(dataset, r) for r in legacy],
+                    )
+                    self._bump(conn, dataset)
+            self._ready.add(dataset)
+        return table
+
+    def _bump(self, conn, dataset):
+        """データセットのバージョンを上げる（書き込みと同じトランザクションで呼ぶ）"""
+        conn.execute('UPDATE "_versions" SET version = version + 1 WHERE dataset = ?', (dataset,))
+
+    def signature(self, dataset):
+        """データが変わると値が変わるキー（キャッシュの有効確認用）"""
+        self._table(dataset)
+        row = self._connect().execute('SELECT version FROM "_versions" WHERE dataset = ?', (dataset,)).fetchone()
+        return (os.path.abspath(self.db_file), row[0] if row else None)
+
+    def _pk(self, dataset, key_value):
+        key = DATASETS[dataset]["key"]
+        if key is None:
+            return None
+        return json.dumps(_normalize_key(key, key_value), ensure_ascii=False, default=str)
+
+    def _row(self, dataset, record):
+        spec = DATASETS[dataset]
+        pk = self._pk(dataset, _key_of(record, spec["key"])) if spec["key"] else None
+        day = _date_part(record.get(spec["date_field"])) if spec["date_field"] else None
+        return (pk, day, json.dumps(record, ensure_ascii=False, default=str))
+
+    def read(self, dataset):
+        table = self._table(dataset)
+        rows = self._connect().execute(f"SELECT data FROM {table} ORDER BY seq").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def write(self, dataset, records):
+        table = self._table(dataset)
+        conn = self._connect()
+        with conn:
+            conn.execute(f"DELETE FROM {table}")
+            conn.executemany(
+                f"INSERT INTO {table} (pk, day, data) VALUES (?, ?, ?)",
+                [self._row(dataset, r) for r in records],
+            )
+            self._bump(conn, dataset)
+
+    def append(self, dataset, records):
+        table = self._table(dataset)
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                f"INSERT INTO {table} (pk, day, data) VALUES (?, ?, ?)",
+                [self._row(dataset, r) for r in records],
+            )
+            self._bump(conn, dataset)
+
+    def update(self, dataset, key_value, changes):
+        table = self._table(dataset)
+        conn = self._connect()
+        pk = self._pk(dataset, key_value)
+        with conn:
+            rows = conn.execute(f"SELECT seq, data FROM {table} WHERE pk = ?", (pk,)).fetchall()
+            for seq, data in rows:
+                record = json.loads(data)
+                record.update(changes)
+                conn.execute(f"UPDATE {table} SET pk = ?, day = ?, data = ? WHERE seq = ?", (*self._row(dataset, record), seq))
+            if rows:
+                self._bump(conn, dataset)
+        return len(rows)
+
+    def delete(self, dataset, key_value):
+        table = self._table(dataset)
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(f"DELETE FROM {table} WHERE pk = ?", (self._pk(dataset, key_value),))
+            if cursor.rowcount:
+                self._bump(conn, dataset)
+        return cursor.rowcount
+
+    def get(self, dataset, key_value):
+        table = self._table(dataset)
+        row = self._connect().execute(
+            f"SELECT data FROM {table} WHERE pk = ? ORDER BY seq LIMIT 1", (self._pk(dataset, key_value),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, dataset, start=None, end=None):
+        table = self._table(dataset)
+        sql = f"SELECT data FROM {table} WHERE day IS NOT NULL"
+        params = []
+        if start is not None:
+            sql += " AND day >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND day <= ?"
+            params.append(end)
+        rows = self._connect().execute(sql + " ORDER BY seq", params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def page(self, dataset, cursor, limit, descending, start=None, end=None, filters=None):
+        """日付列・キー（キーがなければ追加順）の順に limit 件を取得する（Table.page を参照）"""
+        table = self._table(dataset)
+        tie = "pk" if DATASETS[dataset]["key"] is not None else "seq"
+        sql = f"SELECT day, {tie}, data FROM {table} WHERE day IS NOT NULL"
+        params = []
+        if start is not None:
+            sql += " AND day >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND day <= ?"
+            params.append(end)
+        for field, value in (filters or {}).items():
+            path = '$."{}"'.format(field.replace('"', '\\"'))
+            negate = isinstance(value, Not)
+            if negate:
+                value = value.value
+            if isinstance(value, (list, tuple, set, frozenset)):
+                values = list(value)
+                placeholders = ", ".join("?" for _ in values)
+                if negate:
+                    # NOT IN は NULL に一致しないので、値のないレコードを別に含める
+                    sql += f" AND (json_extract(data, ?) IS NULL OR json_extract(data, ?) NOT IN ({placeholders}))"
+                    params.extend([path, path, *values])
+                else:
+                    sql += f" AND json_extract(data, ?) IN ({placeholders})"
+                    params.extend([path, *values])
+            else:
+                sql += f" AND json_extract(data, ?) {'IS NOT' if negate else 'IS'} ?"
+                params.extend([path, value])
+        if cursor is not None:
+            sql += f" AND (day, {tie}) {'<' if descending else '>'} (?, ?)"
+            params.extend(cursor)
+        order = "DESC" if descending else "ASC"
+        sql += f" ORDER BY day {order}, {tie} {order} LIMIT ?"
+        params.append(limit)
+        rows = self._connect().execute(sql, params).fetchall()
+        return [(day, tiebreak, json.loads(data)) for day, tiebreak, data in rows]
+
+
+# 列指向スナップショット（Arrow IPC 形式）
+def _columnar_path(dataset):
+    return os.path.splitext(DATASETS[dataset]["file"])[0] + ".arrow"
+
+def read_columnar(dataset, columns, signature):
+    """スナップショットから指定した列だけを読む（ない・古い場合は None）
+
+    選んだ列のバッファだけを読み込む。メモリマップは使わない（マップが残っていると
+    Windows では write_columnar の置き換えが失敗するため）。
+    """
+    path = _columnar_path(dataset)
+    try:
+        with pa.OSFile(path, "rb") as source:
+            schema = pa.ipc.open_file(source).schema
+            metadata = schema.metadata or {}
+            if metadata.get(b"signature") != signature:
+                return None
+            names = [c for c in columns if c in schema.names]
+            options = pa.ipc.IpcReadOptions(included_fields=[schema.get_field_index(c) for c in names])
+            snapshot = pa.ipc.open_file(source, options=options).read_all()
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    return snapshot.select(names).to_pandas()
+
+def write_columnar(dataset, frame, signature):
+    """DataFrame をスナップショットとして保存する（変換できない列があれば False）"""
+    try:
+        snapshot = pa.Table.from_pandas(frame, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        logger.info("%s は列指向スナップショットに変換できません: %s", dataset, e)
+        return False
+    metadata = dict(snapshot.schema.metadata or {})
+    metadata[b"signature"] = signature
+    snapshot = snapshot.replace_schema_metadata(metadata)
+    path = _columnar_path(dataset)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, snapshot.schema) as writer:
+                writer.write_table(snapshot)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+BACKENDS = {
+    "json": JSONBackend,
+    "sqlite": SQLiteBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """現在のバックエンドを取得する"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if STORAGE_BACKEND not in BACKENDS:
+                    raise ValueError(f"不明なストレージバックエンドです: {STORAGE_BACKEND}")
+                _backend = BACKENDS[STORAGE_BACKEND]()
+    return _backend
+
+def set_backend(backend):
+    """バックエンドを切り替える（名前またはインスタンス）"""
+    global _backend
+    with _backend_lock:
+        _backend = BACKENDS[backend]() if isinstance(backend, str) else backend
+
+
+# テーブル API
+class Table:
+    """データセットをテーブルとして扱うためのラッパー
+
+    読み込んだレコードと DataFrame はプロセス内でキャッシュし、全ページで共有する。
+    キャッシュはファイルの i-node・更新時刻・サイズが変わるか、
+    このテーブル経由で書き込んだときに破棄する。
+
+    書き込みはデータセットのロックを取ったまま行い、add_listener で登録した
+    関数に追加・削除したレコードを通知する（集計値の差分更新に使う）。
+    """
+
+    def __init__(self, dataset):
+        if dataset not in DATASETS:
+            raise KeyError(f"未定義のデータセットです: {dataset}")
+        self.dataset = dataset
+        self.spec = DATASETS[dataset]
+        self._cache = None
+        self._projections = {"signature": None, "frames": {}}
+        self._columnar_failed = None
+
+    @property
+    def backend(self):
+        return get_backend()
+
+    def _frame(self, records):
+        return pd.DataFrame(records) if records else pd.DataFrame(columns=self.spec["columns"])
+
+    def _require_key(self):
+        if self.spec["key"] is None:
+            raise ValueError(f"{self.dataset} にはキー列が定義されていません")
+
+    def lock(self):
+        """データセットの書き込みロック（確認してから追加する処理などに使う）"""
+        return file_lock(self.spec["file"])
+
+    def signature(self):
+        """データが変わると値が変わるキー（バックエンド名を含む）"""
+        backend = self.backend
+        return (backend.name, backend.signature(self.dataset))
+
+    def _snapshot(self):
+        """キャッシュを取得する（データが変わっていれば読み直す）"""
+        signature = self.signature()
+        cache = self._cache
+        if cache is None or cache["signature"] != signature:
+            cache = {"signature": signature, "records": self.backend.read(self.dataset), "frame": None, "typed": None, "order": None}
+            self._cache = cache
+        return cache
+
+    def invalidate(self):
+        """キャッシュを破棄する"""
+        self._cache = None
+
+    def records(self):
+        """全レコードをリストで取得する"""
+        return [dict(r) for r in self._snapshot()["records"]]
+
+    def load(self, typed=False, columns=None):
+        """全レコードを DataFrame で取得する
+
+        typed=True なら DATASETS の dtypes に従って型変換した DataFrame を返す。
+        変換は読み込み直したときに 1 回だけ行い、結果はキャッシュする。
+        columns を指定するとその列だけを返す（存在しない列は無視する）。
+        """
+        if columns is not None:
+            return self._load_columns(list(columns), typed)
+        cache = self._snapshot()
+        if cache["frame"] is None:
+            cache["frame"] = self._frame(cache["records"])
+        if not typed:
+            return _frame_view(cache["frame"])
+        if cache["typed"] is None:
+            cache["typed"] = coerce_frame(cache["frame"], self.spec.get("dtypes", {}))
+        return _frame_view(cache["typed"])
+
+    def _load_columns(self, columns, typed):
+        """指定した列だけを読み込む
+
+        columnar が有効なデータセットは Arrow スナップショットから必要な列だけを読む。
+        スナップショットは書き込みのたびにバックグラウンドで作り直し、古ければここで
+        全件を読み直して作り直す。このとき全列のキャッシュは持たないので、常駐する
+        メモリは選んだ列の分だけで済む。型変換した結果は列の組み合わせごとに
+        データが変わるまでキャッシュするので、日付の変換は読み込み直したときに 1 回だけ行う。
+        """
+        signature = self.signature()
+        cache = self._cache
+        if pa is None or not self.spec.get("columnar") or (cache is not None and cache["signature"] == signature):
+            frame = self.load(typed=typed)
+            return frame[[c for c in columns if c in frame.columns]]
+        projections = self._projections
+        if projections["signature"] != signature:
+            projections = {"signature": signature, "frames": {}}
+            self._projections = projections
+        cached = projections["frames"].get((tuple(columns), typed))
+        if cached is not None:
+            return _frame_view(cached)
+        key = json.dumps(signature).encode("utf-8")
+        frame = read_columnar(self.dataset, columns, key)
+        if frame is None:
+            full = self._frame(self.backend.read(self.dataset))
+            if self._columnar_failed != key and not write_columnar(self.dataset, full, key):
+                self._columnar_failed = key
+            frame = full[[c for c in columns if c in full.columns]].copy()
+        if typed:
+            frame = coerce_frame(frame, self.spec.get("dtypes", {}))
+        projections["frames"][(tuple(columns), typed)] = frame
+        return _frame_view(frame)
+
+    def _refresh_columnar(self):
+        """Arrow スナップショットをデータに合わせて作り直す（書き込みの後にバックグラウンドで呼ばれる）"""
+        with _columnar_lock:
+            _columnar_pending.discard(self.dataset)
+        signature = self.signature()
+        key = json.dumps(signature).encode("utf-8")
+        if self._columnar_failed == key:
+            return
+        records = self.backend.read(self.dataset)
+        if self.signature() != signature:
+            # 読み込み中に書き込みがあった（その書き込みの後にもう一度呼ばれる）
+            return
+        if not write_columnar(self.dataset, self._frame(records), key):
+            self._columnar_failed = key
+
+    def _matching(self, key_value):
+        """キーが一致するレコードを取得する（通知先がなければ読み込まない）"""
+        if not _listeners:
+            return []
+        key = self.spec["key"]
+        key_value = _normalize_key(key, key_value)
+        return [dict(r) for r in self._snapshot()["records"] if _key_of(r, key) == key_value]
+
+    def _changed(self, before, added, removed):
+        """キャッシュを破棄し、変更をリスナーに通知する
+
+        before は変更前の signature。added が None のときは全件の置き換えを表す。
+        データセットのロックを取ったまま呼ぶこと。
+        """
+        self.invalidate()
+        if pa is not None and self.spec.get("columnar"):
+            _schedule_columnar(self)
+        if not _listeners:
+            return
+        after = self.signature()
+        for listener in list(_listeners):
+            try:
+                listener(self.dataset, before, after, added, removed)
+            except Exception:
+                # 書き込み自体は完了しているので、通知先の失敗は記録だけする
+                logger.exception("%s の変更通知に失敗しました", self.dataset)
+
+    def save(self, data):
+        """DataFrame（またはレコードのリスト）で全件を置き換える"""
+        records = _to_records(data)
+        with self.lock():
+            before = self.signature()
+            self.backend.write(self.dataset, records)
+            self._changed(before, None, None)
+
+    def append(self, record):
+        """レコードを 1 件追加する"""
+        self.extend([record])
+
+    def extend(self, records):
+        """レコードをまとめて追加する"""
+        records = [dict(r) for r in _to_records(records)]
+        if records:
+            with self.lock():
+                before = self.signature()
+                self.backend.append(self.dataset, records)
+                self._changed(before, records, [])
+
+    def get(self, key_value):
+        """キーでレコードを 1 件取得する（なければ None）"""
+        self._require_key()
+        return self.backend.get(self.dataset, key_value)
+
+    def update(self, key_value, changes):
+        """キーで指定したレコードを更新し、更新件数を返す"""
+        self._require_key()
+        changes = dict(changes)
+        with self.lock():
+            before = self.signature()
+            old = self._matching(key_value)
+            count = self.backend.update(self.dataset, key_value, changes)
+            self._changed(before, [{**r, **changes} for r in old], old)
+        return count
+
+    def upsert(self, record):
+        """キーが一致するレコードがあれば更新、なければ追加する"""
+        self._require_key()
+        record = dict(record)
+        key_value = _key_of(record, self.spec["key"])
+        with self.lock():
+            before = self.signature()
+            old = self._matching(key_value)
+            if self.backend.update(self.dataset, key_value, record):
+                self._changed(before, [{**r, **record} for r in old], old)
+            else:
+                self.backend.append(self.dataset, [record])
+                self._changed(before, [record], [])
+
+    def delete(self, key_value):
+        """キーで指定したレコードを削除し、削除件数を返す"""
+        self._require_key()
+        with self.lock():
+            before = self.signature()
+            old = self._matching(key_value)
+            count = self.backend.delete(self.dataset, key_value)
+            self._changed(before, [], old)
+        return count
+
+    def compact(self):
+        """ジャーナルをスナップショットに書き戻す（JSON バックエンドのみ）"""
+        if hasattr(self.backend, "compact"):
+            with self.lock():
+                before = self.signature()
+                self.backend.compact(self.dataset)
+                self._changed(before, [], [])
+
+    def query(self, start=None, end=None, **filters):
+        """日付範囲（両端を含む YYYY-MM-DD）と列の一致条件で検索する"""
+        if self.spec["date_field"] is None and (start is not None or end is not None):
+            raise ValueError(f"{self.dataset} には日付列が定義されていません")
+        if start is None and end is None:
+            records = self._snapshot()["records"]
+        elif self.backend.indexed:
+            records = self.backend.query(self.dataset, _date_part(start), _date_part(end))
+        else:
+            # インデックスのないバックエンドはキャッシュから絞り込む
+            start, end = _date_part(start), _date_part(end)
+            records = [r for r in self._snapshot()["records"] if _in_range(r, self.spec["date_field"], start, end)]
+        if filters:
+            records = [r for r in records if all(r.get(k) == v for k, v in filters.items())]
+        return self._frame(records)
+
+    def _order(self):
+        """日付列・キーの順に並べた (日付, キー) と元の位置（データが変わるまでキャッシュする）
+
+        キーのないデータセットはキーの代わりに元の位置（追加順）を使う。日付のないレコードは含めない。
+        """
+        cache = self._snapshot()
+        if cache["order"] is None:
+            key, date_field = self.spec["key"], self.spec["date_field"]
+            entries = []
+            for position, record in enumerate(cache["records"]):
+                day = _date_part(record.get(date_field))
+                if day is None:
+                    continue
+                if key is None:
+                    tiebreak = position
+                else:
+                    tiebreak = json.dumps(_normalize_key(key, _key_of(record, key)), ensure_ascii=False, default=str)
+                entries.append(((day, tiebreak), position))
+            entries.sort(key=lambda entry: entry[0])
+            keys = [entry[0] for entry in entries]
+            cache["order"] = (keys, [k[0] for k in keys], [entry[1] for entry in entries])
+        return cache["records"], cache["order"]
+
+    def page(self, cursor=None, limit=20, descending=True, start=None, end=None, **filters):
+        """日付列の順に limit 件ずつ取得する（カーソル方式のページ送り）
+
+        日付が同じレコードはキー（キーがなければ追加順）で並べる。
+        cursor は前のページの next_cursor（最初のページは None）、start / end は
+        日付の範囲（両端を含む YYYY-MM-DD）、filters は列の一致条件
+        （リスト・タプル・集合ならいずれかに一致、Not(値) なら値のないものを含めて不一致）。全件を並べ直さずに
+        カーソルの位置から読むので、履歴が長くても 1 ページの取得時間は変わらない。
+
+        戻り値は (rows, next_cursor)。rows は (row_key, レコード) のリストで、
+        row_key は表示位置によらずレコードごとに決まる値（ウィジェットのキーに使う）。
+        次のページがなければ next_cursor は None。
+        """
+        if self.spec["date_field"] is None:
+            raise ValueError(f"{self.dataset} には日付列が定義されていません")
+        start, end = _date_part(start), _date_part(end)
+        cursor = tuple(cursor) if cursor is not None else None
+        if self.backend.indexed:
+            found = self.backend.page(self.dataset, cursor, limit + 1, descending, start, end, filters)
+        else:
+            found = self._page_from_cache(cursor, limit + 1, descending, start, end, filters)
+        rows = [(self._row_key(day, tiebreak), record) for day, tiebreak, record in found[:limit]]
+        next_cursor = [found[limit - 1][0], found[limit - 1][1]] if len(found) > limit else None
+        return rows, next_cursor
+
+    def _row_key(self, day, tiebreak):
+        return str(tiebreak) if self.spec["key"] is not None else f"{day}:{tiebreak}"
+
+    def _page_from_cache(self, cursor, limit, descending, start, end, filters):
+        """インデックスのないバックエンド用に、並べ替え済みの位置から limit 件を読む"""
+        records, (keys, days, positions) = self._order()
+        lo = bisect.bisect_left(days, start) if start is not None else 0
+        hi = bisect.bisect_right(days, end) if end is not None else len(keys)
+        if descending:
+            if cursor is not None:
+                hi = min(hi, bisect.bisect_left(keys, cursor))
+            indexes = range(hi - 1, lo - 1, -1)
+        else:
+            if cursor is not None:
+                lo = max(lo, bisect.bisect_right(keys, cursor))
+            indexes = range(lo, hi)
+        found = []
+        for i in indexes:
+            record = records[positions[i]]
+            if filters and not all(_matches(record.get(k), v) for k, v in filters.items()):
+                continue
+            found.append((keys[i][0], keys[i][1], dict(record)))
+            if len(found) >= limit:
+                break
+        return found
+
+
+_tables = {}
+_listeners = []
+
+# Arrow スナップショットの作り直し（書き込みごとに 1 つずつ、まだ作り直していないものはまとめる）
+_columnar_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="columnar")
+_columnar_pending = set()
+_columnar_lock = threading.Lock()
+
+def _schedule_columnar(tbl):
+    with _columnar_lock:
+        if tbl.dataset in _columnar_pending:
+            return
+        _columnar_pending.add(tbl.dataset)
+    try:
+        future = _columnar_executor.submit(tbl._refresh_columnar)
+    except RuntimeError:
+        # インタープリターの終了処理中（次に読むときに作り直す）
+        with _columnar_lock:
+            _columnar_pending.discard(tbl.dataset)
+        return
+    future.add_done_callback(_log_columnar_failure)
+
+def _log_columnar_failure(future):
+    if future.exception() is not None:
+        logger.error("列指向スナップショットの作り直しに失敗しました", exc_info=future.exception())
+
+def table(dataset):
+    """データセット名から Table を取得する"""
+    if dataset not in _tables:
+        _tables[dataset] = Table(dataset)
+    return _tables[dataset]
+
+def add_listener(callback):
+    """テーブル経由の書き込みを通知する関数を登録する
+
+    callback(dataset, before, after, added, removed) の形で呼ばれる。
+    before / after は変更前後の Table.signature()、added / removed は
+    追加・削除したレコードのリスト（更新は変更前を削除・変更後を追加として渡す）。
+    save で全件を置き換えたときは added と removed が None になる。
+    """
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+
+# 設定系ファイル（辞書や小さなリスト）の読み書き
+_documents = {}
+
+def document_signature(path):
+    """設定系の JSON ファイルが変わると値が変わるキー（ファイルがなければ None）"""
+    return _stat_key(os.path.abspath(path))
+
+def load_document(path, default=None):
+    """設定系の JSON ファイルを読み込む（ファイルが変わっていなければキャッシュから返す）"""
+    key = os.path.abspath(path)
+    stat_key = _stat_key(key)
+    if stat_key is None:
+        return default
+    cached = _documents.get(key)
+    if cached is None or cached[0] != stat_key:
+        cached = (stat_key, read_json(path, default=default))
+        _documents[key] = cached
+    # 呼び出し側で書き換えられてもキャッシュが変わらないようにコピーを返す
+    return copy.deepcopy(cached[1])
+
+def save_document(path, data):
+    """設定系の JSON ファイルを保存する"""
+    with file_lock(path):
+        write_json(path, data)
+        _documents.pop(os.path.abspath(path), None)
+
+def update_document(path, func, default=None):
+    """設定系の JSON ファイルをロックしたまま読み込み・変更・保存する
+
+    func は最新の内容を受け取り、新しい内容を返す（None を返した場合は
+    受け取ったオブジェクトをそのまま保存する）。保存した内容を返す。
+    ほかのセッションが同時に更新しても、互いの変更を上書きしない。
+    """
+    with file_lock(path):
+        data = read_json(path, default=default)
+        result = func(data)
+        if result is not None:
+            data = result
+        write_json(path, data)
+        _documents.pop(os.path.abspath(path), None)
+    return data
@@ -0,0 +1,132 @@
+"""
+連続記録（ストリーク）の共通モジュール
+
+日付を日の通し番号（1970-01-01 からの日数）に変換し、1 日ずつ続いている区間を
+ランレングスでまとめて、現在の連続日数・最長の連続日数・すべての連続区間を求める。
+ループを使わず NumPy の配列演算で計算するので、記録が多くても速い。
+
+習慣の記録は「達成」だけでなく「スキップ」も連続とみなす（CONTINUE_STATUSES）。
+"""
+import numpy as np
+import pandas as pd
+
+# 連続が途切れないとみなす習慣のステータス
+CONTINUE_STATUSES = ["達成", "スキップ"]
+
+
+# ユーティリティ関数
+def _parse(dates):
+    """日付の並び（文字列・date・datetime・Series）を日の通し番号に変換する
+
+    変換できた値の通し番号と、元の並びのどの位置が変換できたかを返す。
+    """
+    if not isinstance(dates, (pd.Series, pd.Index, np.ndarray)):
+        dates = list(dates)
+    values = pd.Series(pd.to_datetime(dates, errors="coerce", format="mixed"))
+    valid = values.notna().to_numpy()
+    days = values.to_numpy()[valid].astype("datetime64[D]").astype(np.int64)
+    return days, valid
+
+def _day_number(value):
+    """日付 1 つを日の通し番号に変換する"""
+    days, _ = _parse([value])
+    if days.size == 0:
+        raise ValueError(f"日付として解釈できません: {value}")
+    return int(days[0])
+
+def _runs(days):
+    """昇順で重複のない通し番号から、連続区間の開始日と日数の配列を返す"""
+    if days.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(days) != 1) + 1
+    first = np.concatenate(([0], breaks))
+    last = np.concatenate((breaks, [days.size]))
+    return days[first], last - first
+
+def _runs_of(dates):
+    days, _ = _parse(dates)
+    return _runs(np.unique(days))
+
+
+# 連続記録の計算
+def runs(dates):
+    """すべての連続区間を古い順に返す（列: start, end, length）"""
+    starts, lengths = _runs_of(dates)
+    ends = starts + lengths - 1
+    return pd.DataFrame({
+        "start": pd.to_datetime(starts.astype("datetime64[D]")),
+        "end": pd.to_datetime(ends.astype("datetime64[D]")),
+        "length": lengths,
+    })
+
+def max_streak(dates):
+    """最長の連続日数"""
+    _, lengths = _runs_of(dates)
+    return int(lengths.max()) if lengths.size else 0
+
+def current_streak(dates, end=None, grace=0):
+    """現在の連続日数
+
+    end を指定しなければ最も新しい連続区間の日数を返す。
+    end を指定すると end より後の記録は無視し、end（または grace 日前まで）まで
+    続いている連続区間の日数を返す。そのような区間がなければ 0 を返す。
+    """
+    starts, lengths = _runs_of(dates)
+    if lengths.size == 0:
+        return 0
+    if end is None:
+        return int(lengths[-1])
+    end = _day_number(end)
+    ends = np.minimum(starts + lengths - 1, end)
+    hit = np.flatnonzero((starts <= end) & (ends >= end - grace))
+    return int(ends[hit[-1]] - starts[hit[-1]] + 1) if hit.size else 0
+
+def streak_from(dates, start):
+    """start の日から途切れずに続いている日数（start に記録がなければ 0）"""
+    starts, lengths = _runs_of(dates)
+    start = _day_number(start)
+    ends = starts + lengths - 1
+    hit = np.flatnonzero((starts <= start) & (ends >= start))
+    return int(ends[hit[0]] - start + 1) if hit.size else 0
+
+def grouped_streaks(frame, by, date_column="date", end=None, grace=0):
+    """グループ（習慣 ID など）ごとの現在の連続日数と最長の連続日数をまとめて計算する
+
+    frame を 1 回並べ替えるだけで全グループの連続区間を求める。
+    current の意味は current_streak と同じ。戻り値はグループを index にした
+    DataFrame（列: current, max）。
+    """
+    if frame.empty:
+        return pd.DataFrame({"current": [], "max": []}, dtype="int64").rename_axis(by)
+    days, valid = _parse(frame[date_column])
+    codes, groups = pd.factorize(frame[by].to_numpy()[valid])
+    if days.size == 0 or groups.size == 0:
+        return pd.DataFrame({"current": [], "max": []}, dtype="int64").rename_axis(by)
+
+    # グループ → 日付の順に並べ、同じ日の重複を除く
+    order = np.lexsort((days, codes))
+    codes, days = codes[order], days[order]
+    keep = np.ones(days.size, dtype=bool)
+    keep[1:] = (codes[1:] != codes[:-1]) | (days[1:] != days[:-1])
+    codes, days = codes[keep], days[keep]
+
+    # グループが変わるか日付が 1 日以上空いたところで新しい区間にする
+    new_run = np.ones(days.size, dtype=bool)
+    new_run[1:] = (codes[1:] != codes[:-1]) | (np.diff(days) != 1)
+    run_ids = np.cumsum(new_run) - 1
+    lengths = np.bincount(run_ids)
+    run_groups = codes[new_run]
+    run_starts = days[new_run]
+
+    longest = np.zeros(groups.size, dtype=np.int64)
+    np.maximum.at(longest, run_groups, lengths)
+    current = np.zeros(groups.size, dtype=np.int64)
+    if end is None:
+        # 区間はグループ内で古い順に並んでいるので、最後に代入した値が最新の区間になる
+        current[run_groups] = lengths
+    else:
+        end = _day_number(end)
+        run_ends = np.minimum(run_starts + lengths - 1, end)
+        hit = (run_starts <= end) & (run_ends >= end - grace)
+        current[run_groups[hit]] = (run_ends - run_starts + 1)[hit]
+    return pd.DataFrame({"current": current, "max": longest}, index=pd.Index(groups, name=by))
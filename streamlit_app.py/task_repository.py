@@ -0,0 +1,168 @@
+"""
+タスクと目標のリポジトリ
+
+タスク管理（04）でタスクを目標やステータスで絞り込むたびに DataFrame 全体を
+比較し、タスクごとに目標の一覧から名前を探していたのを、索引で引く形にする。
+
+    - tasks は id と goal_id、goals は id のハッシュ索引を持つ
+    - 索引は storage の変更通知で追加・削除したレコードだけを反映するので、
+      タスクの完了・未完了の切り替えで全件を読み直さない
+      （ほかのプロセスが書き込んで差分がわからないときだけ全件から作り直す）
+    - 目標ごとのステータス別の件数は aggregates の tasks 集計値（by_goal）を使う
+    - 目標名はタスクの DataFrame に 1 回の merge で付ける
+
+    tasks = task_repository.tasks_for_goal(goal_id, status="completed")
+    frame = task_repository.with_goal_names(pd.DataFrame(tasks))
+    rows, cursor = storage.table("tasks").page(**task_repository.task_filters(goal_id, exclude_status="completed"))
+"""
+import threading
+
+import pandas as pd
+
+import aggregates
+import storage
+
+# 目標が見つからないタスクに付ける目標名
+UNKNOWN_GOAL = "不明な目標"
+
+
+class Index:
+    """データセットのレコードを key 列（と group 列）で引けるようにした索引"""
+
+    def __init__(self, dataset, group=None):
+        self.dataset = dataset
+        self.key = storage.DATASETS[dataset]["key"]
+        self.group = group
+        self._lock = threading.Lock()
+        self._signature = None
+        self._records = {}  # キー → レコード（データの並び順）
+        self._groups = {}  # group 列の値 → {キー: None}（データの並び順）
+
+    def _add(self, record):
+        key = record.get(self.key)
+        old = self._records.get(key)
+        self._records[key] = record
+        if self.group is None:
+            return
+        if old is not None and old.get(self.group) != record.get(self.group):
+            self._discard_group(key, old.get(self.group))
+        self._groups.setdefault(record.get(self.group), {})[key] = None
+
+    def _remove(self, record):
+        key = record.get(self.key)
+        old = self._records.pop(key, None)
+        if self.group is not None and old is not None:
+            self._discard_group(key, old.get(self.group))
+
+    def _discard_group(self, key, value):
+        members = self._groups.get(value)
+        if members is not None:
+            members.pop(key, None)
+            if not members:
+                del self._groups[value]
+
+    def _sync(self):
+        """索引がデータと対応していなければ全件から作り直す（_lock を取って呼ぶ）"""
+        tbl = storage.table(self.dataset)
+        signature = tbl.signature()
+        if self._signature != signature:
+            self._records, self._groups = {}, {}
+            for record in tbl.records():
+                self._add(record)
+            self._signature = signature
+
+    def on_change(self, before, after, added, removed):
+        """書き込みを索引に反映する（storage から呼ばれる）"""
+        with self._lock:
+            if self._signature != before or added is None:
+                # 差分を反映する元がないので、次に引くときに作り直す
+                self._signature = None
+                return
+            # 更新は変更前の削除・変更後の追加として届くので、同じキーは置き換えて並び順を保つ
+            added_keys = {r.get(self.key) for r in added}
+            for record in removed:
+                if record.get(self.key) not in added_keys:
+                    self._remove(record)
+            for record in added:
+                self._add(dict(record))
+            self._signature = after
+
+    def get(self, key):
+        """キーでレコードを 1 件取得する（なければ None）"""
+        with self._lock:
+            self._sync()
+            record = self._records.get(key)
+            return dict(record) if record is not None else None
+
+    def records(self):
+        """全レコード（データの並び順）"""
+        with self._lock:
+            self._sync()
+            return [dict(r) for r in self._records.values()]
+
+    def grouped(self, value):
+        """group 列が value のレコード（データの並び順）"""
+        with self._lock:
+            self._sync()
+            return [dict(self._records[key]) for key in self._groups.get(value, ())]
+
+
+tasks = Index("tasks", group="goal_id")
+goals = Index("goals")
+_indexes = {"tasks": tasks, "goals": goals}
+
+def _on_change(dataset, before, after, added, removed):
+    index = _indexes.get(dataset)
+    if index is not None:
+        index.on_change(before, after, added, removed)
+
+storage.add_listener(_on_change)
+
+
+# 取得
+def goal(goal_id):
+    """目標を 1 件取得する（なければ None）"""
+    return goals.get(goal_id)
+
+def tasks_for_goal(goal_id=None, status=None, exclude_status=None):
+    """タスクを目標とステータスで絞り込む（goal_id が None ならすべての目標）"""
+    records = tasks.records() if goal_id is None else tasks.grouped(goal_id)
+    if status is not None:
+        records = [r for r in records if r.get("status") == status]
+    if exclude_status is not None:
+        records = [r for r in records if r.get("status") != exclude_status]
+    return records
+
+def task_filters(goal_id=None, status=None, exclude_status=None):
+    """tasks_for_goal と同じ絞り込みを Table.page の条件（列の一致条件）で返す"""
+    filters = {}
+    if goal_id is not None:
+        filters["goal_id"] = goal_id
+    if status is not None:
+        filters["status"] = status
+    elif exclude_status is not None:
+        # ステータスのないタスクも tasks_for_goal と同じく含める
+        filters["status"] = storage.Not(exclude_status)
+    return filters
+
+def status_counts(goal_id):
+    """目標のタスクの件数とステータス別の件数（書き込み時に更新している集計値から取る）"""
+    counts = aggregates.summary("tasks")["by_goal"].get(str(goal_id))
+    if counts is None:
+        return {"total": 0, "by_status": {}}
+    return {"total": counts["total"], "by_status": dict(counts["by_status"])}
+
+def with_goal_names(tasks_df, goals_df=None):
+    """タスクの DataFrame に目標名の列（goal_name）を付ける"""
+    if goals_df is None:
+        goals_df = pd.DataFrame(goals.records(), columns=storage.DATASETS["goals"]["columns"])
+    names = (
+        goals_df[["id", "name"]]
+        .drop_duplicates("id")
+        .rename(columns={"id": "goal_id", "name": "goal_name"})
+    )
+    if tasks_df.empty:
+        return tasks_df.assign(goal_name=pd.Series(dtype=object))
+    merged = tasks_df.merge(names, on="goal_id", how="left")
+    merged["goal_name"] = merged["goal_name"].fillna(UNKNOWN_GOAL)
+    return merged
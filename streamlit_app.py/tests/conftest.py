@@ -0,0 +1,29 @@
+"""
+テストの共通設定
+
+アプリのモジュールはアプリのフォルダー直下に置いているので、そこを import パスに加える。
+データファイルはカレントディレクトリに作られるので、テストごとに一時フォルダーへ移る。
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aggregates
+import storage
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """一時フォルダーをカレントディレクトリにし、テーブルと集計値のキャッシュを空にする"""
+    monkeypatch.chdir(tmp_path)
+    storage._tables.clear()
+    aggregates._states.clear()
+    aggregates._snapshots.clear()
+    yield tmp_path
+    # 終了時の flush で一時フォルダーの外に書き出さないようにする
+    aggregates._dirty.clear()
+    storage._tables.clear()
+    storage.set_backend(storage.STORAGE_BACKEND)
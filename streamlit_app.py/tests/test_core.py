@@ -0,0 +1,152 @@
+"""
+streaks・storage・aggregates のテスト
+"""
+import random
+
+import pandas as pd
+import pytest
+
+import aggregates
+import storage
+import streaks
+
+
+# 連続記録
+DATES = ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-05", "2024-01-06", "2024-01-10",
+         "2024-01-02", "不明"]
+
+def test_runs_groups_consecutive_days():
+    runs = streaks.runs(DATES)
+    assert runs["length"].tolist() == [3, 2, 1]
+    assert runs["start"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-01", "2024-01-05", "2024-01-10"]
+    assert runs["end"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-03", "2024-01-06", "2024-01-10"]
+    assert streaks.max_streak(DATES) == 3
+    assert streaks.max_streak([]) == 0
+
+def test_current_streak_and_streak_from():
+    assert streaks.current_streak(DATES) == 1
+    assert streaks.current_streak(DATES, end="2024-01-06") == 2
+    assert streaks.current_streak(DATES, end="2024-01-08") == 0
+    assert streaks.current_streak(DATES, end="2024-01-08", grace=2) == 2
+    # end より後の記録は数えない
+    assert streaks.current_streak(DATES, end="2024-01-02") == 2
+    assert streaks.streak_from(DATES, "2024-01-02") == 2
+    assert streaks.streak_from(DATES, "2024-01-04") == 0
+
+@pytest.mark.parametrize("end", [None, "2024-01-06", "2024-01-20"])
+def test_grouped_streaks_matches_per_group(end):
+    rng = random.Random(0)
+    rows = []
+    for habit in ["a", "b", "c"]:
+        days = rng.sample(range(40), 25)
+        rows.extend({"habit_id": habit, "date": str(pd.Timestamp("2024-01-01") + pd.Timedelta(days=d))[:10]} for d in days)
+    rows.append({"habit_id": "a", "date": rows[0]["date"]})
+    rng.shuffle(rows)
+    frame = pd.DataFrame(rows)
+
+    result = streaks.grouped_streaks(frame, "habit_id", end=end, grace=1)
+    for habit, group in frame.groupby("habit_id"):
+        assert result.loc[habit, "max"] == streaks.max_streak(group["date"])
+        assert result.loc[habit, "current"] == streaks.current_streak(group["date"], end=end, grace=1)
+
+def test_grouped_streaks_current_is_latest_run():
+    # 区間が複数あるグループでは、fancy index の代入で最後（最新）の区間の長さが残る
+    frame = pd.DataFrame({
+        "habit_id": ["a"] * 6 + ["b"] * 2,
+        "date": ["2024-01-09", "2024-01-01", "2024-01-02", "2024-01-03", "2024-01-05", "2024-01-06",
+                 "2024-01-01", "2024-01-02"],
+    })
+    result = streaks.grouped_streaks(frame, "habit_id")
+    assert result.loc["a"].tolist() == [1, 3]
+    assert result.loc["b"].tolist() == [2, 2]
+    assert streaks.grouped_streaks(frame.iloc[0:0], "habit_id").empty
+
+
+# ストレージ
+def _tasks(count):
+    return [
+        {"id": str(i), "goal_id": i % 3, "description": f"タスク{i}",
+         "status": [None, "pending", "completed"][i % 3], "created_at": f"2024-01-{i % 9 + 1:02d}"}
+        for i in range(count)
+    ]
+
+def _exercise(backend):
+    """同じ操作を行い、結果を比べられる形で返す"""
+    storage.set_backend(backend)
+    storage._tables.clear()
+    tbl = storage.table("tasks")
+    tbl.save(_tasks(5))
+    tbl.extend(_tasks(12)[5:])
+    tbl.append({"id": "x", "goal_id": 1, "description": "追加", "created_at": "2024-01-05"})
+    updated = tbl.update("3", {"status": "completed"})
+    tbl.upsert({"id": "4", "description": "上書き"})
+    tbl.upsert({"id": "y", "goal_id": 2, "status": "pending", "created_at": "2024-01-01"})
+    deleted = tbl.delete("7")
+    missing = tbl.delete("does-not-exist")
+
+    pages = []
+    cursor = None
+    while True:
+        rows, cursor = tbl.page(cursor=cursor, limit=4, status=storage.Not("completed"))
+        pages.append([record["id"] for _, record in rows])
+        if cursor is None:
+            break
+    by_id = lambda records: sorted(records, key=lambda r: r["id"])
+    return {
+        "records": by_id(tbl.records()),
+        "counts": (updated, deleted, missing),
+        "get": tbl.get("4"),
+        "query": by_id(tbl.query(start="2024-01-02", end="2024-01-04").to_dict("records")),
+        "pages": pages,
+    }
+
+def test_json_and_sqlite_backends_agree(data_dir):
+    json_result = _exercise("json")
+    sqlite_result = _exercise("sqlite")
+    assert json_result == sqlite_result
+    assert json_result["counts"] == (1, 1, 0)
+    assert json_result["get"]["description"] == "上書き"
+    assert "7" not in {r["id"] for r in json_result["records"]}
+
+def test_sqlite_migrates_legacy_json_once(data_dir):
+    storage.set_backend("json")
+    storage.table("tasks").save(_tasks(3))
+    backend = storage.SQLiteBackend()
+    storage.set_backend(backend)
+    storage._tables.clear()
+    assert len(storage.table("tasks").records()) == 3
+    for task in _tasks(3):
+        storage.table("tasks").delete(task["id"])
+    storage.set_backend(storage.SQLiteBackend())
+    storage._tables.clear()
+    assert storage.table("tasks").records() == []
+
+
+# 集計値
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_incremental_aggregate_matches_rebuild(data_dir, backend):
+    storage.set_backend(backend)
+    tbl = storage.table("tasks")
+    tbl.save(_tasks(6))
+    aggregates.summary("tasks")
+    tbl.extend(_tasks(10)[6:])
+    tbl.update("1", {"status": "completed", "completed_at": "2024-01-03"})
+    tbl.upsert({"id": "2", "goal_id": 5})
+    tbl.delete("0")
+
+    # 書き込みは差分で足し込んでいる（全件からの作り直しにはなっていない）
+    assert "tasks" in aggregates._states
+    incremental = aggregates.summary("tasks")
+    assert incremental == aggregates.rebuild("tasks")["summary"]
+    assert incremental["total"] == 9
+    assert incremental["completed_by_day"]["2024-01-03"] == 1
+    assert aggregates.verify("tasks")
+
+def test_summary_is_a_snapshot(data_dir):
+    storage.set_backend("json")
+    tbl = storage.table("tasks")
+    tbl.save(_tasks(3))
+    before = aggregates.summary("tasks")
+    tbl.append({"id": "z", "goal_id": 0, "status": "pending", "created_at": "2024-01-01"})
+    assert before["total"] == 3
+    assert aggregates.summary("tasks")["total"] == 4
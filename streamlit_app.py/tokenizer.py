@@ -0,0 +1,83 @@
+"""
+テキストの単語分割（オフライン・日本語対応）
+
+外部の辞書やネットワークを使わずに、文字の種類で単語を区切る。
+
+    - 漢字の連続（直後の送り仮名 2 文字までを含む）・カタカナ・英字の連続をそれぞれ 1 語とみなす
+      （「強い」「気持ち」のように送り仮名まで含めないと「強」「気持」のような語幹だけが残る）
+    - 送り仮名は助詞や助動詞の始まりになる仮名の手前で切る。漢字 2 文字以上に続く
+      「し」「す」「さ」「せ」（「勉強する」など）は送り仮名に含めない
+    - ほかのひらがなは区切りに使い、単語には含めない。1 文字の語も除く
+    - 全角英数字などは NFKC で正規化し、英字は小文字にそろえる
+    - 同梱の stopwords.json にある語は除く
+
+ストップワードはプロセスごとに 1 回だけ読み込み、分割結果もメモ化するので、
+同じテキストを何度分析しても結果は同じで、2 回目以降は計算しない。
+stopwords.json の version が TOKENIZER_VERSION と一致しない場合はエラーにする。
+"""
+import functools
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+
+# 分割ルールとストップワードのバージョン（stopwords.json の version と合わせる）
+TOKENIZER_VERSION = "2"
+
+STOPWORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords.json")
+
+# 送り仮名に含めない仮名（助詞・助動詞の始まりになるもの）
+_PARTICLE_KANA = "がをにはでともへやのなかよねてただまっんられろ"
+_OKURIGANA = "".join(chr(c) for c in range(ord("ぁ"), ord("ゖ") + 1) if chr(c) not in _PARTICLE_KANA)
+
+# 漢字の連続と送り仮名 / カタカナの連続（長音を含む） / 英字で始まる英数字の連続
+_TOKEN_PATTERN = re.compile(
+    r"([\u3400-\u4dbf\u4e00-\u9fff々〆ヶ]+)([" + _OKURIGANA + r"]{0,2})"
+    r"|[\u30a1-\u30fa][\u30a1-\u30faー]*"
+    r"|[a-z][a-z0-9'\-]*"
+)
+
+# 漢字 2 文字以上に続くときは送り仮名に含めない仮名（「勉強する」「対応させる」など）
+_SURU_KANA = ("し", "す", "さ", "せ")
+
+
+@functools.lru_cache(maxsize=None)
+def load_stopwords():
+    """同梱のストップワードを読み込む（プロセスごとに 1 回）"""
+    with open(STOPWORDS_FILE, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if str(data.get("version")) != TOKENIZER_VERSION:
+        raise ValueError(
+            f"stopwords.json のバージョン {data.get('version')} が分割ルールのバージョン {TOKENIZER_VERSION} と一致しません"
+        )
+    return frozenset(data.get("ja", [])) | frozenset(data.get("en", []))
+
+def _tokens(text):
+    for match in _TOKEN_PATTERN.finditer(text):
+        kanji, okurigana = match.group(1), match.group(2)
+        if kanji is None:
+            yield match.group()
+        elif len(kanji) >= 2 and okurigana.startswith(_SURU_KANA):
+            yield kanji
+        else:
+            yield kanji + okurigana
+
+@functools.lru_cache(maxsize=4096)
+def tokenize(text):
+    """テキストを単語のタプルに分割する（ストップワードと 1 文字の語は除く）"""
+    if not isinstance(text, str) or not text:
+        return ()
+    text = unicodedata.normalize("NFKC", text).lower()
+    stopwords = load_stopwords()
+    return tuple(token for token in _tokens(text) if len(token) >= 2 and token not in stopwords)
+
+def keywords(texts, top_n=10):
+    """テキストの一覧から出現回数の多い単語を (単語, 回数) のリストで返す
+
+    回数が同じ場合は先に出てきた単語を上にする。
+    """
+    counts = Counter()
+    for text in texts:
+        counts.update(tokenize(text))
+    return counts.most_common(top_n)
@@ -0,0 +1,141 @@
+"""
+ワードクラウドの描画サービス
+
+WordCloud の生成はページの中で最も重い処理なので、描画した PNG を
+入力の単語と描画パラメータのハッシュをキーにしてプロセス内にキャッシュする。
+
+    - キャッシュは件数（MAX_ENTRIES）と合計サイズ（MAX_BYTES）で上限を決め、
+      古く使われたものから捨てる（LRU）
+    - 描画は専用のスレッドで行うので、呼び出し側は結果を待つ間にページの残りを表示できる
+    - matplotlib の figure を経由せず WordCloud から直接 PNG にするので、figure が残らない
+    - 描画にかかった時間は結果と stats() で確認できる
+
+    future = wordcloud_service.render(words, width=800, height=400)
+    ...（ページの残りを表示）...
+    result = future.result()  # result.png / result.render_ms / result.cached
+"""
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import lazy_imports
+
+wordcloud = lazy_imports.lazy_import("wordcloud")
+
+# キャッシュする件数と合計サイズの上限
+MAX_ENTRIES = 32
+MAX_BYTES = 16 * 1024 * 1024
+
+# 描画結果（cached は描画せずにキャッシュから返したかどうか）
+Rendered = namedtuple("Rendered", ["png", "render_ms", "cached"])
+
+
+class WordCloudService:
+    """ワードクラウドの PNG を描画してキャッシュする"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, workers=1):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()  # キー → (PNG, 描画時間 ms)
+        self._bytes = 0
+        self._pending = {}  # 描画中のキー → Future
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wordcloud")
+        self._timings = deque(maxlen=100)
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def key(text, params):
+        """入力の単語と描画パラメータから決まるキャッシュのキー"""
+        data = json.dumps([text, params], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def submit(self, text, **params):
+        """描画を依頼して Future（結果は Rendered）を返す
+
+        キャッシュにあれば完了済みの Future を返し、同じ内容を描画中なら
+        その Future を共有する。
+        """
+        key = self.key(text, params)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                future = Future()
+                future.set_result(Rendered(cached[0], cached[1], True))
+                return future
+            future = self._pending.get(key)
+            if future is None:
+                self._misses += 1
+                future = self._executor.submit(self._render, key, text, params)
+                self._pending[key] = future
+            return future
+
+    def _render(self, key, text, params):
+        try:
+            started = time.perf_counter()
+            cloud = wordcloud.WordCloud(**params).generate(text)
+            buffer = io.BytesIO()
+            cloud.to_image().save(buffer, format="PNG")
+            png = buffer.getvalue()
+            render_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._store(key, png, render_ms)
+                self._timings.append(render_ms)
+            return Rendered(png, render_ms, False)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _store(self, key, png, render_ms):
+        """キャッシュに追加し、上限を超えた分を古いものから捨てる（_lock を取って呼ぶ）"""
+        if key in self._cache:
+            self._bytes -= len(self._cache.pop(key)[0])
+        self._cache[key] = (png, render_ms)
+        self._bytes += len(png)
+        while len(self._cache) > 1 and (len(self._cache) > self.max_entries or self._bytes > self.max_bytes):
+            _, (old_png, _) = self._cache.popitem(last=False)
+            self._bytes -= len(old_png)
+
+    def stats(self):
+        """キャッシュの状態と描画時間（直近 100 回）"""
+        with self._lock:
+            timings = list(self._timings)
+            return {
+                "entries": len(self._cache),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "renders": len(timings),
+                "last_ms": round(timings[-1], 1) if timings else None,
+                "avg_ms": round(sum(timings) / len(timings), 1) if timings else None,
+            }
+
+    def clear(self):
+        """キャッシュを空にする"""
+        with self._lock:
+            self._cache.clear()
+            self._bytes = 0
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def service():
+    """プロセスで共有するサービスを取得する"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = WordCloudService()
+    return _service
+
+def render(text, **params):
+    """ワードクラウドの描画を依頼する（WordCloudService.submit を参照）"""
+    return service().submit(text, **params)